@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Exports the scraper's caches to a single
+# compressed bundle (.tar.xz), and imports
+# one on another machine, so a new setup
+# can start with the Steam catalog, saved
+# matches and game data of an existing one
+# instead of fetching them again.
+#
+# $ python3 cachebundle.py export cache.tar.xz [--media PATH [--media-files]]
+# $ python3 cachebundle.py import cache.tar.xz [--media PATH] [--replace]
+# $ python3 cachebundle.py info cache.tar.xz
+#
+# A bundle holds a manifest.json (format
+# version, and the size and sha256 of each
+# file) and the files themselves:
+#
+# cache/matches.json		- saved matches (matchcache.py)
+# cache/metadata.json		- saved game data (metadatacache.py)
+# cache/steam_apps.bin		- Steam catalog (steamcatalog.py)
+# cache/stats.json			- request history (stats.py)
+# media/.gogscraper-media.json - media index (mediaindex.py), with --media
+# media/...					- the files in the media index, with --media-files
+#
+# Importing merges with what is already
+# there: for each match, game and media
+# file the newer entry is kept, and the
+# catalog is only replaced by a newer one.
+# --replace takes everything from the
+# bundle instead.
+#
+##########################################
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import socket
+import sys
+import tarfile
+import time
+
+from matchcache import MATCH_CACHE_PATH, MatchCache
+from mediaindex import MEDIA_INDEX_NAME, MediaIndex
+from metadatacache import METADATA_CACHE_PATH, MetadataCache
+from stats import STATS_PATH
+from steamcatalog import CATALOG_PATH, CATALOG_MAGIC, CATALOG_VERSION, HEADER
+
+# Bumped whenever the layout of a bundle changes; bundles newer than
+# this are refused
+BUNDLE_FORMAT = "gogscraper-cache"
+BUNDLE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# The caches exported, by their name in the bundle
+BUNDLE_CACHES = {
+	"cache/matches.json" : MATCH_CACHE_PATH,
+	"cache/metadata.json" : METADATA_CACHE_PATH,
+	"cache/steam_apps.bin" : CATALOG_PATH,
+	"cache/stats.json" : STATS_PATH,
+}
+BUNDLE_MEDIA_INDEX = "media/" + MEDIA_INDEX_NAME
+
+def file_sha256(path = ""):
+	""" Return the sha256 of a file, as hex """
+
+	h = hashlib.sha256()
+	f = open(path, "rb")
+	for block in iter(lambda: f.read(1024 * 1024), b""):
+		h.update(block)
+	f.close()
+	return h.hexdigest()
+
+def catalog_version(data = b""):
+	""" Return the format version of a Steam catalog, or None if it is not one """
+
+	if len(data) < HEADER.size:
+		return None
+	magic, version, count = HEADER.unpack_from(data, 0)
+	if magic != CATALOG_MAGIC:
+		return None
+	return version
+
+def is_newer(entry = None, existing = None):
+	""" Whether a cache entry from a bundle is newer than the one already saved """
+
+	if existing is None:
+		return True
+	return entry.get('time', 0) > existing.get('time', 0)
+
+def media_files(media_path = ""):
+	""" Return (name in bundle, path) of each file in a media folder's index """
+
+	files = []
+	index = MediaIndex(media_path)
+	for k in sorted(index.entries):
+		path = os.path.join(media_path, *k.split("/"))
+		if os.path.isfile(path):
+			files.append(("media/" + k, path))
+	return files
+
+def export_bundle(bundle_path = "", media_path = None, include_media = False):
+	""" Write the caches (and optionally the media index and files) to a bundle; True on success """
+
+	files = []
+	for name, path in BUNDLE_CACHES.items():
+		if os.path.isfile(path):
+			files.append((name, path))
+		else:
+			print("- No %s to export" % path)
+	if media_path:
+		index_path = os.path.join(media_path, MEDIA_INDEX_NAME)
+		if os.path.isfile(index_path):
+			files.append((BUNDLE_MEDIA_INDEX, index_path))
+			if include_media:
+				files += media_files(media_path)
+		else:
+			print("- No media index in %s to export" % media_path)
+
+	if len(files) == 0:
+		print("- Error, there is nothing to export")
+		return False
+
+	manifest = {
+		'format' : BUNDLE_FORMAT,
+		'version' : BUNDLE_VERSION,
+		'created' : int(time.time()),
+		'host' : socket.gethostname(),
+		'files' : {},
+	}
+	for name, path in files:
+		manifest['files'][name] = {
+			'size' : os.path.getsize(path),
+			'mtime' : int(os.path.getmtime(path)),
+			'sha256' : file_sha256(path),
+		}
+	if os.path.isfile(CATALOG_PATH):
+		f = open(CATALOG_PATH, "rb")
+		manifest['catalog_version'] = catalog_version(f.read(HEADER.size))
+		f.close()
+
+	tmp_path = bundle_path + "-tmp"
+	try:
+		tar = tarfile.open(tmp_path, "w:xz")
+		# The manifest goes first, so it can be read without the rest
+		data = json.dumps(manifest, indent = 1, sort_keys = True).encode('utf-8')
+		info = tarfile.TarInfo(MANIFEST_NAME)
+		info.size = len(data)
+		info.mtime = manifest['created']
+		tar.addfile(info, io.BytesIO(data))
+		for name, path in files:
+			print("- Adding %s" % path)
+			tar.add(path, arcname = name, recursive = False)
+		tar.close()
+		os.replace(tmp_path, bundle_path)
+	except Exception as e:
+		print("- Error, unable to write bundle %s" % bundle_path)
+		print(e)
+		if os.path.isfile(tmp_path):
+			os.remove(tmp_path)
+		return False
+
+	print("- Exported [%d] files to %s (%d bytes)" % (len(files), bundle_path, os.path.getsize(bundle_path)))
+	return True
+
+def read_manifest(tar = None):
+	""" Return the manifest of an open bundle, or False if it is missing or not a bundle this version can read """
+
+	try:
+		f = tar.extractfile(MANIFEST_NAME)
+		manifest = json.load(f)
+	except Exception as e:
+		print("- Error, no readable manifest, this is not a cache bundle")
+		print(e)
+		return False
+
+	if manifest.get('format') != BUNDLE_FORMAT:
+		print("- Error, this is not a cache bundle")
+		return False
+	if manifest.get('version', 0) > BUNDLE_VERSION:
+		print("- Error, bundle version %s is newer than this version of the scraper can read (%d)" % (manifest.get('version'), BUNDLE_VERSION))
+		return False
+	return manifest
+
+def read_member(tar = None, manifest = None, name = ""):
+	""" Return the data of a file in a bundle, or None if it is missing or does not match the manifest """
+
+	entry = manifest['files'].get(name)
+	if entry is None:
+		return None
+	try:
+		data = tar.extractfile(name).read()
+	except Exception as e:
+		print("- Error, unable to read %s from the bundle" % name)
+		print(e)
+		return None
+	if (len(data) != entry['size']) or (hashlib.sha256(data).hexdigest() != entry['sha256']):
+		print("- Error, %s in the bundle is damaged, skipping" % name)
+		return None
+	return data
+
+def write_file(path = "", data = b"", mtime = None):
+	""" Write a file in place of any existing one """
+
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	f = open(path + "-tmp.%d" % os.getpid(), "wb")
+	f.write(data)
+	f.close()
+	if mtime:
+		os.utime(path + "-tmp.%d" % os.getpid(), (mtime, mtime))
+	os.replace(path + "-tmp.%d" % os.getpid(), path)
+
+def import_matches(data = b"", replace = False):
+	""" Merge saved matches into the match cache; return the number taken """
+
+	matches = MatchCache()
+	count = 0
+	for k, entry in json.loads(data).items():
+		if replace or is_newer(entry, matches.matches.get(k)):
+			matches.matches[k] = entry
+			matches.changed_keys.add(k)
+			matches.changed = True
+			count += 1
+	matches.save()
+	return count
+
+def import_metadata(data = b"", replace = False):
+	""" Merge saved game data into the metadata cache; return the number taken """
+
+	metadata = MetadataCache()
+	count = 0
+	with metadata.lock:
+		for k, entry in json.loads(data).items():
+			if replace or is_newer(entry, metadata.games.get(k)):
+				metadata.games[k] = entry
+				metadata.changed = True
+				count += 1
+	metadata.save()
+	return count
+
+def import_stats(data = b"", replace = False):
+	""" Fill in the request history; the longer history of each request kind is kept """
+
+	history = {}
+	if os.path.isfile(STATS_PATH):
+		try:
+			f = open(STATS_PATH, "r", encoding = "utf-8")
+			history = json.load(f)
+			f.close()
+		except Exception as e:
+			print("- Error, unable to read request history %s, it will be replaced" % STATS_PATH)
+			print(e)
+
+	count = 0
+	for kind, c in json.loads(data).items():
+		# Adding them up would count the same requests twice when a
+		# bundle goes back to the machine it came from
+		if replace or (c['requests'] > history.get(kind, {}).get('requests', 0)):
+			history[kind] = c
+			count += 1
+	write_file(STATS_PATH, json.dumps(history, indent = 1, sort_keys = True).encode('utf-8'))
+	return count
+
+def import_catalog(data = b"", mtime = 0, replace = False):
+	""" Use the Steam catalog from a bundle if the local one is missing or older; True if it was used """
+
+	if catalog_version(data) != CATALOG_VERSION:
+		print("- Skipping the Steam catalog, it is in a format this version of the scraper does not use")
+		return False
+	if (replace is False) and os.path.isfile(CATALOG_PATH) and (os.path.getmtime(CATALOG_PATH) >= mtime):
+		print("- Keeping the local Steam catalog, it is as new as the one in the bundle")
+		return False
+	# Keep its age, so it is still downloaded again when it goes stale
+	write_file(CATALOG_PATH, data, mtime)
+	return True
+
+def import_media(tar = None, manifest = None, media_path = "", replace = False):
+	""" Merge the media index, and any media files, from a bundle into a media folder; return the number of files written """
+
+	data = read_member(tar, manifest, BUNDLE_MEDIA_INDEX)
+	if data is None:
+		print("- No media index in the bundle")
+		return 0
+
+	index = MediaIndex(media_path)
+	count = 0
+	for k, entry in json.loads(data).items():
+		name = "media/" + k
+		path = os.path.join(media_path, *k.split("/"))
+		if (replace is False) and (is_newer(entry, index.entries.get(k)) is False):
+			continue
+		if name in manifest['files']:
+			# Never write outside of the media folder
+			if (os.path.isabs(k)) or (".." in k.split("/")):
+				print("- Skipping %s, not a path within the media folder" % k)
+				continue
+			if (replace is False) and os.path.isfile(path):
+				continue
+			file_data = read_member(tar, manifest, name)
+			if file_data is None:
+				continue
+			write_file(path, file_data, manifest['files'][name]['mtime'])
+			count += 1
+		with index.lock:
+			index.entries[k] = entry
+			index.changed_keys.add(k)
+	index.save()
+	return count
+
+def import_bundle(bundle_path = "", media_path = None, replace = False):
+	""" Merge the caches from a bundle into this machine's; True on success """
+
+	try:
+		tar = tarfile.open(bundle_path, "r:xz")
+	except Exception as e:
+		print("- Error, unable to open bundle %s" % bundle_path)
+		print(e)
+		return False
+
+	manifest = read_manifest(tar)
+	if manifest is False:
+		tar.close()
+		return False
+	print("- Bundle from %s, made %s" % (manifest.get('host', "unknown"), time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest['created']))))
+
+	try:
+		data = read_member(tar, manifest, "cache/matches.json")
+		if data is not None:
+			print("- Took [%d] saved matches" % import_matches(data, replace))
+
+		data = read_member(tar, manifest, "cache/metadata.json")
+		if data is not None:
+			print("- Took [%d] saved games" % import_metadata(data, replace))
+
+		data = read_member(tar, manifest, "cache/steam_apps.bin")
+		if data is not None:
+			if import_catalog(data, manifest['files']["cache/steam_apps.bin"]['mtime'], replace):
+				print("- Took the Steam catalog")
+
+		data = read_member(tar, manifest, "cache/stats.json")
+		if data is not None:
+			print("- Took the request history of [%d] request types" % import_stats(data, replace))
+
+		if media_path:
+			if os.path.isdir(media_path) is False:
+				print("- Error, media path %s does not exist" % media_path)
+			else:
+				print("- Took [%d] media files" % import_media(tar, manifest, media_path, replace))
+	except Exception as e:
+		print("- Error importing bundle %s" % bundle_path)
+		print(e)
+		tar.close()
+		return False
+
+	tar.close()
+	return True
+
+def print_bundle(bundle_path = ""):
+	""" Print the manifest of a bundle; True if it could be read """
+
+	try:
+		tar = tarfile.open(bundle_path, "r:xz")
+	except Exception as e:
+		print("- Error, unable to open bundle %s" % bundle_path)
+		print(e)
+		return False
+	manifest = read_manifest(tar)
+	tar.close()
+	if manifest is False:
+		return False
+
+	print("Bundle version %d, from %s, made %s" % (manifest['version'], manifest.get('host', "unknown"), time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest['created']))))
+	media = 0
+	for name, entry in sorted(manifest['files'].items()):
+		if name.startswith("media/") and (name != BUNDLE_MEDIA_INDEX):
+			media += 1
+			continue
+		print("%-40s | %12d bytes | %s" % (name, entry['size'], time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['mtime']))))
+	if media:
+		print("%-40s | %12d files" % ("media/...", media))
+	return True
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Export the scraper caches to a bundle, or import one from another machine.', add_help = True)
+	parser.add_argument('command', choices=['export', 'import', 'info'], help='export to, import from, or show the contents of a bundle')
+	parser.add_argument('bundle', help='Path of the bundle (.tar.xz)')
+	parser.add_argument('--media', dest='media_path', action='store', required=False, help='Also export or import the media index of this media folder')
+	parser.add_argument('--media-files', dest='media_files', action='store_true', required=False, help='Export the downloaded media files in the media index as well')
+	parser.add_argument('--replace', dest='replace', action='store_true', required=False, help='On import, take everything from the bundle instead of keeping newer local entries')
+
+	args = parser.parse_args()
+	args_dict = vars(args)
+
+	if args_dict['command'] == "export":
+		ok = export_bundle(args_dict['bundle'], args_dict['media_path'], args_dict['media_files'])
+	elif args_dict['command'] == "import":
+		ok = import_bundle(args_dict['bundle'], args_dict['media_path'], args_dict['replace'])
+	else:
+		ok = print_bundle(args_dict['bundle'])
+
+	if ok is False:
+		sys.exit(1)
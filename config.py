@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Default settings shared by the scraper
+# and its data providers.
+#
+##########################################
+
+import os
+
+# Where downloaded catalogs and other cached data are kept between runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".gogscraper")
+
+# How old (in seconds) the local Steam app catalog can get before
+# it is downloaded again
+STEAM_CATALOG_MAX_AGE = 7 * 24 * 60 * 60
+
+# Minimum confidence (0-100) for a search result to be selected
+# without prompting
+MATCH_THRESHOLD = 90
+
+# How far (in confidence points) the best search result must be ahead
+# of the next best to be selected without prompting
+MATCH_MARGIN = 5
+
+# How long (in seconds) a search that found nothing is remembered
+# before the game is searched for again
+NEGATIVE_MATCH_TTL = 30 * 24 * 60 * 60
+
+# User-Agent sent with every HTTP request
+USER_AGENT = "GogScraper/1.0 (+https://github.com/megatron-uk/GogScraper)"
+
+# Number of kept-alive connections held open per host
+HTTP_POOL_SIZE = 10
+
+# Seconds to wait for a server to connect/respond before giving up
+HTTP_TIMEOUT = 30
+
+# Media folder names as used by EmulationStation, for each type of art
+MEDIA_FOLDERS = {
+	'screens' : "screenshots",
+	'cover' : "covers",
+	'marquee' : "marquees",
+	'title' : "titlescreens",
+	'video' : "videos",
+	'miximage' : "miximages",
+}
+
+# Bytes per request assumed by --plan, until there is a history of real
+# requests (see stats.py) to average instead
+PLAN_DEFAULT_BYTES = {
+	'catalog' : 8000000,
+	'search' : 200000,
+	'metadata' : 400000,
+	'screens' : 300000,
+	'cover' : 150000,
+	'marquee' : 50000,
+	'title' : 300000,
+	'video' : 20000000,
+}
+
+# Number of upcoming roms searched in the background while the current
+# one is being handled (0 to disable)
+LOOKAHEAD_ROMS = 3
+
+# Number of top search results whose product data is fetched in the
+# background while waiting for the user to choose between them
+LOOKAHEAD_CANDIDATES = 3
+
+# Background threads used for searching and fetching ahead
+LOOKAHEAD_WORKERS = 2
+
+# Roms matched at a time before their data is fetched; results come out a
+# batch at a time, and Steam app details are fetched a batch at a time
+SCRAPE_BATCH_SIZE = 10
+
+# Processes parsing HTML (see parsepool.py), 0 for one per CPU, or 1 to
+# parse in each fetching thread; and the smallest response body worth
+# sending to one rather than parsing where it was fetched. They are only
+# used when pages are fetched side by side (several providers, lookahead,
+# or server.py); a single fetching thread always parses its own
+PARSE_WORKERS = 0
+PARSE_MIN_BYTES = 4096
+
+# When scraping from more than one provider, which provider's value is
+# used first for a field. Fields not listed use the order the providers
+# were given in.
+MERGE_PRIORITY = {
+	'releasedate' : ["steam", "gog"],
+	'rating' : ["steam", "gog"],
+	'cover' : ["gog", "steam"],
+}
+
+# Smallest width (in pixels) wanted for each type of art. Providers pick
+# the smallest image they offer that is at least this wide, or their
+# largest image if set to 0.
+ART_SIZES = {
+	'screens' : 600,
+	'cover' : 400,
+	'marquee' : 400,
+	'title' : 640,
+}
+
+# Overall download rate limit in bytes per second (0 for no limit)
+BANDWIDTH_LIMIT = 0
+
+# Watch mode: seconds between folder listings where inotify is unavailable,
+# and seconds a folder must be quiet before new files are scraped
+WATCH_POLL_INTERVAL = 5
+WATCH_SETTLE = 2
+
+# Server mode (server.py): address to listen on, how long game data is
+# kept before it is fetched again, and the most disk used for cached media.
+# The server has no authentication, so it only listens locally unless told
+# otherwise (e.g. "0.0.0.0" for every address)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+METADATA_CACHE_TTL = 7 * 24 * 60 * 60
+SERVER_MEDIA_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+SERVER_SEARCH_CACHE_ENTRIES = 1000
+
+# Where GOG.com game data comes from: "page" for the game page, or "api"
+# for the products API (small and quick, but without developer,
+# publisher, genre, rating, cover or marquee). Games whose product id is
+# not known always use the page.
+GOG_METADATA = "page"
+GOG_PRODUCTS_URL = "https://api.gog.com/products/"
+
+# Merging partial gamelists from --shard workers (shard.py): for each
+# field, "partial" takes the newly scraped value over the one in
+# gamelist.xml, and "existing" only fills it in where gamelist.xml has
+# none. Fields not listed (e.g. playcount or favorite, as set by
+# EmulationStation) are never taken from a partial.
+GAMELIST_MERGE_RULES = {
+	'name' : "existing",
+	'desc' : "partial",
+	'rating' : "partial",
+	'releasedate' : "partial",
+	'developer' : "partial",
+	'publisher' : "partial",
+	'genre' : "partial",
+	'players' : "partial",
+}
+
+# Steam installations searched by --steam-library when no path is given
+STEAM_ROOTS = [
+	os.path.join(os.path.expanduser("~"), ".steam", "steam"),
+	os.path.join(os.path.expanduser("~"), ".local", "share", "Steam"),
+	os.path.join(os.path.expanduser("~"), ".var", "app", "com.valvesoftware.Steam", ".local", "share", "Steam"),
+	"C:\\Program Files (x86)\\Steam",
+]
+
+# Mix images (--miximages, needs Pillow): which of MIXIMAGE_LAYOUTS to
+# draw, and the processes drawing them (0 for one per CPU). A layout is
+# the size of the image and the art drawn onto it, in order. Each piece
+# of art is scaled to fit its box, keeping its shape, and placed in the
+# box by 'align'. Boxes are (x, y, width, height) and alignments
+# (across, down), as fractions of the image. A mix image is only made
+# when the 'required' art has been downloaded.
+MIXIMAGE_LAYOUT = "standard"
+MIXIMAGE_WORKERS = 0
+MIXIMAGE_LAYOUTS = {
+	'standard' : {
+		'size' : (1280, 960),
+		'layers' : [
+			{'media' : "screens", 'box' : (0.0, 0.0, 1.0, 0.86), 'align' : (0.5, 0.0), 'required' : True},
+			{'media' : "cover", 'box' : (0.0, 0.42, 0.42, 0.58), 'align' : (0.0, 1.0)},
+			{'media' : "marquee", 'box' : (0.5, 0.74, 0.5, 0.26), 'align' : (1.0, 1.0)},
+		],
+	},
+	'marquee-only' : {
+		'size' : (1280, 960),
+		'layers' : [
+			{'media' : "screens", 'box' : (0.0, 0.0, 1.0, 0.86), 'align' : (0.5, 0.0), 'required' : True},
+			{'media' : "marquee", 'box' : (0.25, 0.74, 0.5, 0.26), 'align' : (0.5, 1.0)},
+		],
+	},
+}
@@ -17,6 +17,10 @@ class Gamelist():
 		print("- Gamelist initialising for XML functions")
 		self.xml_path = xml_path
 		self.is_parsed = False
+		
+		# The parsed file is kept until it changes on disk
+		self.tree = None
+		self.stamp = None
 		if os.path.isfile(self.xml_path):
 			try:
 				tmp_tree = etree.parse(self.xml_path)
@@ -43,6 +47,34 @@ class Gamelist():
 			print(e)
 			return False
 	
+	def get_stamp(self):
+		""" Return the modification time and size of the xml file, or None """
+		
+		try:
+			st = os.stat(self.xml_path)
+			return (st.st_mtime_ns, st.st_size)
+		except OSError:
+			return None
+	
+	def get_tree(self):
+		""" Return the parsed xml file, only parsing it again if it has changed since """
+		
+		stamp = self.get_stamp()
+		if (self.tree is None) or (stamp != self.stamp):
+			self.tree = etree.parse(self.xml_path, parser = etree.XMLParser(encoding = 'utf-8'))
+			self.stamp = stamp
+		return self.tree
+	
+	def save_tree(self, tree):
+		""" Write the xml file, keeping the tree as the current copy """
+		
+		self.tree = None
+		tree.write(self.xml_path + "-tmp")
+		tmp_tree = etree.parse(self.xml_path + "-tmp")
+		tree.write(self.xml_path)
+		self.tree = tree
+		self.stamp = self.get_stamp()
+	
 	def games(self):
 		""" Return full list of games; one dict per game """
 		pass
@@ -62,7 +94,7 @@ class Gamelist():
 
 		if self.xml_path:
 			try:
-				tree = etree.parse(self.xml_path, parser = etree.XMLParser(encoding = 'utf-8'))
+				tree = self.get_tree()
 				root = tree.getroot()
 				for pathname in root.iter('path'):
 					filename = pathname.text.replace('./', '')
@@ -86,7 +118,7 @@ class Gamelist():
 			updated = False
 			
 			# Open xml
-			tree = etree.parse(self.xml_path)
+			tree = self.get_tree()
 			root = tree.getroot()
 			
 			# Create new entry
@@ -104,16 +136,13 @@ class Gamelist():
 					game_element.append(el)
 					updated = True
 				
-			# Add new entry
-			root.append(game_element)
-			
 			# Close xml
 			if updated:
+				# Add new entry
+				root.append(game_element)
 				#tree_string = etree.tostring(root, encoding="unicode")
-				tree.write(self.xml_path + "-tmp")	
 				try:
-					tmp_tree = etree.parse(self.xml_path + "-tmp")
-					tree.write(self.xml_path)
+					self.save_tree(tree)
 				except Exception as e:
 					print("- Error reparsing updated XML for new game, it has not been saved")
 					print(e)
@@ -123,7 +152,7 @@ class Gamelist():
 		
 		if self.xml_path:
 			# Open xml
-			tree = etree.parse(self.xml_path)
+			tree = self.get_tree()
 			root = tree.getroot()
 			
 			updated = False
@@ -161,10 +190,8 @@ class Gamelist():
 			# Close xml
 			if updated:
 				#tree_string = etree.tostring(root, encoding="unicode")
-				tree.write(self.xml_path + "-tmp")
 				try:
-					tmp_tree = etree.parse(self.xml_path + "-tmp")
-					tree.write(self.xml_path)
+					self.save_tree(tree)
 				except Exception as e:
 					print("- Error reparsing updated XML for edited game, it has not been saved")
 					print(e)
\ No newline at end of file
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 
-from bs4 import BeautifulSoup as soup
-import json
+import codecs
 import re
-import requests
+from urllib.parse import urlsplit
+import zlib
 
-
-from pytubewrapper import PTWrapper
+from config import ART_SIZES, GOG_METADATA
+from matcher import normalise
+from providers import get_media
+from gogapi import get_product, product_to_card
+from parsepool import parse, parse_gog_search, parse_gog_page, html_to_text
+import transport
 
 # Base GOG URL
 GOG_URL = "https://www.gog.com"
@@ -20,19 +24,35 @@ SEARCH_SUFFIX = "&order=desc:score&hideDLCs=true"
 # Search results are tagged with this string under the 'seleniumId' tag
 GAME_HTML_ELEMENT = "productTile"
 
-# Media folder names as used by EmulationStation
-# and their availability from within GOG.com
-# ==============================================
-# 3dboxes			- No
-# backcovers		- No
-# covers			- No
-# fanart			- No
-# marquees			- Yes
-# miximages			- No
-# physicalmedia		- No
-# screenshots		- Yes
-# titlescreens
-# videos			- Yes; linked Youtube clips
+# Sized variants served by the GOG.com image CDN, as (width, suffix). The
+# suffix (and an image extension) is added to the bare image URL. These
+# are scaled copies of the whole image, as used for box art and logos.
+IMAGE_SIZES = [
+	(196, "_196"),
+	(392, "_392"),
+	(800, "_800"),
+	(1600, "_1600"),
+]
+
+# Screenshots can also use the crop made for the game page slider
+SCREENSHOT_SIZES = sorted(IMAGE_SIZES + [(639, "_product_card_v2_mobile_slider_639")])
+
+IMAGE_EXTENSIONS = [".jpg", ".png", ".webp"]
+
+# The parts of a game page the metadata is taken from, as (start, open, close).
+# A block is complete at the first 'close' after its start, or if 'open' is
+# given, at the 'close' that balances it. Once every block is complete the
+# rest of the page is not read; a page without them all is read in full.
+PAGE_BLOCKS = [
+	# The embedded json data, to the end of its line
+	(re.compile("cardProduct: {"), None, "\n"),
+	(re.compile('<div[^>]*class="(?:[^"]* )?description[ "]'), "<div", "</div>"),
+	(re.compile('href="/games\\?developers='), None, "</a>"),
+	(re.compile('href="/games\\?publishers='), None, "</a>"),
+	(re.compile("eventLabel: 'CAT:"), None, "\n"),
+	(re.compile("ratingValue"), None, "\n"),
+]
+PAGE_CHUNK_SIZE = 16384
 
 # Metadata entries
 # Name				- Yes
@@ -45,129 +65,309 @@ GAME_HTML_ELEMENT = "productTile"
 # Players
 # Controller
 
-MEDIA = {
-	'3dboxes' : False,
-	'cover' : True,
-	'data' : True,
-	'marquee' : True,
-	'miximages' : False,
-	'screens' : True,
-	'physical' : False,
-	'video' : True,
-	'title' : True
-}
+# Media capabilities are declared in the provider registry
+MEDIA = get_media("gog")
 
 class GOG():
 	
 	def __init__(self, debug = False):
 		self.data_block = None
 		self.debug = debug
+		
+		# Metadata parsed from the game page by get_data (see parsepool.py)
+		self.page = None
+		
+		# Prefetched game pages, zlib compressed and keyed by URL
+		self.pages = {}
+		
+		# Products API data (see gogapi.py), keyed by product id
+		self.products = {}
 	
-	def get_search(self, name = ""):
-		""" Get the GOG.com search page results for a given game name """
+	def refresh(self):
+		""" Nothing is held between searches that can go out of date """
+		
+		pass
+	
+	def get_search(self, name = "", quiet = False):
+		""" Get the GOG.com search page results for a given game name, or False if the search failed """
 		
 		search_results = []
 		search_url = SEARCH_URL + name + SEARCH_SUFFIX
 		try:
-			print("")
-			print("Searching GOG.com for %s:" % name)
-			r = requests.get(search_url)
+			if quiet is False:
+				print("")
+				print("Searching GOG.com for %s:" % name)
+			r = transport.get(search_url, kind = "gog:search")
 			if (r.status_code != 200):
-				print("- Skipped %g, query returned %s" % (name, r.status_code))
+				print("- Skipped %s, query returned %s" % (name, r.status_code))
+				return False
 			else:
-				page = soup(r.text, 'html.parser')
-				search_results = page.find_all('a', 'product-tile')
-				print("- Found [%d]" % len(search_results))
+				# Product tiles, as {href, id, title}
+				search_results = parse(parse_gog_search, r.text)
+				if quiet is False:
+					print("- Found [%d]" % len(search_results))
 					
 		except Exception as e:
 			print("- Error making HTTP search request to %s" % search_url)
 			print(e)
+			return False
 			
 		return search_results
 	
-	def get_game(self, game = None, game_url = ""):
-		""" Get a single GOG.com game page """
+	def find_blocks(self, text = "", found = None):
+		""" Update found, a list of [start, end] per PAGE_BLOCKS entry, from the text read so far; True once all are complete """
+		
+		for i, (start, tag_open, tag_close) in enumerate(PAGE_BLOCKS):
+			if found[i][1] is not None:
+				continue
+			
+			if found[i][0] is None:
+				# Only the newly read text (and enough before it to catch a
+				# start split across chunks) needs searching again
+				m = start.search(text, max(0, found[i][2] - 256))
+				found[i][2] = len(text)
+				if m is None:
+					continue
+				found[i][0] = m.end()
+			
+			if tag_open is None:
+				end = text.find(tag_close, found[i][0])
+			else:
+				# Nested elements of the same kind must close first
+				depth = 1
+				pos = found[i][0]
+				end = -1
+				while True:
+					c = text.find(tag_close, pos)
+					if c == -1:
+						break
+					depth += text.count(tag_open, pos, c) - 1
+					pos = c + len(tag_close)
+					if depth == 0:
+						end = c
+						break
+			if end != -1:
+				found[i][1] = end
+		
+		return all(f[1] is not None for f in found)
+	
+	def get_page_streamed(self, game_url = "", quiet = False):
+		""" Read a GOG.com game page only as far as the blocks in PAGE_BLOCKS, or False """
 		
+		r = transport.get(game_url, kind = "gog:metadata", stream = True)
+		if (r.status_code != 200):
+			r.close()
+			print("- Skipped %s, query returned %s" % (game_url, r.status_code))
+			return False
+		
+		decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors = "replace")
+		found = [[None, None, 0] for b in PAGE_BLOCKS]
 		html = ""
+		complete = False
+		for chunk in transport.iter_content(r, "gog:metadata", PAGE_CHUNK_SIZE):
+			html += decoder.decode(chunk)
+			if self.find_blocks(html, found):
+				complete = True
+				break
+		
+		if quiet is False:
+			if complete:
+				print("- Returned %s bytes (stopped once all game data was found)" % len(html))
+			else:
+				print("- Returned %s bytes" % len(html))
+		return html
+	
+	def get_page(self, game_url = "", quiet = False):
+		""" Retrieve a GOG.com game page, or False """
 		
 		try:
-			print("")
-			print("Retrieving game data from GOG.com for %s:" % game_url)
-			r = requests.get(game_url)
+			return self.get_page_streamed(game_url, quiet)
+		except Exception as e:
+			print("- Error streaming HTTP game request to %s, retrying in full" % game_url)
+			print(e)
+		
+		try:
+			r = transport.get(game_url, kind = "gog:metadata")
 			if (r.status_code != 200):
 				print("- Skipped %s, query returned %s" % (game_url, r.status_code))
-			else:
-				html = r.text
+				return False
+			html = r.text
+			if quiet is False:
 				print("- Returned %s bytes" % len(html))
+			return html
 			
 		except Exception as e:
 			print("- Error make HTTP game request to %s" % game_url)
 			print(e)
 			return False
+	
+	def use_api(self, game = None):
+		""" Whether a game's data comes from the products API rather than its page """
+		
+		return (GOG_METADATA == "api") and bool(game['provider_id'])
+	
+	def get_product_card(self, game_id = "", quiet = False):
+		""" Return the products API data of a game as a cardProduct block, or False """
+		
+		k = str(game_id)
+		if k in self.products:
+			return self.products[k]
+		product = get_product(game_id, quiet = quiet)
+		if product is False:
+			return False
+		try:
+			self.products[k] = product_to_card(product)
+		except Exception as e:
+			print("- Error reading GOG.com product %s" % game_id)
+			print(e)
+			return False
+		return self.products[k]
+	
+	def prefetch(self, games = [], quiet = False):
+		""" Retrieve the product data or game pages of a list of games ahead of get_game """
+		
+		for game in games:
+			if self.use_api(game):
+				self.get_product_card(game['provider_id'], quiet = True)
+			elif game['url'] and (game['url'] not in self.pages):
+				html = self.get_page(game['url'], quiet = True)
+				if html:
+					self.pages[game['url']] = zlib.compress(html.encode('utf-8'))
+	
+	def discard(self, games = []):
+		""" Drop any prefetched pages for games that will not be used """
+		
+		for game in games:
+			self.pages.pop(game['url'], None)
+			if game['provider_id']:
+				self.products.pop(str(game['provider_id']), None)
+	
+	def get_game(self, game = None, game_url = ""):
+		""" Get the products API data (as a dict) or the game page (as text) of a single GOG.com game """
+		
+		print("")
+		print("Retrieving game data from GOG.com for %s:" % game_url)
+		
+		if self.use_api(game):
+			k = str(game['provider_id'])
+			if k in self.products:
+				print("- Using prefetched product data")
+				return self.products.pop(k)
+			card = self.get_product_card(k)
+			if card:
+				return self.products.pop(k)
+			print("- No product data, reading the game page instead")
+		
+		page = self.pages.pop(game_url, None)
+		if page is not None:
+			html = zlib.decompress(page).decode('utf-8')
+			print("- Using prefetched page, %s bytes" % len(html))
+			return html
+		
+		html = self.get_page(game_url)
+		if html is False:
+			return False
 			
 		return html
 	
 	def get_data(self, game_url = "", text = ""):
-		""" Retrieve the embedded json data block within the HTML page """
+		""" Retrieve the embedded json data block within the HTML page, or take the products API data as it is """
 		card_json = False
+		self.data_block = None
+		self.page = None
+		
+		if isinstance(text, dict):
+			self.data_block = text
+			print("- Using GOG.com products API data (no developer, publisher, genre or rating; Hint: GOG_METADATA in config.py)")
+			return True
 		
 		try:
-			fragment_results = re.findall("cardProduct: {.*", text)
-			for f in fragment_results:
-				data = f.split("cardProduct: ")
-				# Get the dict part
-				data = data[1]
-				# Trim the trailing javascript ','
-				data = data[0:-1]
-				# Covnert to python dict
-				data = json.loads(data)
-				card_json = True
-				self.data_block = data
-				if self.debug:
-					print("- Dumping GOG.com embedded json data:")
-					print("---")
-					print(self.data_block)
-					print("---")
-				print("- Extracted GOG.com embedded json data")
+			# The rest of the metadata is parsed from the page at the same time
+			self.page = parse(parse_gog_page, text)
 		except Exception as e:
-			print("- Error getting extended GOG json datablock in HTML")
+			print("- Error parsing GOG.com game page")
 			print(e)
+			return card_json
+		
+		if 'card' in self.page['errors']:
+			print("- Error getting extended GOG json datablock in HTML")
+			print(self.page['errors']['card'])
+		elif self.page['card']:
+			card_json = True
+			self.data_block = self.page['card']
+			if self.debug:
+				print("- Dumping GOG.com embedded json data:")
+				print("---")
+				print(self.data_block)
+				print("---")
+			print("- Extracted GOG.com embedded json data")
 			
 		return card_json
 	
-	def get_href_from_fragment(self, text = "", url_type = None):
-		""" Return an href value from a given HTML fragment """
-		href = None
+	def get_page_field(self, field = "", name = ""):
+		""" Return a field of the game page parsed by get_data, or None """
+		
+		if self.page is None:
+			return None
+		if field in self.page['errors']:
+			print("- Unable to extract game %s from fragment" % name)
+			print(self.page['errors'][field])
+		return self.page[field]
 	
+	def get_href_from_fragment(self, tile = None, url_type = None):
+		""" Return the page URL of a search result """
+		
+		return tile['href']
+		
+	def get_id_from_fragment(self, tile = None):
+		""" Return the GOG.com product id of a search result, or False """
+		
+		return tile['id']
+	
+	def get_game_by_id(self, game_id = ""):
+		""" Return the name and page URL of the game with a given GOG.com product id, as {provider_id, name, url}, or False """
+		
+		if GOG_METADATA == "api":
+			# The game data comes from the same request, so it is kept for get_game
+			card = self.get_product_card(game_id, quiet = True)
+			if card is False:
+				return False
+			return {
+				'provider_id' : card['id'],
+				'name' : card['title'],
+				'url' : card['url'],
+			}
+		
+		product = get_product(game_id, expand = [], kind = "gog:search", quiet = True)
+		if product is False:
+			return False
 		try:
-			fragment = soup("%s" % text, 'html.parser')
-			tag = fragment.a
-			if 'href' in tag.attrs:
-				href = tag['href']
+			return {
+				'provider_id' : product['id'],
+				'name' : product['title'],
+				'url' : product['links']['product_card'],
+			}
 		except Exception as e:
-			print("- Unable to extract href tag from fragment")
+			print("- Error reading GOG.com product %s" % game_id)
 			print(e)
+			return False
 	
-		return href
+	def is_game_url(self, url = ""):
+		""" Whether a URL is on GOG.com itself, and so can be given to get_game """
 		
-	def get_gamename_from_fragment(self, text = ""):
-		""" Return game title from given HTML fragment """
-		name = None
+		parts = urlsplit(url)
+		return (parts.scheme in ["http", "https"]) and (parts.hostname == urlsplit(SEARCH_URL).hostname)
 	
-		try:
-			fragment = soup("%s" % text, 'html.parser')
-			fragment_results = fragment.find_all('div', 'product-tile__title')
-			if len(fragment_results) == 1:
-				title_fragment = soup("%s" % fragment_results[0], 'html.parser')
-				tag = title_fragment.div
-				if 'title' in tag.attrs:
-					name = tag['title']
-		except Exception as e:
-			print("- Unable to extract game title from fragment")
-			print(e)
-			
-		return name
+	def get_gamename_from_fragment(self, tile = None):
+		""" Return the game title of a search result """
+		
+		return tile['title']
+		
+	def get_matchname_from_fragment(self, tile = None):
+		""" Return the normalised game title of a search result """
 		
+		return normalise(self.get_gamename_from_fragment(tile))
+	
 	def get_description_from_fragment(self, text = ""):
 		""" Return game description from given HTML fragment """
 		# <div class="description">blah blah blah</div>
@@ -175,15 +375,16 @@ class GOG():
 		desc = None
 	
 		try:
-			fragment = soup("%s" % text, 'html.parser')
-			fragment_results = fragment.find_all('div', 'description')
-			for f in fragment_results:
-				desc_fragment = soup("%s" % f, 'html.parser')
-				tag = desc_fragment.div
-				# Strip leading and trailing text from the entire description
-				desc = tag.get_text().strip()
-				print("- Found description (regex)")
+			if isinstance(text, dict):
+				if text['description']:
+					# Only the description itself is HTML
+					desc = parse(html_to_text, re.sub("<br\\s*/?>", "\n", text['description'])).strip()
+					print("- Found description (products API)")
 				return desc
+			
+			desc = self.get_page_field('desc', "description")
+			if desc is not None:
+				print("- Found description (regex)")
 		except Exception as e:
 			print("- Unable to extract game description from fragment")
 			print(e)
@@ -198,18 +399,13 @@ class GOG():
 		#            >Heart Machine</a>
 		
 		developer = None
+		
+		if isinstance(text, dict):
+			return developer
 	
-		try:
-			fragment = soup("%s" % text, 'html.parser')
-			fragment_results = fragment.find_all(href=re.compile("^/games\?developers\="))
-			for f in fragment_results:
-				developer = f.text
-				print("- Found developer [%s]" % developer)
-				return developer
-		except Exception as e:
-			print("- Unable to extract game developer from fragment")
-			print(e)
-			
+		developer = self.get_page_field('developer', "developer")
+		if developer is not None:
+			print("- Found developer [%s]" % developer)
 		return developer
 	
 	def get_publisher_from_fragment(self, text = ""):
@@ -220,43 +416,32 @@ class GOG():
 		#            >Heart Machine</a>
 		
 		publisher = None
+		
+		if isinstance(text, dict):
+			return publisher
 	
-		try:
-			fragment = soup("%s" % text, 'html.parser')
-			fragment_results = fragment.find_all(href=re.compile("^/games\?publishers\="))
-			for f in fragment_results:
-				publisher = f.text
-				print("- Found publisher [%s]" % publisher)
-				return publisher
-		except Exception as e:
-			print("- Unable to extract game publisher from fragment")
-			print(e)
-			
+		publisher = self.get_page_field('publisher', "publisher")
+		if publisher is not None:
+			print("- Found publisher [%s]" % publisher)
 		return publisher
 	
 	def get_genre_from_fragment(self, text = ""):
 		
 		genre = None
+		
+		if isinstance(text, dict):
+			return genre
 	
-		try:
-			# Genre is in a javascript label and needs to be split out:
-			#
-			# <a href="/games/action" 
-			#                class="details__link"
-			#                gog-track-event="{eventAction: 'click', eventCategory: 'productPageGameDetails', eventLabel: 'CAT: Action'}">
-			# Action</a>
-			#
-			fragment_results = re.findall("eventLabel: 'CAT:.*", text)
-			for f in fragment_results:
-				genre = f.split("CAT: ")
-				genre = genre[1].split("'")
-				genre = genre[0]
-				print("- Found genre [%s]" % genre)
-				return genre
-		except Exception as e:
-			print("- Unable to extract game genre from fragment")
-			print(e)
-			
+		# Genre is in a javascript label and needs to be split out:
+		#
+		# <a href="/games/action" 
+		#                class="details__link"
+		#                gog-track-event="{eventAction: 'click', eventCategory: 'productPageGameDetails', eventLabel: 'CAT: Action'}">
+		# Action</a>
+		#
+		genre = self.get_page_field('genre', "genre")
+		if genre is not None:
+			print("- Found genre [%s]" % genre)
 		return genre
 	
 	def get_rating_from_fragment(self, text = ""):
@@ -267,19 +452,12 @@ class GOG():
 		#
 		rating = 0
 		
-		try:
-			fragment_results = re.findall("ratingValue.*", text)
-			for f in fragment_results:
-				rating = f.split(':')
-				rating = rating[1].split('"')
-				rating = float(rating[1])
-				rating = rating / 5
-				print("- Found rating [%s]" % rating)
-				return rating
-		except Exception as e:
-			print("- Unable to extract game rating from fragment")
-			print(e)
-			
+		if isinstance(text, dict):
+			return rating
+		
+		if self.get_page_field('rating', "rating") is not None:
+			rating = self.page['rating']
+			print("- Found rating [%s]" % rating)
 		return rating
 	
 	def get_date_from_fragment(self, text = ""):
@@ -287,7 +465,7 @@ class GOG():
 		release_date = ""
 		
 		try:
-			if self.data_block:
+			if self.data_block and self.data_block['globalReleaseDate']:
 				date = self.data_block['globalReleaseDate']
 				date = date.replace("-", "")
 				date = date.replace(":", "")
@@ -296,14 +474,8 @@ class GOG():
 				print("- Found release date (data block) [%s]" % date)
 				return date
 			else:
-				fragment_results = re.findall("globalReleaseDate\":\"....-..-..T..:..:..", text)
-				for f in fragment_results:
-					date = f.split('"')
-					date = date[2]
-					date = date.replace("-", "")
-					date = date.replace(":", "")
-					if '+' in date:
-						date = date.split('+')[0]
+				date = self.get_page_field('releasedate', "release date")
+				if date is not None:
 					print("- Found release date (regex) [%s]" % date)
 					return date
 		except Exception as e:
@@ -334,45 +506,76 @@ class GOG():
 			print("- Title extraction is only possible if we have extracted the GOG embedded json data!")
 			return False
 	
-	def get_cover(self):
+	def get_sized_image(self, url = "", width = 0, sizes = IMAGE_SIZES):
+		""" Return the URL of the smallest CDN variant (from sizes) of an image at least width pixels wide """
+		
+		base = url
+		ext = ".jpg"
+		for e in IMAGE_EXTENSIONS:
+			if base.endswith(e):
+				base = base[:-len(e)]
+				ext = e
+		for size, suffix in SCREENSHOT_SIZES:
+			if base.endswith(suffix):
+				base = base[:-len(suffix)]
+		
+		if width:
+			for size, suffix in sizes:
+				if size >= width:
+					# Sized variants are requested as jpeg, except for PNGs
+					# (logos), which would lose their transparency
+					if ext == ".png":
+						return base + suffix + ".png"
+					return base + suffix + ".jpg"
+		
+		# No size wanted, or wider than any variant; use the original
+		return base + ext
+	
+	def get_cover(self, width = ART_SIZES['cover']):
 		""" Extract game cover art """
 		
-		if self.data_block:
-			cover = self.data_block['boxArtImage']
+		if self.data_block and self.data_block.get('boxArtImage'):
+			cover = self.get_sized_image(self.data_block['boxArtImage'], width)
 			print("- Found cover %s" % cover)
 			print("- Found covert art URL (data block)")
 			return cover
+		elif self.data_block:
+			print("- No cover art in the game data")
+			return False
 		else:
 			print("- Art extraction is only possible if we have extracted the GOG embedded json data!")
 			return False
 			
-	def get_marquee(self):
+	def get_marquee(self, width = ART_SIZES['marquee']):
 		""" Extract game marquee/transparent game logo/title """
 		
-		if self.data_block:
-			cover = self.data_block['logo']
+		if self.data_block and self.data_block.get('logo'):
+			cover = self.get_sized_image(self.data_block['logo'], width)
 			print("- Found title/marquee %s" % cover)
 			print("- Found title/marquee art URL (data block)")
 			return cover
+		elif self.data_block:
+			print("- No title/marquee art in the game data")
+			return False
 		else:
 			print("- Art extraction is only possible if we have extracted the GOG embedded json data!")
 			return False
 		
-	def get_title(self):
+	def get_title(self, width = ART_SIZES['title']):
 		""" Extract game marquee/transparent game logo/title """
 		# Not supported on GOG titles
 		return False
 		
-	def get_screen(self):
+	def get_screen(self, width = ART_SIZES['screens']):
 		""" Extract screenshots """
 		
 		if self.data_block:
 			covers = self.data_block['screenshots']
 			for c in covers:
-				print("- Found screenshot:  %s.jpg" % c['imageUrl'])
+				print("- Found screenshot:  %s" % self.get_sized_image(c['imageUrl'], width, SCREENSHOT_SIZES))
 			print("- Found title/marquee art URL (data block)")
 			if len(covers) > 0:
-				return covers[0]['imageUrl'] + ".jpg"
+				return self.get_sized_image(covers[0]['imageUrl'], width, SCREENSHOT_SIZES)
 			else:
 				return False
 		else:
@@ -402,5 +605,8 @@ class GOG():
 	def download_video(self, game = None, download_path = "", art_type = "video", enable_overwrite = False):
 		""" Download a video """
 		
+		# pytube is only needed (and imported) once a video is downloaded
+		from pytubewrapper import PTWrapper
+		
 		ptw = PTWrapper()
 		ptw.download(game, download_path, "video", enable_overwrite)
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# GOG.com game data from the products API
+# (api.gog.com/products/<id>) instead of the
+# game page: a few KB of JSON rather than
+# the whole page, and no markup to break.
+#
+# Products are converted to the shape of
+# the cardProduct block embedded in game
+# pages, so gog.py reads both the same way.
+#
+# The products API has no developer,
+# publisher, genre, rating or transparent
+# logo. Those are left empty (and can be
+# merged in from another provider), or set
+# GOG_METADATA = "page" in config.py.
+#
+##########################################
+
+import json
+import re
+
+from config import GOG_PRODUCTS_URL
+import transport
+
+# Where product data is requested from
+PRODUCTS_URL = GOG_PRODUCTS_URL
+
+# Only the optional sections that are read by product_to_card
+PRODUCTS_EXPAND = ["description", "screenshots", "videos"]
+
+# API image URLs are an image id plus a variant suffix, e.g.
+# //images-1.gog-statics.com/<id>_glx_logo.jpg
+IMAGE_ID = re.compile("^(.*/[0-9a-f]{64})")
+
+# Videos are given as YouTube embed URLs
+YOUTUBE_ID = re.compile("youtube\\.com/(?:embed/|watch\\?v=)([0-9A-Za-z_-]{11})")
+
+def get_product(game_id = "", expand = PRODUCTS_EXPAND, kind = "gog:metadata", quiet = False):
+	""" Return the product data of a GOG.com product id, with the given optional sections, or False """
+
+	products_url = PRODUCTS_URL + str(game_id)
+	if expand:
+		products_url += "?expand=" + ",".join(expand)
+	try:
+		r = transport.get(products_url, kind = kind)
+		if (r.status_code != 200):
+			print("- Skipped product %s, query returned %s" % (game_id, r.status_code))
+			return False
+		if quiet is False:
+			print("- Returned %s bytes" % len(r.content))
+		return json.loads(r.text)
+	except Exception as e:
+		print("- Error making HTTP product request to %s" % products_url)
+		print(e)
+		return False
+
+def image_url(url = ""):
+	""" Return the bare (unsized) image URL of an API image, as used in game pages """
+
+	if not url:
+		return None
+	if url.startswith("//"):
+		url = "https:" + url
+	m = IMAGE_ID.match(url)
+	if m:
+		return m.group(1) + ".jpg"
+	return url
+
+def video_url(video = None):
+	""" Return the page URL of a video, or its given URL if it is not on YouTube """
+
+	m = YOUTUBE_ID.search(video.get('video_url') or "")
+	if m:
+		return "https://www.youtube.com/watch?v=" + m.group(1)
+	return video.get('video_url')
+
+def product_to_card(product = None):
+	""" Convert product data to the fields of a game page's cardProduct block """
+
+	description = product.get('description') or {}
+
+	screenshots = []
+	for s in product.get('screenshots') or []:
+		if s.get('formatter_template_url'):
+			screenshots.append({'imageUrl' : image_url(s['formatter_template_url'].replace("_{formatter}", ""))})
+
+	videos = []
+	for v in product.get('videos') or []:
+		videos.append({'provider' : v.get('provider'), 'url' : video_url(v)})
+
+	return {
+		'id' : product['id'],
+		'title' : product['title'],
+		'globalReleaseDate' : product.get('release_date') or "",
+		# The API's 'logo' images are banners, not box art, so there is
+		# no cover
+		'boxArtImage' : None,
+		'screenshots' : screenshots,
+		'videos' : videos,
+		# Not part of cardProduct; the page has it as HTML outside the block
+		'description' : description.get('full') or description.get('lead'),
+		'url' : (product.get('links') or {}).get('product_card'),
+	}
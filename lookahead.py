@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Runs provider searches and product data
+# fetches in the background, so the results
+# are ready by the time the user has
+# answered a prompt.
+#
+##########################################
+
+from concurrent.futures import ThreadPoolExecutor
+
+from config import LOOKAHEAD_CANDIDATES, LOOKAHEAD_WORKERS
+
+class Lookahead():
+	
+	def __init__(self, provider = None, workers = LOOKAHEAD_WORKERS, candidates = LOOKAHEAD_CANDIDATES):
+		self.provider = provider
+		self.candidates = candidates
+		self.searches = {}
+		self.prefetching = None
+		
+		# Background fetches of chosen games, by id() of the game
+		self.fetches = {}
+		self.executor = None
+		if workers > 0:
+			self.executor = ThreadPoolExecutor(max_workers = workers)
+	
+	def search_ahead(self, names = []):
+		""" Start background searches for the given (stripped) game names """
+		
+		if self.executor is None:
+			return
+		
+		for name in names:
+			if name not in self.searches:
+				self.searches[name] = self.executor.submit(self.provider.get_search, name, quiet = True)
+	
+	def get_search(self, name = ""):
+		""" Return the search results for a name, from the background search if there was one, or False if the search failed """
+		
+		future = self.searches.pop(name, None)
+		if future is not None:
+			try:
+				search_results = future.result()
+				if search_results is not False:
+					print("")
+					print("Search results for %s were retrieved in the background:" % name)
+					print("- Found [%d]" % len(search_results))
+					return search_results
+				print("- Background search for %s failed, searching again" % name)
+			except Exception as e:
+				print("- Error in background search for %s, searching again" % name)
+				print(e)
+		
+		return self.provider.get_search(name)
+	
+	def prefetch_candidates(self, game_matches = []):
+		""" Start fetching product data for the best candidates of a prompt """
+		
+		if (self.executor is None) or (self.candidates < 1):
+			return
+		
+		self.prefetching = self.executor.submit(self.provider.prefetch, game_matches[:self.candidates], quiet = True)
+	
+	def chosen(self, game = None, game_matches = []):
+		""" Discard prefetched product data for candidates that were not chosen """
+		
+		others = []
+		for m in game_matches[:self.candidates]:
+			if m is not game:
+				others.append(m)
+		
+		# Once the background fetch has finished (or straight away, if it has)
+		if self.prefetching is not None:
+			self.prefetching.add_done_callback(lambda f: self.provider.discard(others))
+			self.prefetching = None
+	
+	def fetch_ahead(self, games = []):
+		""" Start fetching the data of the next few games to be scraped, one at a time, in the background """
+		
+		if self.executor is None:
+			return
+		
+		for game in games:
+			if id(game) not in self.fetches:
+				self.fetches[id(game)] = self.executor.submit(self.provider.prefetch, [game], quiet = True)
+	
+	def fetched(self, game = None):
+		""" Wait for the background fetch of a game, if one was started, so it is not fetched twice """
+		
+		future = self.fetches.pop(id(game), None)
+		if future is None:
+			return
+		try:
+			future.result()
+		except Exception as e:
+			print("- Error fetching %s in the background, fetching it again" % game['name'])
+			print(e)
+	
+	def close(self):
+		""" Stop the background threads, abandoning anything not yet started """
+		
+		if self.executor is not None:
+			self.executor.shutdown(wait = True, cancel_futures = True)
+			self.executor = None
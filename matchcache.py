@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Remembers which provider game each rom
+# was matched to (or that nothing matched)
+# so later runs can skip the search and
+# any prompt.
+#
+##########################################
+
+import json
+import os
+import threading
+import time
+
+from config import CACHE_DIR, NEGATIVE_MATCH_TTL
+
+# Default location of the match cache
+MATCH_CACHE_PATH = os.path.join(CACHE_DIR, "matches.json")
+
+# Seconds to wait for another scraper to finish saving, after which its
+# lock is taken to have been left behind by a crash
+MATCH_CACHE_LOCK_TIMEOUT = 10
+
+class MatchCache():
+	
+	def __init__(self, cache_path = MATCH_CACHE_PATH):
+		self.cache_path = cache_path
+		self.matches = {}
+		self.changed = False
+		
+		# Providers may be searched for side by side
+		self.lock = threading.Lock()
+		
+		# Keys changed since the last save; other scrapers (e.g. --shard
+		# workers) may have saved their own in the meantime
+		self.changed_keys = set()
+		
+		if os.path.isfile(self.cache_path):
+			self.matches = self.load()
+			print("- Loaded [%d] saved matches from %s" % (len(self.matches), self.cache_path))
+	
+	def load(self):
+		""" Return the matches saved on disk """
+		
+		if os.path.isfile(self.cache_path) is False:
+			return {}
+		try:
+			f = open(self.cache_path, "r", encoding = "utf-8")
+			matches = json.load(f)
+			f.close()
+			return matches
+		except Exception as e:
+			print("- Error, unable to read match cache %s, it will be recreated" % self.cache_path)
+			print(e)
+			return {}
+	
+	def key(self, provider = "", filename = ""):
+		""" Matches are saved per provider and rom filename """
+		return "%s:%s" % (provider.lower(), filename)
+	
+	def get(self, provider = "", filename = "", negative_ttl = NEGATIVE_MATCH_TTL):
+		""" Return the saved match for a rom, or None if there is no (current) entry """
+		
+		k = self.key(provider, filename)
+		with self.lock:
+			if k not in self.matches:
+				return None
+			
+			entry = self.matches[k]
+			if entry.get('none') and ((time.time() - entry['time']) > negative_ttl):
+				# Expired 'no match', search again
+				del self.matches[k]
+				self.changed = True
+				self.changed_keys.add(k)
+				return None
+			
+			return entry
+	
+	def add(self, provider = "", filename = "", game = None):
+		""" Save the game a rom was matched to """
+		
+		with self.lock:
+			self.matches[self.key(provider, filename)] = {
+				'provider_id' : game['provider_id'],
+				'url' : game['url'],
+				'name' : game['name'],
+				'time' : int(time.time()),
+			}
+			self.changed = True
+			self.changed_keys.add(self.key(provider, filename))
+	
+	def add_negative(self, provider = "", filename = ""):
+		""" Save that a rom has no match """
+		
+		with self.lock:
+			self.matches[self.key(provider, filename)] = {
+				'none' : True,
+				'time' : int(time.time()),
+			}
+			self.changed = True
+			self.changed_keys.add(self.key(provider, filename))
+	
+	def lock_file(self, timeout = MATCH_CACHE_LOCK_TIMEOUT):
+		""" Take the lock file that keeps other scrapers from saving at the same time """
+		
+		lock_path = self.cache_path + ".lock"
+		os.makedirs(os.path.dirname(self.cache_path), exist_ok = True)
+		waited = 0
+		while True:
+			try:
+				os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+				return
+			except FileExistsError:
+				if waited >= timeout:
+					print("- Match cache lock %s was not released, taking it over" % lock_path)
+					try:
+						os.remove(lock_path)
+					except OSError:
+						pass
+					waited = 0
+					continue
+				time.sleep(0.1)
+				waited += 0.1
+	
+	def unlock_file(self):
+		""" Release the lock file """
+		
+		try:
+			os.remove(self.cache_path + ".lock")
+		except OSError:
+			pass
+	
+	def save(self):
+		""" Write the cache back to disk, if anything has changed """
+		
+		with self.lock:
+			if self.changed is False:
+				return
+			self.write()
+	
+	def write(self):
+		""" Merge this cache's changes into the file on disk; called with the lock held """
+		
+		try:
+			# Read, merged and written by one scraper at a time, so none of
+			# their changes are lost
+			self.lock_file()
+			try:
+				# Only this cache's own changes are written over what is on disk
+				matches = self.load()
+				for k in self.changed_keys:
+					if k in self.matches:
+						matches[k] = self.matches[k]
+					else:
+						matches.pop(k, None)
+				self.matches = matches
+				
+				f = open(self.cache_path + "-tmp.%d" % os.getpid(), "w", encoding = "utf-8")
+				json.dump(self.matches, f, indent = 1, sort_keys = True)
+				f.close()
+				os.replace(self.cache_path + "-tmp.%d" % os.getpid(), self.cache_path)
+				self.changed = False
+				self.changed_keys = set()
+			finally:
+				self.unlock_file()
+		except Exception as e:
+			print("- Error, unable to save match cache %s" % self.cache_path)
+			print(e)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Game name normalisation and match
+# scoring, shared by all data providers.
+#
+##########################################
+
+from difflib import SequenceMatcher
+import re
+import unicodedata
+
+from config import MATCH_THRESHOLD, MATCH_MARGIN
+
+# Symbols removed outright, before any other processing
+STRIP_SYMBOLS = ["™", "®", "©", "℠"]
+
+# Apostrophes are removed without leaving a gap, so "Baldur's" == "Baldurs"
+APOSTROPHES = ["'", "’", "‘", "`"]
+
+ROMAN_NUMERALS = {
+	'i' : '1',
+	'ii' : '2',
+	'iii' : '3',
+	'iv' : '4',
+	'v' : '5',
+	'vi' : '6',
+	'vii' : '7',
+	'viii' : '8',
+	'ix' : '9',
+	'x' : '10',
+	'xi' : '11',
+	'xii' : '12',
+	'xiii' : '13',
+	'xiv' : '14',
+	'xv' : '15',
+	'xvi' : '16',
+	'xvii' : '17',
+	'xviii' : '18',
+	'xix' : '19',
+	'xx' : '20',
+}
+
+# Trailing edition/release words, as normalised tokens. These are stripped
+# (repeatedly) from the end of a name, longest first.
+EDITION_SUFFIXES = [
+	"game of the year edition",
+	"game of the year",
+	"digital deluxe edition",
+	"goty edition",
+	"goty",
+	"definitive edition",
+	"enhanced edition",
+	"complete edition",
+	"deluxe edition",
+	"gold edition",
+	"special edition",
+	"collectors edition",
+	"anniversary edition",
+	"ultimate edition",
+	"premium edition",
+	"standard edition",
+	"legendary edition",
+	"directors cut",
+	"remastered",
+]
+EDITION_TOKENS = [s.split(" ") for s in EDITION_SUFFIXES]
+
+def normalise(name = ""):
+	""" Return a folded, comparable form of a game name """
+
+	if not name:
+		return ""
+
+	n = str(name)
+	for s in STRIP_SYMBOLS:
+		n = n.replace(s, "")
+
+	# Drop accents, then fold case
+	n = unicodedata.normalize('NFKD', n)
+	n = "".join(c for c in n if not unicodedata.combining(c))
+	n = n.casefold()
+
+	n = n.replace("&", " and ")
+	for a in APOSTROPHES:
+		n = n.replace(a, "")
+
+	# Any other punctuation becomes a word break
+	tokens = re.sub(r"[\W_]+", " ", n).split()
+	tokens = [ROMAN_NUMERALS.get(t, t) for t in tokens]
+
+	if (len(tokens) > 1) and (tokens[0] == "the"):
+		tokens = tokens[1:]
+
+	stripped = True
+	while stripped:
+		stripped = False
+		for suffix in EDITION_TOKENS:
+			if (len(tokens) > len(suffix)) and (tokens[-len(suffix):] == suffix):
+				tokens = tokens[:-len(suffix)]
+				stripped = True
+				break
+
+	return " ".join(tokens)
+
+def token_set_ratio(a = "", b = ""):
+	""" Similarity (0-1) of two normalised names, ignoring word order and extra words in either """
+
+	tokens_a = set(a.split())
+	tokens_b = set(b.split())
+	common = " ".join(sorted(tokens_a & tokens_b))
+	rest_a = (common + " " + " ".join(sorted(tokens_a - tokens_b))).strip()
+	rest_b = (common + " " + " ".join(sorted(tokens_b - tokens_a))).strip()
+
+	return max(
+		SequenceMatcher(None, common, rest_a).ratio() if common else 0,
+		SequenceMatcher(None, common, rest_b).ratio() if common else 0,
+		SequenceMatcher(None, rest_a, rest_b).ratio(),
+	)
+
+def score(query = "", candidate = ""):
+	""" Confidence (0-100) that a normalised candidate name is the normalised query """
+
+	if (not query) or (not candidate):
+		return 0
+	if query == candidate:
+		return 100
+
+	# Mostly word based, with the plain string similarity breaking ties
+	# in favour of candidates with fewer additional words
+	s = (0.85 * token_set_ratio(query, candidate)) + (0.15 * SequenceMatcher(None, query, candidate).ratio())
+	
+	# A different sequel/episode number is never the same game
+	numbers_query = set(t for t in query.split() if t.isdigit())
+	numbers_candidate = set(t for t in candidate.split() if t.isdigit())
+	if numbers_query != numbers_candidate:
+		s = s * 0.8
+	
+	return min(99, int(round(s * 100)))
+
+def choose(candidates = [], threshold = MATCH_THRESHOLD, margin = MATCH_MARGIN):
+	""" Return the candidate (a dict with a 'score') that wins outright, or False """
+
+	if len(candidates) == 0:
+		return False
+
+	ranked = sorted(candidates, key = lambda c: c['score'], reverse = True)
+	best = ranked[0]
+	if best['score'] < threshold:
+		return False
+	if len(ranked) > 1:
+		# An exact match always beats inexact ones, however close
+		if (best['score'] == 100) and (ranked[1]['score'] < 100):
+			return best
+		if (best['score'] - ranked[1]['score']) < margin:
+			return False
+	return best
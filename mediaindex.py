@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Remembers where each downloaded media
+# file came from, and the ETag,
+# Last-Modified and Content-Length it was
+# served with, in a sidecar file in the
+# media folder.
+#
+# With -f, files are then only downloaded
+# again if they have changed upstream: the
+# request is made conditional, and if the
+# server answers in full anyway, its
+# headers are compared before the body is
+# read.
+#
+##########################################
+
+import json
+import os
+import threading
+import time
+
+import transport
+
+# Kept in the top of the media folder
+MEDIA_INDEX_NAME = ".gogscraper-media.json"
+
+class MediaIndex():
+
+	def __init__(self, download_path = ""):
+		self.download_path = download_path
+		self.index_path = os.path.join(download_path, MEDIA_INDEX_NAME)
+		self.lock = threading.Lock()
+
+		# Keys changed since the last save; other scrapers (e.g. --shard
+		# workers) may share the media folder
+		self.changed_keys = set()
+		self.entries = self.load()
+
+	def load(self):
+		""" Return the entries saved on disk """
+
+		if os.path.isfile(self.index_path) is False:
+			return {}
+		try:
+			f = open(self.index_path, "r", encoding = "utf-8")
+			entries = json.load(f)
+			f.close()
+			return entries
+		except Exception as e:
+			print("- Error, unable to read media index %s, it will be recreated" % self.index_path)
+			print(e)
+			return {}
+
+	def key(self, path = ""):
+		""" Files are indexed by their path within the media folder """
+
+		return os.path.relpath(path, self.download_path).replace(os.sep, "/")
+
+	def get(self, path = "", url = ""):
+		""" Return the entry of a file, or None if it is not indexed, came from another URL, or has changed on disk """
+
+		with self.lock:
+			entry = self.entries.get(self.key(path))
+		if (entry is None) or (entry['url'] != url):
+			return None
+		try:
+			if os.path.getsize(path) != entry['size']:
+				return None
+		except OSError:
+			return None
+		return entry
+
+	def add(self, path = "", url = "", headers = {}):
+		""" Record a file just downloaded from url, with the validators the server gave """
+
+		length = headers.get('Content-Length')
+		k = self.key(path)
+		with self.lock:
+			self.entries[k] = {
+				'url' : url,
+				'etag' : headers.get('ETag'),
+				'last_modified' : headers.get('Last-Modified'),
+				'length' : int(length) if length is not None else None,
+				'size' : os.path.getsize(path),
+				'time' : int(time.time()),
+			}
+			self.changed_keys.add(k)
+
+	def save(self):
+		""" Write this index's changes over the index on disk """
+
+		with self.lock:
+			if len(self.changed_keys) == 0:
+				return
+			entries = self.load()
+			for k in self.changed_keys:
+				entries[k] = self.entries[k]
+			self.entries = entries
+			self.changed_keys = set()
+
+		try:
+			f = open(self.index_path + "-tmp.%d" % os.getpid(), "w", encoding = "utf-8")
+			json.dump(entries, f, indent = 1, sort_keys = True)
+			f.close()
+			os.replace(self.index_path + "-tmp.%d" % os.getpid(), self.index_path)
+		except Exception as e:
+			print("- Error, unable to save media index %s" % self.index_path)
+			print(e)
+
+# One index per media folder, opened on first use
+indexes = {}
+indexes_lock = threading.Lock()
+
+def get_index(download_path = ""):
+	""" Return the index of a media folder """
+
+	with indexes_lock:
+		if download_path not in indexes:
+			indexes[download_path] = MediaIndex(download_path)
+		return indexes[download_path]
+
+def save_indexes():
+	""" Save every media index opened so far """
+
+	with indexes_lock:
+		opened = list(indexes.values())
+	for index in opened:
+		index.save()
+
+def download_media(url = "", download_path = "", folder = "", filename = "", kind = "other", overwrite = False):
+	""" Download url to filename in a folder of the media folder; True if a new copy was saved """
+
+	path = os.path.join(download_path, folder)
+	if os.path.isdir(path) is False:
+		print("- Error, download path %s does not exist" % path)
+		return False
+
+	filename = os.path.join(path, filename)
+	index = get_index(download_path)
+	entry = None
+	if os.path.isfile(filename):
+		if overwrite is False:
+			print("- ... already exists, skipping (Hint: -f to overwrite)")
+			return False
+		entry = index.get(filename, url)
+
+	r = transport.download(url, filename, kind, validators = entry)
+	if (r.status_code == 304):
+		print("- ... unchanged upstream, keeping %s" % filename)
+		return False
+	if (r.status_code == 200):
+		index.add(filename, url, r.headers)
+		print("- ... downloaded %s" % filename)
+		return True
+	print("- Skipped %s, query returned %s" % (url, r.status_code))
+	return False
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Combines the game data found by several
+# providers for the same rom, one field at
+# a time.
+#
+##########################################
+
+from config import MERGE_PRIORITY
+
+# Fields filled in from provider data, and so open to merging
+MERGE_FIELDS = ['name', 'realname', 'desc', 'releasedate', 'developer', 'publisher', 'genre', 'rating', 'players', 'video', 'screens', 'cover', 'marquee', 'title']
+
+def parse_priority(prefer = []):
+	""" Turn a list of 'field=provider[,provider]' strings into a priority dict """
+	
+	priority = {}
+	for p in prefer:
+		if "=" not in p:
+			print("- Ignoring field priority [%s], expected field=provider" % p)
+			continue
+		field, providers = p.split("=", 1)
+		field = field.strip()
+		if field not in MERGE_FIELDS:
+			print("- Ignoring field priority [%s], fields are: %s" % (p, ", ".join(MERGE_FIELDS)))
+			continue
+		priority[field] = [x.strip().lower() for x in providers.split(",") if x.strip()]
+	return priority
+
+def field_order(field = "", providers = [], priority = MERGE_PRIORITY):
+	""" Return the providers in the order they are used for a field """
+	
+	order = []
+	for p in priority.get(field, []):
+		if (p in providers) and (p not in order):
+			order.append(p)
+	for p in providers:
+		if p not in order:
+			order.append(p)
+	return order
+
+def merge_games(games = {}, providers = [], priority = MERGE_PRIORITY):
+	""" Merge a dict of provider name -> GameRecord into one GameRecord, recording the source of each field """
+	
+	order = [p for p in providers if p in games]
+	if len(order) == 0:
+		return False
+	
+	game = games[order[0]].copy()
+	game['sources'] = {}
+	for field in MERGE_FIELDS:
+		for p in field_order(field, order, priority):
+			value = games[p].get(field)
+			if value:
+				game[field] = value
+				game['sources'][field] = p
+				break
+	return game
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Keeps the metadata and media URLs found
+# for each provider game, so they can be
+# served again without asking the provider.
+#
+##########################################
+
+import json
+import os
+import threading
+import time
+
+from config import CACHE_DIR, METADATA_CACHE_TTL
+
+# Default location of the metadata cache
+METADATA_CACHE_PATH = os.path.join(CACHE_DIR, "metadata.json")
+
+class MetadataCache():
+	
+	def __init__(self, cache_path = METADATA_CACHE_PATH):
+		self.cache_path = cache_path
+		self.games = {}
+		self.changed = False
+		self.lock = threading.Lock()
+		
+		if os.path.isfile(self.cache_path):
+			try:
+				f = open(self.cache_path, "r", encoding = "utf-8")
+				self.games = json.load(f)
+				f.close()
+				print("- Loaded [%d] saved games from %s" % (len(self.games), self.cache_path))
+			except Exception as e:
+				print("- Error, unable to read metadata cache %s, it will be recreated" % self.cache_path)
+				print(e)
+				self.games = {}
+	
+	def key(self, provider = "", game_id = ""):
+		""" Games are saved per provider and provider id (or page URL) """
+		return "%s:%s" % (provider.lower(), game_id)
+	
+	def get(self, provider = "", game_id = "", ttl = METADATA_CACHE_TTL):
+		""" Return the saved game data, or None if there is no (current) entry """
+		
+		k = self.key(provider, game_id)
+		with self.lock:
+			if k not in self.games:
+				return None
+			entry = self.games[k]
+			if (time.time() - entry['time']) > ttl:
+				del self.games[k]
+				self.changed = True
+				return None
+			return entry['game']
+	
+	def add(self, provider = "", game_id = "", game = None):
+		""" Save the data of a game """
+		
+		with self.lock:
+			self.games[self.key(provider, game_id)] = {
+				'game' : game,
+				'time' : int(time.time()),
+			}
+			self.changed = True
+	
+	def items(self):
+		""" Return all of the saved games, as (provider, game) """
+		
+		with self.lock:
+			return [(k.split(":", 1)[0], entry['game']) for k, entry in self.games.items()]
+	
+	def save(self):
+		""" Write the cache back to disk, if anything has changed """
+		
+		with self.lock:
+			if self.changed is False:
+				return
+			
+			try:
+				os.makedirs(os.path.dirname(self.cache_path), exist_ok = True)
+				f = open(self.cache_path + "-tmp", "w", encoding = "utf-8")
+				json.dump(self.games, f, indent = 1, sort_keys = True)
+				f.close()
+				os.replace(self.cache_path + "-tmp", self.cache_path)
+				self.changed = False
+			except Exception as e:
+				print("- Error, unable to save metadata cache %s" % self.cache_path)
+				print(e)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Draws EmulationStation mix images (a
+# screenshot with the cover and marquee
+# laid over it) from the art downloaded
+# for each game, into <media>/miximages.
+#
+# Layouts are set in MIXIMAGE_LAYOUTS in
+# config.py. Images are drawn by a pool of
+# processes while the scrape carries on,
+# and only for games whose art (or the
+# layout) has changed since their mix
+# image was last drawn; that is worked out
+# from the size and modification time of
+# the art, kept in a sidecar file in the
+# miximages folder, without reading it.
+#
+# Needs Pillow (pip3 install pillow).
+#
+##########################################
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import json
+import multiprocessing
+import os
+import zlib
+
+from config import MEDIA_FOLDERS, MIXIMAGE_LAYOUT, MIXIMAGE_LAYOUTS, MIXIMAGE_WORKERS
+from planner import media_path
+
+# Kept in the miximages folder
+MIXIMAGE_INDEX_NAME = ".gogscraper-miximages.json"
+
+def has_pillow():
+	""" Whether mix images can be drawn; Pillow is optional, and only loaded by the workers drawing them """
+
+	return importlib.util.find_spec("PIL") is not None
+
+def layout_checksum(layout = None):
+	""" Return a checksum of a layout, so images are drawn again when it changes """
+
+	return "%08x" % zlib.crc32(json.dumps(layout, sort_keys = True).encode('utf-8'))
+
+def compose(layout = None, inputs = {}, output = ""):
+	""" Draw a mix image from the art files given by media type; return None, or the error. Runs in a worker process. """
+
+	try:
+		from PIL import Image
+
+		width, height = layout['size']
+		canvas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+		for layer in layout['layers']:
+			if layer['media'] not in inputs:
+				continue
+			img = Image.open(inputs[layer['media']])
+			img = img.convert("RGBA")
+
+			# Fit the box, larger or smaller, keeping the shape of the art
+			bx, by, bw, bh = [int(round(f * s)) for f, s in zip(layer['box'], (width, height, width, height))]
+			scale = min(bw / img.width, bh / img.height)
+			w = max(1, int(round(img.width * scale)))
+			h = max(1, int(round(img.height * scale)))
+			img = img.resize((w, h), Image.LANCZOS)
+
+			ax, ay = layer.get('align', (0.5, 0.5))
+			canvas.alpha_composite(img, (bx + int((bw - w) * ax), by + int((bh - h) * ay)))
+
+		canvas.save(output + "-tmp.%d" % os.getpid(), format = "PNG")
+		os.replace(output + "-tmp.%d" % os.getpid(), output)
+		return None
+	except Exception as e:
+		if os.path.isfile(output + "-tmp.%d" % os.getpid()):
+			os.remove(output + "-tmp.%d" % os.getpid())
+		return str(e)
+
+class Mixer():
+
+	def __init__(self, download_path = "", layout_name = MIXIMAGE_LAYOUT, workers = MIXIMAGE_WORKERS):
+		self.download_path = download_path
+		self.layout_name = layout_name
+		self.layout = MIXIMAGE_LAYOUTS[layout_name]
+		self.checksum = layout_checksum(self.layout)
+		self.workers = workers or os.cpu_count() or 1
+		self.folder = os.path.join(download_path, MEDIA_FOLDERS['miximage'])
+		self.index_path = os.path.join(self.folder, MIXIMAGE_INDEX_NAME)
+
+		# Started on first use, and stopped by finish()
+		self.executor = None
+
+		# Images being drawn: future -> (rom filename, index entry)
+		self.pending = {}
+
+		# Entries changed since the last save; other scrapers (e.g. --shard
+		# workers) may share the media folder
+		self.changed_keys = set()
+		self.counts = {'drawn' : 0, 'unchanged' : 0, 'failed' : 0}
+		self.entries = self.load()
+
+	def load(self):
+		""" Return the inputs each mix image was last drawn from """
+
+		if os.path.isfile(self.index_path) is False:
+			return {}
+		try:
+			f = open(self.index_path, "r", encoding = "utf-8")
+			entries = json.load(f)
+			f.close()
+			return entries
+		except Exception as e:
+			print("- Error, unable to read mix image index %s, it will be recreated" % self.index_path)
+			print(e)
+			return {}
+
+	def inputs(self, filename = ""):
+		""" Return the path, size and modification time of each art file of a game used by the layout, by media type """
+
+		inputs = {}
+		for layer in self.layout['layers']:
+			path = media_path(self.download_path, layer['media'], filename)
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			inputs[layer['media']] = (path, st.st_size, st.st_mtime_ns)
+		return inputs
+
+	def add(self, filename = ""):
+		""" Start drawing the mix image of a game, unless it is missing required art or is up to date; True if it was started """
+
+		inputs = self.inputs(filename)
+		for layer in self.layout['layers']:
+			if layer.get('required') and (layer['media'] not in inputs):
+				print("- No %s art, no mix image" % layer['media'])
+				return False
+
+		output = media_path(self.download_path, "miximage", filename)
+		entry = {
+			'layout' : self.layout_name,
+			'checksum' : self.checksum,
+			'inputs' : dict([(media_type, [size, mtime]) for media_type, (path, size, mtime) in inputs.items()]),
+		}
+		if os.path.isfile(output) and (self.entries.get(filename) == entry):
+			print("- Mix image is up to date, skipping")
+			self.counts['unchanged'] += 1
+			return False
+
+		if self.executor is None:
+			if os.path.isdir(self.folder) is False:
+				os.makedirs(self.folder)
+				print("- Created %s" % self.folder)
+			# Spawned, as on every platform, rather than forked from a
+			# process with download threads running
+			self.executor = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+
+		paths = dict([(media_type, path) for media_type, (path, size, mtime) in inputs.items()])
+		future = self.executor.submit(compose, self.layout, paths, output)
+		self.pending[future] = (filename, entry)
+		print("- Drawing mix image %s" % output)
+		self.collect()
+		return True
+
+	def collect(self, wait = False):
+		""" Record the mix images finished so far, or wait for all of them """
+
+		for future in list(self.pending.keys()):
+			if (wait is False) and (future.done() is False):
+				continue
+			filename, entry = self.pending.pop(future)
+			try:
+				error = future.result()
+			except Exception as e:
+				error = str(e)
+			if error:
+				print("- Error drawing mix image for %s" % filename)
+				print(error)
+				self.counts['failed'] += 1
+				continue
+			self.entries[filename] = entry
+			self.changed_keys.add(filename)
+			self.counts['drawn'] += 1
+
+	def finish(self):
+		""" Wait for the images still being drawn, stop the workers and save the index """
+
+		if len(self.pending) > 0:
+			print("")
+			print("Waiting for [%d] mix images" % len(self.pending))
+		self.collect(wait = True)
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+
+		if len(self.changed_keys) > 0:
+			# Only this mixer's own changes are written over what is on disk
+			entries = self.load()
+			for k in self.changed_keys:
+				entries[k] = self.entries[k]
+			self.entries = entries
+			self.changed_keys = set()
+			try:
+				f = open(self.index_path + "-tmp.%d" % os.getpid(), "w", encoding = "utf-8")
+				json.dump(entries, f, indent = 1, sort_keys = True)
+				f.close()
+				os.replace(self.index_path + "-tmp.%d" % os.getpid(), self.index_path)
+			except Exception as e:
+				print("- Error, unable to save mix image index %s" % self.index_path)
+				print(e)
+
+		if sum(self.counts.values()) > 0:
+			print("- Mix images: drawn [%d], unchanged [%d], failed [%d]" % (self.counts['drawn'], self.counts['unchanged'], self.counts['failed']))
+		self.counts = {'drawn' : 0, 'unchanged' : 0, 'failed' : 0}
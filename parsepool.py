@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Parses HTML response bodies in a pool of
+# worker processes, as BeautifulSoup holds
+# the GIL while it works: with several
+# providers, lookahead or server threads
+# fetching at once, their parsing would
+# otherwise take turns on one core.
+#
+# A worker is given the raw body and
+# returns a plain record (dicts, lists and
+# strings) of what was extracted from it;
+# the providers work from those records.
+#
+# The workers are only used once enable()
+# has been called, by a scraper or server
+# that fetches pages side by side; until
+# then, and for bodies under
+# PARSE_MIN_BYTES (quicker to parse than
+# to send to a worker), everything is
+# parsed in the calling thread, as it is
+# if PARSE_WORKERS is 1.
+#
+##########################################
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import multiprocessing
+import os
+import re
+import threading
+
+from config import PARSE_WORKERS, PARSE_MIN_BYTES
+
+##########################################
+#
+# Parsers, run in the worker processes.
+# bs4 is only imported by the parsers, so
+# runs that parse nothing never load it.
+#
+##########################################
+
+def html_to_text(html = ""):
+	""" Return the text of an HTML fragment """
+
+	from bs4 import BeautifulSoup as soup
+
+	return soup(html, 'html.parser').get_text()
+
+def parse_gog_search(html = ""):
+	""" Return the product tiles of a GOG.com search page, as {href, id, title} """
+
+	from bs4 import BeautifulSoup as soup
+
+	tiles = []
+	page = soup(html, 'html.parser')
+	for tag in page.find_all('a', 'product-tile'):
+		tile = {
+			'href' : tag.get('href'),
+			'id' : False,
+			'title' : None,
+		}
+		if tag.get('gog-product'):
+			tile['id'] = int(tag['gog-product'])
+		titles = tag.find_all('div', 'product-tile__title')
+		if len(titles) == 1:
+			tile['title'] = titles[0].get('title')
+		tiles.append(tile)
+	return tiles
+
+def parse_gog_page(html = ""):
+	""" Return the embedded json data block and metadata of a GOG.com game page; fields that could not be read are None, with the reason in 'errors' """
+
+	page = {
+		'card' : None,
+		'desc' : None,
+		'developer' : None,
+		'publisher' : None,
+		'genre' : None,
+		'rating' : None,
+		'releasedate' : None,
+		'errors' : {},
+	}
+
+	try:
+		for f in re.findall("cardProduct: {.*", html):
+			# The dict part, without the trailing javascript ','
+			page['card'] = json.loads(f.split("cardProduct: ")[1][0:-1])
+	except Exception as e:
+		page['errors']['card'] = str(e)
+
+	# Parsed once, for all of the fields below
+	try:
+		from bs4 import BeautifulSoup as soup
+		fragment = soup(html, 'html.parser')
+	except Exception as e:
+		for field in ['desc', 'developer', 'publisher']:
+			page['errors'][field] = str(e)
+		fragment = None
+
+	if fragment is not None:
+		try:
+			# <div class="description">blah blah blah</div>
+			for f in fragment.find_all('div', 'description'):
+				# Strip leading and trailing text from the entire description
+				page['desc'] = f.get_text().strip()
+				break
+		except Exception as e:
+			page['errors']['desc'] = str(e)
+
+		for field, pattern in [('developer', "^/games\\?developers\\="), ('publisher', "^/games\\?publishers\\=")]:
+			try:
+				for f in fragment.find_all(href = re.compile(pattern)):
+					page[field] = f.text
+					break
+			except Exception as e:
+				page['errors'][field] = str(e)
+
+	try:
+		# Genre is in a javascript label: eventLabel: 'CAT: Action'
+		for f in re.findall("eventLabel: 'CAT:.*", html):
+			page['genre'] = f.split("CAT: ")[1].split("'")[0]
+			break
+	except Exception as e:
+		page['errors']['genre'] = str(e)
+
+	try:
+		# Rating is in a json block: "ratingValue": "4.3"
+		for f in re.findall("ratingValue.*", html):
+			page['rating'] = float(f.split(':')[1].split('"')[1]) / 5
+			break
+	except Exception as e:
+		page['errors']['rating'] = str(e)
+
+	try:
+		for f in re.findall("globalReleaseDate\":\"....-..-..T..:..:..", html):
+			page['releasedate'] = f.split('"')[2].replace("-", "").replace(":", "")
+			break
+	except Exception as e:
+		page['errors']['releasedate'] = str(e)
+
+	return page
+
+##########################################
+#
+# The pool
+#
+##########################################
+
+class ParsePool():
+
+	def __init__(self, workers = PARSE_WORKERS, min_bytes = PARSE_MIN_BYTES):
+		self.workers = workers or os.cpu_count() or 1
+		self.min_bytes = min_bytes
+		self.lock = threading.Lock()
+
+		# Set by enable()
+		self.enabled = False
+
+		# Started on first use
+		self.executor = None
+
+	def enable(self):
+		""" Send large bodies to the workers from now on; only worth it when several threads fetch (and parse) at once """
+
+		self.enabled = True
+
+	def parse(self, parser = None, body = ""):
+		""" Return parser(body), from a worker process if the body is large enough to be worth sending to one """
+
+		if (self.enabled is False) or (self.workers < 2) or (len(body) < self.min_bytes):
+			return parser(body)
+
+		with self.lock:
+			if self.executor is None:
+				# Spawned, as on every platform, rather than forked from a
+				# process with download threads running
+				self.executor = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+			executor = self.executor
+
+		try:
+			# Only this thread waits; the others carry on fetching
+			return executor.submit(parser, body).result()
+		except BrokenProcessPool as e:
+			print("- Error in the parse workers, parsing here instead from now on")
+			print(e)
+			self.workers = 1
+			self.close()
+		except RuntimeError:
+			# Closed by another thread since; anything else came from
+			# the parser itself
+			if executor is self.executor:
+				raise
+		return parser(body)
+
+	def close(self):
+		""" Stop the worker processes, once nothing more is to be parsed; they are started again if needed """
+
+		with self.lock:
+			executor = self.executor
+			self.executor = None
+		if executor is not None:
+			executor.shutdown()
+
+# Shared by every provider
+pool = ParsePool()
+
+def parse(parser = None, body = ""):
+	""" Return the record parsed from a response body by one of the parsers above """
+
+	return pool.parse(parser, body)
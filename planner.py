@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Estimates the work a scrape would do
+# (searches, product fetches, downloads
+# and bytes) without touching the network.
+#
+##########################################
+
+import os
+
+from config import MEDIA_FOLDERS, PLAN_DEFAULT_BYTES, STEAM_CATALOG_MAX_AGE
+from providers import get_provider_info
+from stats import RequestStats
+from steamcatalog import SteamCatalog
+
+# Art types, in the order they are downloaded
+ART_TYPES = ["screens", "title", "marquee", "cover"]
+
+def media_path(download_path = "", media_type = "", filename = ""):
+	""" Where the downloaded file for this game and type of media is kept """
+
+	if media_type == "video":
+		filename = filename + ".mp4"
+	elif media_type == "miximage":
+		# Drawn here rather than downloaded, with a transparent background
+		filename = filename + ".png"
+	else:
+		filename = filename + ".jpg"
+	return os.path.join(download_path, MEDIA_FOLDERS[media_type], filename)
+
+def media_exists(download_path = "", media_type = "", filename = ""):
+	""" Is there already a downloaded file for this game and type of media """
+
+	return os.path.isfile(media_path(download_path, media_type, filename))
+
+def format_bytes(nbytes = 0):
+	""" Human readable byte count """
+
+	for unit in ["B", "KB", "MB", "GB"]:
+		if nbytes < 1024:
+			return "%.1f %s" % (nbytes, unit)
+		nbytes = nbytes / 1024
+	return "%.1f TB" % nbytes
+
+def get_plan(provider = "", games_list = [], games_xml_list = [], matches = None, download_path = "", enable_data = False, enable_art = False, enable_video = False, enable_overwrite = False, refresh_matches = False):
+	""" Count the work a scrape of games_list, a list of (rom filename, stripped name), would need without making any requests """
+
+	info = get_provider_info(provider)
+	media = info['media']
+
+	plan = {
+		'provider' : provider.lower(),
+		'roms' : len(games_list),
+		'saved' : 0,
+		'skipped' : 0,
+		'catalog' : 0,
+		'search' : 0,
+		'metadata' : 0,
+		'xml_new' : 0,
+		'xml_update' : 0,
+	}
+	for media_type in ART_TYPES + ["video"]:
+		plan[media_type] = 0
+
+	# A catalog provider needs one (large) download if its catalog is out of date
+	if (info['search'] == "catalog") and SteamCatalog().is_stale(STEAM_CATALOG_MAX_AGE):
+		plan['catalog'] = 1
+
+	for g, filename in games_list:
+		saved = None
+		if matches and (refresh_matches is False):
+			saved = matches.get(provider, g)
+
+		if saved is not None:
+			if saved.get('none'):
+				plan['skipped'] += 1
+				continue
+			plan['saved'] += 1
+		else:
+			# Assumes the search finds the game; this is an upper bound
+			plan['search'] += 1
+
+		# Every matched game has its product data fetched
+		plan['metadata'] += 1
+
+		if enable_data and media['data']:
+			if g in games_xml_list:
+				plan['xml_update'] += 1
+			else:
+				plan['xml_new'] += 1
+
+		if enable_art:
+			for art_type in ART_TYPES:
+				if media[art_type] and (enable_overwrite or (media_exists(download_path, art_type, filename) is False)):
+					plan[art_type] += 1
+
+		if enable_video and media['video']:
+			if enable_overwrite or (media_exists(download_path, "video", filename) is False):
+				plan['video'] += 1
+
+	# Searches against a local catalog need no requests
+	requests = {
+		'catalog' : plan['catalog'],
+		'search' : plan['search'] if info['search'] == "remote" else 0,
+		'metadata' : plan['metadata'],
+	}
+	for media_type in ART_TYPES + ["video"]:
+		requests[media_type] = plan[media_type]
+
+	# Bytes per request from the history of real requests to this provider,
+	# where there is one
+	averages = RequestStats().averages()
+	estimate = {}
+	for kind, n in requests.items():
+		k = "%s:%s" % (provider.lower(), kind)
+		if k in averages:
+			avg = averages[k]
+		else:
+			avg = PLAN_DEFAULT_BYTES[kind]
+		estimate[kind] = {
+			'requests' : n,
+			'bytes' : int(n * avg),
+			'history' : k in averages,
+		}
+	plan['estimate'] = estimate
+
+	return plan
+
+def print_plan(plan = {}):
+	""" Show a plan as returned by get_plan """
+
+	print("")
+	print("Scrape plan for [%s] (no network requests have been made):" % plan['provider'])
+	print("- ROMs: [%d]" % plan['roms'])
+	print("- Using saved match: [%d]" % plan['saved'])
+	print("- Skipped, no match on a previous run: [%d]" % plan['skipped'])
+	print("- Need search: [%d]" % plan['search'])
+	print("- Need product data: [%d]" % plan['metadata'])
+	print("- gamelist.xml entries: [%d] new, [%d] to update" % (plan['xml_new'], plan['xml_update']))
+	for media_type in ART_TYPES + ["video"]:
+		print("- Need %s: [%d]" % (media_type, plan[media_type]))
+
+	print("")
+	print("%-10s | %8s | %12s | %s" % ("Type", "Requests", "Est. bytes", "Based on"))
+	print("%-10s | %8s | %12s | %s" % ("----", "--------", "----------", "--------"))
+	total_requests = 0
+	total_bytes = 0
+	for kind, e in plan['estimate'].items():
+		if e['history']:
+			based_on = "previous runs"
+		else:
+			based_on = "defaults"
+		print("%-10s | %8d | %12s | %s" % (kind, e['requests'], format_bytes(e['bytes']), based_on))
+		total_requests += e['requests']
+		total_bytes += e['bytes']
+	print("%-10s | %8d | %12s |" % ("Total", total_requests, format_bytes(total_bytes)))
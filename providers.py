@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Registry of the available data providers.
+#
+# Capabilities are declared here so they can
+# be checked without importing a provider
+# module (and its bs4/fuzzywuzzy/pytube
+# dependencies) until it is actually used.
+#
+##########################################
+
+import importlib
+
+# Media folder names as used by EmulationStation
+# and their availability from each provider
+# ==============================================
+# 3dboxes			- No
+# backcovers		- No
+# covers			- Yes
+# fanart			- No
+# marquees			- Yes
+# miximages			- No
+# physicalmedia		- No
+# screenshots		- Yes
+# titlescreens		- No
+# videos			- Yes; linked Youtube clips (GOG.com), MP4 (Steam)
+#
+# 'search' is "remote" if each search is a request to the provider, or
+# "catalog" if it is made against a locally held list of games.
+#
+# 'prefetch' is "batch" if the data of several games comes from one
+# request (so is best fetched for many games at once), or "each" if every
+# game is a request of its own (so only the next few are fetched ahead).
+
+PROVIDERS = {
+	'gog' : {
+		'name' : "GOG.com",
+		'module' : "gog",
+		'class' : "GOG",
+		'search' : "remote",
+		'prefetch' : "each",
+		'media' : {
+			'3dboxes' : False,
+			'cover' : True,
+			'data' : True,
+			'marquee' : True,
+			'miximages' : False,
+			'screens' : True,
+			'physical' : False,
+			'video' : True,
+			'title' : False
+		},
+	},
+	'steam' : {
+		'name' : "Steam",
+		'module' : "steam",
+		'class' : "Steam",
+		'search' : "catalog",
+		'prefetch' : "batch",
+		'media' : {
+			'3dboxes' : False,
+			'cover' : True,
+			'data' : True,
+			'marquee' : True,
+			'miximages' : False,
+			'screens' : True,
+			'physical' : False,
+			'video' : True,
+			'title' : False
+		},
+	},
+}
+
+def get_provider_names():
+	""" Return the names of all registered providers """
+
+	return sorted(PROVIDERS.keys())
+
+def get_provider_info(name = ""):
+	""" Return the registry entry for a provider, or False if it is unknown """
+
+	if name and (name.lower() in PROVIDERS):
+		return PROVIDERS[name.lower()]
+	return False
+
+def get_media(name = ""):
+	""" Return the media capabilities of a provider without loading it """
+
+	info = get_provider_info(name)
+	if info:
+		return info['media']
+	return False
+
+def load_provider(name = "", debug = False, remote = None):
+	""" Import a provider module and return a new instance of it, or one that uses the scraper server at the remote URL """
+
+	info = get_provider_info(name)
+	if info is False:
+		return False
+
+	try:
+		if remote:
+			from remote import RemoteProvider
+			return RemoteProvider(remote, name, debug = debug)
+
+		module = importlib.import_module(info['module'])
+		provider_class = getattr(module, info['class'])
+		return provider_class(debug = debug)
+	except Exception as e:
+		print("- Error loading the %s data provider" % info['name'])
+		print(e)
+		return False
@@ -10,6 +10,14 @@
 
 import os
 from pytube import YouTube
+import pytube.request
+
+from scheduler import scheduler, PRIORITY_VIDEO
+from mediaindex import get_index
+from transport import is_unchanged
+
+# Smaller ranges let a bandwidth limit pace the stream evenly
+LIMITED_RANGE_SIZE = 1024 * 1024
 
 # Video size steps
 video_steps = ["480p", "720p", "360p"]
@@ -19,6 +27,11 @@ class PTWrapper():
 	def __init__(self):
 		pass
 	
+	def on_progress(self, stream, chunk, bytes_remaining):
+		""" Called by pytube for each range of the stream as it arrives """
+		
+		scheduler.throttle(len(chunk), PRIORITY_VIDEO)
+	
 	def download(self, game = None, download_path = "", art_type = "video", enable_overwrite = False):
 		""" Try to download a video from the url given """
 		
@@ -32,9 +45,23 @@ class PTWrapper():
 						print("- ... already exists, skipping (Hint: -f to overwrite)")
 						return False
 					else:
-						y = YouTube(game['video'])
-						s = y.streams.get_by_resolution(res)
-						s.download(output_path = path, filename = filename)
+						if scheduler.rate > 0:
+							pytube.request.default_range_size = min(pytube.request.default_range_size, LIMITED_RANGE_SIZE)
+						with scheduler.transfer(PRIORITY_VIDEO):
+							y = YouTube(game['video'], on_progress_callback = self.on_progress)
+							s = y.streams.get_by_resolution(res)
+							
+							# Stream URLs change every time, so the stream's format
+							# and size stand in for an ETag
+							index = get_index(download_path)
+							headers = {'ETag' : "%s-%s" % (s.itag, s.filesize), 'Content-Length' : str(s.filesize)}
+							entry = index.get(os.path.join(path, filename), game['video'])
+							if entry and is_unchanged(entry, headers):
+								print("- ... unchanged upstream, keeping %s" % (path + "/" + filename))
+								return False
+							
+							s.download(output_path = path, filename = filename)
+						index.add(os.path.join(path, filename), game['video'], headers)
 						print("- ... downloaded %s" % (path + "/" + filename))
 						return True
 						
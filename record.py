@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# The fixed set of fields kept for a game,
+# from search result to gamelist.xml entry.
+#
+# Search results are Candidates, holding
+# only what is needed to choose between
+# them; the chosen one becomes a GameRecord.
+#
+# Both use __slots__, so there is no dict
+# per result, and a misspelt field is an
+# error rather than a new key. Fields can
+# still be read and set as game['name'].
+#
+##########################################
+
+class Record():
+
+	__slots__ = ()
+
+	def __getitem__(self, k):
+		try:
+			return getattr(self, k)
+		except AttributeError:
+			raise KeyError(k)
+
+	def __setitem__(self, k, v):
+		if k not in self.__slots__:
+			raise KeyError("%s is not a field of %s" % (k, type(self).__name__))
+		setattr(self, k, v)
+
+	def __contains__(self, k):
+		return k in self.__slots__
+
+	def get(self, k, default = None):
+		""" Return a field, or default if there is no such field """
+
+		if k in self.__slots__:
+			return getattr(self, k)
+		return default
+
+	def keys(self):
+		return list(self.__slots__)
+
+	def items(self):
+		return [(k, getattr(self, k)) for k in self.__slots__]
+
+	def to_dict(self):
+		""" Return the fields as a dict, e.g. to save as JSON """
+
+		return dict(self.items())
+
+class Candidate(Record):
+
+	__slots__ = ('id', 'provider_id', 'url', 'name', 'score')
+
+	def __init__(self, name = "", idx = 0):
+		self.id = idx
+		self.provider_id = False
+		self.url = ""
+		self.name = name
+		self.score = 0
+
+	def to_record(self, path = "", filename = "", has_xml = False):
+		""" Return a GameRecord for the rom this search result was chosen for """
+
+		game = GameRecord(path, filename, self.id)
+		game.provider_id = self.provider_id
+		game.url = self.url
+		game.name = self.name
+		game.score = self.score
+		game.has_xml = has_xml
+		return game
+
+class GameRecord(Record):
+
+	__slots__ = ('id', 'provider_id', 'url', 'path', 'name', 'realname', 'filename',
+		'desc', 'releasedate', 'developer', 'publisher', 'genre', 'rating', 'players',
+		'video', 'screens', 'cover', 'marquee', 'title', 'has_xml', 'score', 'sources')
+
+	def __init__(self, path = "", filename = "", idx = 0):
+		self.id = idx
+		self.provider_id = False
+		self.url = ""
+		self.path = path
+		self.name = filename
+		self.realname = None
+		self.filename = filename
+		self.desc = ""
+		self.releasedate = ""
+		self.developer = ""
+		self.publisher = ""
+		self.genre = ""
+		self.rating = 0
+		self.players = 1
+		self.video = False
+		self.screens = False
+		self.cover = False
+		self.marquee = False
+		self.title = False
+		self.has_xml = False
+		self.score = 0
+
+		# The provider each field was taken from, once merged
+		self.sources = {}
+
+	def copy(self):
+		""" Return a shallow copy """
+
+		game = GameRecord()
+		for k in self.__slots__:
+			setattr(game, k, getattr(self, k))
+		return game
+
+	@classmethod
+	def from_dict(cls, data = {}):
+		""" Return a GameRecord with the fields found in a dict; anything else is left out """
+
+		game = cls()
+		for k, v in data.items():
+			if k in cls.__slots__:
+				setattr(game, k, v)
+		return game
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# A data provider that asks a scraper
+# server (server.py) instead of the store
+# itself. Used in place of each selected
+# provider with --remote.
+#
+# Art and Steam videos are downloaded
+# through the server's media cache; YouTube
+# videos (GOG.com) are still downloaded
+# locally.
+#
+# Art sizes are chosen by the server, from
+# its own ART_SIZES.
+#
+##########################################
+
+import json
+from urllib.parse import urlencode, urlsplit
+
+from config import ART_SIZES
+from mediaindex import download_media
+import transport
+
+# Video hosts that can not be fetched through the media cache
+STREAMING_HOSTS = ["youtube.com", "www.youtube.com", "youtu.be"]
+
+class RemoteProvider():
+
+	def __init__(self, server = "", provider = "", debug = False):
+		self.server = server.rstrip("/")
+		self.provider = provider.lower()
+		self.data_block = None
+		self.debug = debug
+
+		# Prefetched game data, keyed by provider id or URL
+		self.games = {}
+
+	def api(self, path = "", params = {}, kind = "metadata"):
+		""" Make a request to the server and return the decoded JSON, or False """
+
+		url = self.server + path + "?" + urlencode(params)
+		try:
+			r = transport.get(url, kind = "%s:%s" % (self.provider, kind))
+			if (r.status_code != 200):
+				print("- Skipped %s, server returned %s" % (url, r.status_code))
+				return False
+			return json.loads(r.text)
+		except Exception as e:
+			print("- Error making request to scraper server %s" % url)
+			print(e)
+			return False
+
+	def media_url(self, url = ""):
+		""" Return the URL of a media file in the server's cache """
+
+		if not url:
+			return False
+		return self.server + "/media?" + urlencode({'url' : url})
+
+	def refresh(self):
+		""" The server keeps its own data up to date """
+
+		pass
+
+	def get_search(self, name = "", quiet = False):
+		""" Get the search results for a game name from the server, or False if the search failed """
+
+		if quiet is False:
+			print("")
+			print("Searching %s (via %s) for %s:" % (self.provider, self.server, name))
+		search_results = self.api("/search", {'provider' : self.provider, 'name' : name}, "search")
+		if search_results is False:
+			return False
+		if quiet is False:
+			print("- Found [%d]" % len(search_results))
+		return search_results
+
+	def get_key(self, game = None):
+		""" Games are identified by provider id where there is one, otherwise by URL """
+
+		return str(game['provider_id'] or game['url'])
+
+	def get_game_data(self, game = None):
+		""" Retrieve the data of a game from the server, or False """
+
+		params = {'provider' : self.provider}
+		if game['provider_id']:
+			params['id'] = game['provider_id']
+		if game['url']:
+			params['url'] = game['url']
+		return self.api("/game", params)
+
+	def prefetch(self, games = [], quiet = False):
+		""" Retrieve the data of a list of games ahead of get_game """
+
+		for game in games:
+			k = self.get_key(game)
+			if k not in self.games:
+				data = self.get_game_data(game)
+				if data:
+					self.games[k] = data
+
+	def discard(self, games = []):
+		""" Drop any prefetched data for games that will not be used """
+
+		for game in games:
+			self.games.pop(self.get_key(game), None)
+
+	def get_game(self, game = None, game_url = ""):
+		""" Get the data of a single game """
+
+		print("")
+		print("Retrieving game data from %s (via %s) for %s:" % (self.provider, self.server, game['name']))
+
+		data = self.games.pop(self.get_key(game), None)
+		if data is not None:
+			print("- Using prefetched data")
+			return data
+		return self.get_game_data(game)
+
+	def get_data(self, game_url = "", text = None):
+		""" The server has already extracted the game data """
+
+		if text:
+			self.data_block = text
+			return True
+		return False
+
+	def get_game_by_id(self, game_id = ""):
+		""" Return the name and URL of the game with a given provider id, as {provider_id, name, url}, or False """
+
+		game = {'provider_id' : game_id, 'url' : ""}
+		data = self.get_game_data(game)
+		if data is False:
+			return False
+
+		# Keep the data for the get_game that follows
+		self.games[self.get_key(game)] = data
+		return {
+			'provider_id' : game_id,
+			'name' : data.get('realname') or data.get('name'),
+			'url' : data.get('url'),
+		}
+
+	def get_href_from_fragment(self, result = None, url_type = None):
+		""" Return the game page URL of a search result """
+
+		return result['url']
+
+	def get_id_from_fragment(self, result = None):
+		""" Return the provider id of a search result """
+
+		return result['id']
+
+	def get_gamename_from_fragment(self, result = None):
+		""" Return the game title of a search result """
+
+		return result['name']
+
+	def get_matchname_from_fragment(self, result = None):
+		""" Return the normalised game title of a search result """
+
+		return result['match_name']
+
+	def get_title_from_fragment(self, data = None):
+		return data.get('realname')
+
+	def get_description_from_fragment(self, data = None):
+		return data.get('desc')
+
+	def get_developer_from_fragment(self, data = None):
+		return data.get('developer')
+
+	def get_publisher_from_fragment(self, data = None):
+		return data.get('publisher')
+
+	def get_genre_from_fragment(self, data = None):
+		return data.get('genre')
+
+	def get_rating_from_fragment(self, data = None):
+		return data.get('rating')
+
+	def get_date_from_fragment(self, data = None):
+		return data.get('releasedate')
+
+	def get_players_from_fragment(self, data = None):
+		return data.get('players', 1)
+
+	def get_cover(self, width = ART_SIZES['cover']):
+		return self.media_url(self.data_block.get('cover'))
+
+	def get_marquee(self, width = ART_SIZES['marquee']):
+		return self.media_url(self.data_block.get('marquee'))
+
+	def get_screen(self, width = ART_SIZES['screens']):
+		return self.media_url(self.data_block.get('screens'))
+
+	def get_title(self, width = ART_SIZES['title']):
+		return self.media_url(self.data_block.get('title'))
+
+	def get_video(self):
+		return self.data_block.get('video')
+
+	def download_video(self, game = None, download_path = "", art_type = "video", enable_overwrite = False):
+		""" Download a video, through the server's media cache where possible """
+
+		if urlsplit(game[art_type]).hostname in STREAMING_HOSTS:
+			# pytube is only needed (and imported) once a video is downloaded
+			from pytubewrapper import PTWrapper
+
+			ptw = PTWrapper()
+			return ptw.download(game, download_path, "video", enable_overwrite)
+
+		try:
+			print("- Downloading stream")
+			return download_media(self.media_url(game[art_type]), download_path, "videos", game['filename'] + ".mp4", "%s:video" % self.provider, enable_overwrite)
+		except Exception as e:
+			print("- Error attempting to download %s" % game[art_type])
+			print(e)
+		return False
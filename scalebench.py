@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Measures how the scraper's own work
+# grows with the size of a library, using
+# synthetic rom folders, gamelists and
+# Steam catalogs, and the stub provider
+# (stubserver.py) in place of Steam.
+#
+# For each size it times (and with --memory,
+# takes the peak Python memory of) each stage:
+#
+# discovery	- listing the roms, reading gamelist.xml
+# catalog	- downloading, writing and opening the catalog
+# matching	- a fixed number of catalog searches
+# gamelist	- a fixed number of new entries, each
+#			  followed by re-reading the names, as a
+#			  scrape does
+# matches	- a fixed number of saved matches on top
+#			  of one per rom
+# media		- indexing a media file per rom, and
+#			  planning a scrape of every rom
+#
+# and how fast each grows between sizes, as
+# the exponent k in time ~ size^k. Whole
+# library stages should stay near 1 and
+# fixed batch stages near 0; anything well
+# above is flagged.
+#
+# $ python3 scalebench.py --sizes 1000,5000,20000
+#
+##########################################
+
+# Builtins and site packages
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Peak process memory is only available on Unix
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# Sizes relative to the number of roms, as in a large real library
+GAMELIST_RATIO = 2.5
+CATALOG_RATIO = 12.5
+
+# How much growth above the expected exponent is flagged
+EXPONENT_MARGIN = 0.5
+
+# Words synthetic titles are made of
+WORDS = ["Dark", "Star", "Quest", "Legend", "Shadow", "Iron", "Night", "Dragon", "Space", "Lost",
+	"Kingdom", "Battle", "City", "Dungeon", "Empire", "Fire", "Ghost", "Hero", "Island", "Knight",
+	"Magic", "Ocean", "Planet", "Rogue", "Sword", "Tower", "War", "World", "Zero", "Blade"]
+NUMERALS = ["", "", "", " 2", " 3", " II", " III", ": Remastered", " Deluxe Edition"]
+
+def make_names(n = 0, seed = 0):
+	""" Return n distinct synthetic game titles """
+
+	rng = random.Random(seed)
+	names = []
+	seen = set()
+	while len(names) < n:
+		name = " ".join(rng.choice(WORDS) for i in range(rng.randint(2, 4))) + rng.choice(NUMERALS)
+		if name in seen:
+			name = "%s %d" % (name, len(names))
+		seen.add(name)
+		names.append(name)
+	return names
+
+def make_roms(rom_path = "", names = []):
+	""" Create an (empty) shortcut for each title """
+
+	os.makedirs(rom_path, exist_ok = True)
+	for i, name in enumerate(names):
+		ext = ".desktop" if i % 2 else ".lnk"
+		open(os.path.join(rom_path, name.replace(":", "") + ext), "w").close()
+
+def make_gamelist(xml_path = "", roms = [], n = 0):
+	""" Write a gamelist.xml with n entries, for the roms first and then for roms no longer present """
+
+	f = open(xml_path, "w", encoding = "utf-8")
+	f.write("<gameList>")
+	for i in range(n):
+		if i < len(roms):
+			path = roms[i]
+		else:
+			path = "Removed Game %d.lnk" % i
+		f.write("<game><path>./%s</path><name>%s</name><desc>Synthetic entry %d</desc><releasedate>20200101T000000</releasedate><players>1</players></game>" % (path, os.path.splitext(path)[0], i))
+	f.write("</gameList>")
+	f.close()
+
+def make_catalog(names = [], n = 0, seed = 0):
+	""" Return n Steam apps, including every title given """
+
+	apps = []
+	for i, name in enumerate(names[:n]):
+		apps.append({'appid' : 100000 + i, 'name' : name})
+	for i, name in enumerate(make_names(max(0, n - len(apps)), seed + 1)):
+		apps.append({'appid' : 10000000 + i, 'name' : name + " Soundtrack"})
+	random.Random(seed).shuffle(apps)
+	return apps
+
+@contextlib.contextmanager
+def measure(results = {}, stage = "", trace = False):
+	""" Time a stage, or if trace is set record its peak traced memory instead, with its output hidden """
+
+	null = open(os.devnull, "w")
+	if trace:
+		tracemalloc.start()
+	start = time.perf_counter()
+	try:
+		with contextlib.redirect_stdout(null):
+			yield
+	finally:
+		elapsed = time.perf_counter() - start
+		null.close()
+		if trace:
+			# Tracing slows everything down too much to time at the same time
+			results[stage] = {'peak_bytes' : tracemalloc.get_traced_memory()[1]}
+			tracemalloc.stop()
+		else:
+			results[stage] = {'seconds' : elapsed}
+
+def run_size(work = "", size = 0, args_dict = {}, trace = False):
+	""" Generate a library of the given size and measure each stage on it; return {stage : measurements} """
+
+	from scraper import get_roms_list, get_rom_stripped_name, new_game_data
+	from gamelist import Gamelist
+	from matchcache import MatchCache
+	from mediaindex import MediaIndex
+	from planner import get_plan
+	from matcher import normalise, score, choose
+	from steam import Steam
+	import steamcatalog
+	import stubserver
+
+	n_gamelist = int(size * args_dict['gamelist_ratio'])
+	n_catalog = int(size * args_dict['catalog_ratio'])
+	batch = args_dict['batch']
+	seed = args_dict['seed']
+
+	print("")
+	print("Generating [%d] roms, [%d] gamelist.xml entries, [%d] catalog apps" % (size, n_gamelist, n_catalog))
+	base = os.path.join(work, "%d-memory" % size if trace else str(size))
+	rom_path = os.path.join(base, "roms")
+	xml_path = os.path.join(base, "gamelist.xml")
+	download_path = os.path.join(base, "media")
+	names = make_names(size + batch, seed)
+	make_roms(rom_path, names[:size])
+	roms = sorted(os.listdir(rom_path))
+	make_gamelist(xml_path, roms, n_gamelist)
+	stubserver.STEAM_APPS = make_catalog(names, n_catalog, seed)
+	for folder in ["screenshots", "covers", "marquees", "videos"]:
+		os.makedirs(os.path.join(download_path, folder))
+
+	results = {}
+
+	with measure(results, "discovery", trace):
+		get_roms_list(rom_path)
+		gl = Gamelist(xml_path)
+		games_xml_list = gl.names()
+
+	with measure(results, "catalog", trace):
+		p = Steam()
+		p.catalog = p.get_catalog()
+
+	with measure(results, "matching", trace):
+		for g in roms[:args_dict['searches']]:
+			g_n = normalise(get_rom_stripped_name(g))
+			found = []
+			for app in p.get_search(get_rom_stripped_name(g), quiet = True) or []:
+				found.append({'score' : score(g_n, p.get_matchname_from_fragment(app))})
+			choose(found)
+
+	with measure(results, "gamelist", trace):
+		for name in names[size:size + batch]:
+			game = new_game_data(name + ".lnk", name)
+			game['desc'] = "Added by the benchmark"
+			game['rating'] = 0
+			gl.add_game(game)
+			games_xml_list = gl.names()
+
+	matches = MatchCache(os.path.join(base, "matches.json"))
+	for g in roms:
+		matches.add("steam", g, {'provider_id' : 1, 'url' : "", 'name' : g})
+	matches.save()
+	with measure(results, "matches", trace):
+		for name in names[size:size + batch]:
+			matches.add("steam", name + ".lnk", {'provider_id' : 1, 'url' : "", 'name' : name})
+			matches.save()
+
+	with measure(results, "media", trace):
+		index = MediaIndex(download_path)
+		for g in roms:
+			path = os.path.join(download_path, "covers", get_rom_stripped_name(g) + ".jpg")
+			open(path, "wb").close()
+			index.add(path, "http://127.0.0.1/img/%s.jpg" % g, {'ETag' : '"%d"' % len(g), 'Content-Length' : "0"})
+		index.save()
+		get_plan("steam", [(g, get_rom_stripped_name(g)) for g in roms], games_xml_list, matches, download_path, enable_data = True, enable_art = True, enable_video = True)
+
+	if isinstance(p.catalog, steamcatalog.SteamCatalog):
+		p.catalog.close()
+	if args_dict['keep'] is False:
+		shutil.rmtree(base)
+	return results
+
+def format_size(nbytes = 0):
+	return "%.1fMB" % (nbytes / (1024 * 1024))
+
+def print_results(sizes = [], results = {}, expected = {}):
+	""" Show each stage's time and peak memory by size, and its growth exponent """
+
+	print("")
+	header = "%-10s" % "Stage"
+	for size in sizes:
+		header += " | %18s" % ("%d roms" % size)
+	header += " | %8s" % "Growth"
+	print(header)
+	print("-" * len(header))
+
+	flagged = []
+	for stage in expected.keys():
+		line = "%-10s" % stage
+		for size in sizes:
+			m = results[size][stage]
+			if 'peak_bytes' in m:
+				line += " | %8.3fs %9s" % (m['seconds'], format_size(m['peak_bytes']))
+			else:
+				line += " | %18s" % ("%.3fs" % m['seconds'])
+
+		# Between the smallest and largest sizes
+		k = None
+		t1 = results[sizes[0]][stage]['seconds']
+		t2 = results[sizes[-1]][stage]['seconds']
+		if (len(sizes) > 1) and (t1 > 0) and (t2 > 0):
+			k = math.log(t2 / t1) / math.log(sizes[-1] / sizes[0])
+			line += " | %8.2f" % k
+			if k > expected[stage] + EXPONENT_MARGIN:
+				line += "  <- grows faster than size^%d" % expected[stage]
+				flagged.append(stage)
+		print(line)
+
+	return flagged
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Measure how the scraper scales with the size of a (synthetic) library.', add_help = True)
+	parser.add_argument('--sizes', dest='sizes', action='store', default="500,2000,8000", required=False, help='Numbers of roms to measure, separated by commas (default 500,2000,8000)')
+	parser.add_argument('--gamelist-ratio', dest='gamelist_ratio', action='store', type=float, default=GAMELIST_RATIO, required=False, help='gamelist.xml entries per rom (default %s)' % GAMELIST_RATIO)
+	parser.add_argument('--catalog-ratio', dest='catalog_ratio', action='store', type=float, default=CATALOG_RATIO, required=False, help='Steam catalog apps per rom (default %s)' % CATALOG_RATIO)
+	parser.add_argument('--batch', dest='batch', action='store', type=int, default=50, required=False, help='New gamelist.xml entries and saved matches per size (default 50)')
+	parser.add_argument('--searches', dest='searches', action='store', type=int, default=20, required=False, help='Catalog searches per size (default 20)')
+	parser.add_argument('--seed', dest='seed', action='store', type=int, default=0, required=False, help='Seed for the synthetic titles (default 0)')
+	parser.add_argument('--port', dest='port', action='store', type=int, default=8767, required=False, help='Port for the stub provider (default 8767)')
+	parser.add_argument('--json', dest='json_path', action='store', required=False, help='Also save the results to this file, to compare between versions')
+	parser.add_argument('--memory', dest='memory', action='store_true', help='Also measure the peak Python memory of each stage, in a second (much slower) pass')
+	parser.add_argument('--keep', dest='keep', action='store_true', help='Keep the generated libraries')
+
+	args = parser.parse_args()
+	args_dict = vars(args)
+
+	try:
+		sizes = sorted(int(s) for s in args_dict['sizes'].split(","))
+	except ValueError:
+		print("The sizes must be numbers separated by commas, e.g. 1000,5000,20000")
+		sys.exit(1)
+
+	# Keep the synthetic catalog, matches and stats out of the real cache;
+	# set before anything else reads it
+	work = tempfile.mkdtemp(prefix = "gogscraper-scale-")
+	import config
+	config.CACHE_DIR = os.path.join(work, "cache")
+
+	import stubserver
+	httpd = stubserver.start(stubserver.STUB_HOST, args_dict['port'])
+	stubserver.StubHandler.log_message = lambda self, format, *args: None
+	stubserver.patch_providers(stubserver.StubHandler.base)
+
+	print("Scale benchmark running in %s" % work)
+	results = {}
+	try:
+		for size in sizes:
+			results[size] = run_size(work, size, args_dict)
+			# Each size downloads a catalog of its own
+			os.remove(os.path.join(config.CACHE_DIR, "steam_apps.bin"))
+			
+			if args_dict['memory']:
+				print("- Measuring memory")
+				for stage, m in run_size(work, size, args_dict, trace = True).items():
+					results[size][stage].update(m)
+				os.remove(os.path.join(config.CACHE_DIR, "steam_apps.bin"))
+	finally:
+		httpd.shutdown()
+		if args_dict['keep'] is False:
+			shutil.rmtree(work)
+
+	expected = {'discovery' : 1, 'catalog' : 1, 'matching' : 0, 'gamelist' : 0, 'matches' : 0, 'media' : 1}
+	flagged = print_results(sizes, results, expected)
+	print("")
+	if resource is not None:
+		# Includes the mapped catalog, which the traced peaks do not
+		print("- Peak process memory: %s" % format_size(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024))
+
+	if args_dict['json_path']:
+		f = open(args_dict['json_path'], "w", encoding = "utf-8")
+		json.dump({'sizes' : sizes, 'results' : results}, f, indent = 1)
+		f.close()
+		print("- Saved results to %s" % args_dict['json_path'])
+
+	if len(flagged) > 0:
+		print("- Growing faster than expected: %s" % ", ".join(flagged))
+		sys.exit(2)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Global bandwidth scheduler.
+#
+# Every transfer declares a priority class;
+# lower priority transfers pause while any
+# higher priority one is in progress, and
+# all of them share an optional bytes per
+# second cap.
+#
+##########################################
+
+from contextlib import contextmanager
+import threading
+import time
+
+from config import BANDWIDTH_LIMIT
+
+# Priority classes, highest first
+PRIORITY_METADATA = 0
+PRIORITY_ART = 1
+PRIORITY_VIDEO = 2
+PRIORITIES = [PRIORITY_METADATA, PRIORITY_ART, PRIORITY_VIDEO]
+
+# Request kinds ('<provider>:<type>') that are not metadata
+ART_TYPES = ["screens", "cover", "marquee", "title"]
+VIDEO_TYPES = ["video"]
+
+def priority_for(kind = ""):
+	""" Return the priority class of a '<provider>:<type>' request kind """
+	
+	t = kind.split(":")[-1]
+	if t in VIDEO_TYPES:
+		return PRIORITY_VIDEO
+	if t in ART_TYPES:
+		return PRIORITY_ART
+	return PRIORITY_METADATA
+
+def parse_rate(rate = ""):
+	""" Turn a rate such as '500K' or '2M' (bytes per second) into a number """
+	
+	rate = str(rate).strip().upper()
+	multiplier = 1
+	if rate.endswith("K"):
+		multiplier = 1024
+		rate = rate[:-1]
+	elif rate.endswith("M"):
+		multiplier = 1024 * 1024
+		rate = rate[:-1]
+	return int(float(rate) * multiplier)
+
+class BandwidthScheduler():
+	
+	def __init__(self, rate = BANDWIDTH_LIMIT):
+		self.cond = threading.Condition()
+		self.active = [0 for p in PRIORITIES]
+		self.set_rate(rate)
+	
+	def set_rate(self, rate = 0):
+		""" Set the bytes per second cap, 0 for none """
+		
+		with self.cond:
+			self.rate = rate
+			# Allow up to a second's worth of data in one burst
+			self.tokens = rate
+			self.last = time.monotonic()
+			self.cond.notify_all()
+	
+	@contextmanager
+	def transfer(self, priority = PRIORITY_METADATA):
+		""" Mark a transfer of the given priority as in progress """
+		
+		with self.cond:
+			self.active[priority] += 1
+		try:
+			yield
+		finally:
+			with self.cond:
+				self.active[priority] -= 1
+				self.cond.notify_all()
+	
+	def throttle(self, nbytes = 0, priority = PRIORITY_METADATA):
+		""" Wait until nbytes may be transferred at this priority """
+		
+		with self.cond:
+			while True:
+				# Higher priority transfers go first
+				if sum(self.active[:priority]) > 0:
+					self.cond.wait(0.1)
+					continue
+				
+				if self.rate <= 0:
+					return
+				
+				now = time.monotonic()
+				self.tokens = min(self.rate, self.tokens + ((now - self.last) * self.rate))
+				self.last = now
+				if self.tokens > 0:
+					# Large chunks may overdraw, later ones wait it off
+					self.tokens -= nbytes
+					return
+				self.cond.wait(min(1, max(0.01, -self.tokens / self.rate)))
+
+# The scheduler shared by everything in this process
+scheduler = BandwidthScheduler()
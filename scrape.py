@@ -5,87 +5,32 @@
 # Search for a game on gog.com and scrape
 # any metadata, as used by emulationstation.
 #
+# This is the command line front end; the
+# scraping itself is done by scraper.py.
+#
 ##########################################
 
 # Builtins and site packages
 import argparse
-import xml.etree.ElementTree as etree
-import os
-import requests
 import sys
 
-# Scraper types
-from gog import GOG as GProvider
-from steam import Steam as SProvider
-from gog import MEDIA as GMEDIA
-from steam import MEDIA as SMEDIA
+# Scraper types; provider modules are only imported once selected
+from providers import get_provider_names, get_provider_info
 
-# Gamelist.xml helper
-from gamelist import Gamelist
+# The scraper itself
+from scraper import Scraper, ScraperConfig
 
-def get_roms_list(path = ""):
-	""" Get the list of roms/files in a given directory """
-	
-	games = []
-	
-	print("Getting game names from %s:" % path)
-	
-	files = os.listdir(path)
-	for f in files:
-		if os.path.isfile(os.path.join(path,f)):			
-			games.append(f)
-	
-	print("- Found [%d] " % len(games))
-	return games
+# Work estimates for --plan
+from planner import print_plan
 
-def get_rom_stripped_name(game_name = ""):
-	""" Strip any extraneous extensions of the game names """
-	
-	g = game_name.replace('.desktop', '')
-	g = g.replace('.lnk', '')
-	g = g.replace('.LNK', '')
-	g = g.replace('./', '')
-		
-	return g
+# Shared bandwidth limit for downloads
+from scheduler import parse_rate
 
-def download_or_overwrite_art(game, download_path, art_type, overwrite):
-	
-	if art_type == "screens":
-		path = os.path.join(download_path, "screenshots")
-		
-	if art_type == "cover":
-		path = os.path.join(download_path, "covers")
-		
-	if art_type == "marquee":
-		path = os.path.join(download_path, "marquees")
-		
-	if art_type == "title":
-		path = os.path.join(download_path, "titlescreens")
-		
-	filename = game['filename'] + ".jpg"
-		
-	if game[art_type]:
-		print("- Downloading %s" % art_type)
-		
-		if os.path.isdir(path):
-		
-			if os.path.isfile(os.path.join(path, filename)) and (overwrite is False):
-				print("- ... already exists, skipping (Hint: -f to overwrite)")
-				return
-			
-			r = requests.get(game[art_type], stream=True)
-			if (r.status_code == 200):
-				f = open(path + "/" + filename, "wb")
-				for chunk in r.iter_content(chunk_size=128):
-					f.write(chunk)
-				f.close()
-				print("- ... downloaded %s" % (path + "/" + filename))
-				
-		else:
-			print("- Error, download path %s does not exist" % path)
-	
-	return
-	
+# Splitting the titles between several scrapers
+from shard import parse_shard, partial_path
+
+from config import MATCH_THRESHOLD, LOOKAHEAD_ROMS, BANDWIDTH_LIMIT, MIXIMAGE_LAYOUT, MIXIMAGE_LAYOUTS, MIXIMAGE_WORKERS
+from miximage import has_pillow
 
 def exit_abnormal(code, msg):
 	""" Exit abnormally """
@@ -103,290 +48,140 @@ if __name__ == "__main__":
 	parser.add_argument('-d', '--enable-data', dest='enable_data', action='store_true', help='Enable text metadata downloading')
 	parser.add_argument('-a', '--enable-art', dest='enable_art', action='store_true', help='Enable artwork (screens, titles, marquee, covers) image downloading')
 	parser.add_argument('-v', '--enable-video', dest='enable_video', action='store_true', help='Enable video downloading')
+	parser.add_argument('-m', '--miximages', dest='enable_miximages', action='store_true', help='Draw mix images (screenshot, cover and marquee) from the downloaded artwork into the miximages folder; needs Pillow')
 	parser.add_argument('-f', '--force', dest='enable_overwrite', action='store_true', help='Force overwrite of any existing artwork, video or metadata for each game')
 	parser.add_argument('--roms', dest='rom_path', action='store', required=True, help='Set the path to the folder of games you want to process')
 	parser.add_argument('--xml', dest='xml_path', action='store', required=True, help='Set the full path and filename of the gamelist.xml you wish to process')
 	parser.add_argument('--media', dest='download_path', action='store', required=True, help='Set the path to store downloaded media')
-	parser.add_argument('--provider', dest='provider', action='store', required=True, help='Set the data provider to "gog" or "steam"')
+	parser.add_argument('--provider', dest='provider', action='store', required=True, help='Set the data provider to "gog" or "steam", or several separated by commas (e.g. "gog,steam") or "all" to combine their data')
+	parser.add_argument('--prefer', dest='prefer', action='append', default=[], required=False, help='When using several providers, use this provider first for a field, e.g. "releasedate=steam" or "cover=gog,steam" (can be repeated)')
 	parser.add_argument('--start-from', dest='start_from', action='store', required=False, help='Ignore all titles that start before this letter (use to skip initial games in a partially scraped --roms folder)')
+	parser.add_argument('--match-threshold', dest='match_threshold', action='store', type=int, default=MATCH_THRESHOLD, required=False, help='Confidence (0-100) a search result needs to be selected without prompting (default %d)' % MATCH_THRESHOLD)
+	parser.add_argument('--refresh-matches', dest='refresh_matches', action='store_true', help='Ignore the games chosen (or not found) on previous runs and search for every title again')
+	parser.add_argument('--lookahead', dest='lookahead', action='store', type=int, default=LOOKAHEAD_ROMS, required=False, help='Number of upcoming titles to search for in the background while the current one is handled, 0 to disable (default %d)' % LOOKAHEAD_ROMS)
+	parser.add_argument('--bandwidth', dest='bandwidth', action='store', default=BANDWIDTH_LIMIT, required=False, help='Limit downloads to this many bytes per second, e.g. "500K" or "2M", 0 for no limit; metadata is always fetched before art, and art before video (default %s)' % BANDWIDTH_LIMIT)
+	parser.add_argument('--plan', dest='plan', action='store_true', help='Do not scrape anything, only estimate the searches, downloads and bytes a scrape with these options would need')
+	parser.add_argument('--watch', dest='watch', action='store_true', help='After scraping, keep running and scrape any new or renamed titles as they appear in the --roms folder (titles without a confident match are skipped, not prompted for)')
+	parser.add_argument('--remote', dest='remote', action='store', required=False, help='Use the scraper server (server.py) at this URL, e.g. "http://nas:8765", for searches, game data and media instead of the providers themselves')
+	parser.add_argument('--steam-library', dest='steam_library', action='append', nargs='?', const='', required=False, help='Match titles to the games installed by Steam at this Steam folder (or, with no folder, the usual Steam locations) and use their appids instead of searching (can be repeated)')
+	parser.add_argument('--shard', dest='shard', action='store', required=False, help='Only scrape share I of N of the titles, e.g. "2/4", writing to a partial gamelist (gamelist.xml.shard-2-of-4) to be merged with shard.py once every share is done')
+	parser.add_argument('--miximage-layout', dest='miximage_layout', action='store', default=MIXIMAGE_LAYOUT, choices=sorted(MIXIMAGE_LAYOUTS.keys()), required=False, help='Layout of the mix images, from MIXIMAGE_LAYOUTS in config.py (default %s)' % MIXIMAGE_LAYOUT)
+	parser.add_argument('--miximage-workers', dest='miximage_workers', action='store', type=int, default=MIXIMAGE_WORKERS, required=False, help='Processes drawing mix images, 0 for one per CPU (default %d)' % MIXIMAGE_WORKERS)
 	parser.add_argument('--rom', dest='rom', action='store', required=False, help='Ignore all other titles found and process this rom filename only (use to process only one game in the --roms folder). File extension not required.')
-	
+
 	args = parser.parse_args()
 	args_dict = vars(args)
 	enable_data = args_dict['enable_data']
 	enable_art = args_dict['enable_art']
 	enable_video = args_dict['enable_video']
 	enable_overwrite = args_dict['enable_overwrite']
+	enable_miximages = args_dict['enable_miximages']
 	provider = args_dict['provider']
 	rom_path = args_dict['rom_path']
 	xml_path = args_dict['xml_path']
 	download_path = args_dict['download_path']
 	start_from = args_dict['start_from']
 	rom_name = args_dict['rom']
-	
+	match_threshold = args_dict['match_threshold']
+	refresh_matches = args_dict['refresh_matches']
+	plan_only = args_dict['plan']
+	lookahead_roms = args_dict['lookahead']
+	watch = args_dict['watch']
+	remote = args_dict['remote']
+	steam_library = args_dict['steam_library']
+	if steam_library is not None:
+		# An empty list means the usual locations
+		steam_library = [path for path in steam_library if path]
+	shard = None
+	if args_dict['shard']:
+		try:
+			shard = parse_shard(args_dict['shard'])
+		except ValueError:
+			exit_abnormal(1, "The shard must be given as I/N, with I from 1 to N, e.g. 2/4")
+	try:
+		bandwidth = parse_rate(args_dict['bandwidth'])
+	except ValueError:
+		exit_abnormal(1, "The bandwidth limit must be a number of bytes per second, e.g. 500K or 2M")
+
+	# One or more providers, in order of preference
+	if provider.lower() == "all":
+		provider_names = get_provider_names()
+	else:
+		provider_names = []
+		for name in provider.lower().split(","):
+			if name.strip() and (name.strip() not in provider_names):
+				provider_names.append(name.strip())
+
 	print("")
-	print("Selected options: [data: %s] [art: %s] [video: %s] [overwrite: %s]" % (enable_data, enable_art, enable_video, enable_overwrite))
-	print("Additional options: [start_from: %s] [rom: %s]" % (start_from, rom_name))
-	print("Data provider: %s" % provider)
+	print("Selected options: [data: %s] [art: %s] [video: %s] [miximages: %s] [overwrite: %s]" % (enable_data, enable_art, enable_video, enable_miximages, enable_overwrite))
+	print("Additional options: [start_from: %s] [rom: %s] [match_threshold: %s] [refresh_matches: %s] [plan: %s] [lookahead: %s] [bandwidth: %s] [watch: %s] [remote: %s] [steam_library: %s] [shard: %s]" % (start_from, rom_name, match_threshold, refresh_matches, plan_only, lookahead_roms, bandwidth, watch, remote, steam_library, args_dict['shard']))
+	print("Data provider: %s" % ", ".join(provider_names))
 	print("ROM path: %s" % rom_path)
 	print("XML path: %s" % xml_path)
 	print("Media path: %s" % download_path)
-	
-	if provider.upper() not in ["GOG", "STEAM"]:
-		exit_abnormal(1, "You must set the provider to be either 'gog' or 'steam'")
-	
-	print("")
-	print("Loading data provider")
-	if provider.upper() == "GOG":
-		p = GProvider(debug = False)
-		if p is False:
-			exit_abnormal(1, "The GOG.com provider could not be initialised.")
-		else:
-			print("- GOG.com data provider initialised")
-		MEDIA = GMEDIA
-	if provider.upper() == "STEAM":
-		p = SProvider(debug = False)
-		if p is False:
-			exit_abnormal(1, "The Steam provider could not be initialised.")
-		else:
-			print("- Steam data provider initialised")
-		MEDIA = SMEDIA
-	
-	# Get a list of all games/roms in the rom folder
-	games_list = get_roms_list(rom_path)
-	games_list.sort()
-	
-	# Get a list of all games/roms in the xml file
-	print("Getting game names from gamelist.xml %s:" % xml_path)
-	gl = Gamelist(xml_path)
-	if gl is False:
-		exit_abnormal(1, "Unable to open or create gamelist.xml")
-	else:
-		games_xml_list = gl.names()
-		print("- Found [%d] " % len(games_xml_list))
-	
-	# Are we skipping a partially complete set of titles?
-	if start_from:
-		print("Filtering initial game names, starting at [%s]" % start_from)
-		new_games_list = []
-		for g in games_list:
-			if g[0].upper() < start_from.upper():
-				pass
-			else:
-				new_games_list.append(g)
-		games_list = new_games_list
-		print("- Filtered to [%d]" % len(games_list))
-		
-	# Are we looking for a single rom name?
-	if rom_name:
-		print("Looking for a single filename only")
-		print("- Rom name [%s]" % rom_name)
-		new_games_list = []
-		# Only use rom name if it matches a file we found in the directory
-		for g in games_list:
-			if g == rom_name:
-				games_list = [rom_name]
-		games_list = new_games_list
-	
-	# We search using the filename, stripped of any suffix
-	for g in games_list:	
-		
-		idx = 0
-		
-		game_matches = []
-		
-		# Get the search page results
-		g_s = get_rom_stripped_name(g)
-		search_results = p.get_search(g_s)
-		
-		# For each game object in the page of results....
-		for result in search_results:
-			
-			data = {
-				'id' : idx,	
-				'provider_id' : False,
-				'url' : "",
-				'path' : g,
-				'name' : g_s,
-				'filename' : g_s,
-				'desc' : "",
-				'releasedate' : "",
-				'developer' : "",
-				'publisher' : "",
-				'genre' : "",
-				'players' : 1,
-				'video' :  False,
-				'screens' :  False,
-				'cover' : False,
-				'marquee' : False,
-				'title' : False,
-				'has_xml' : False,
-			}
-
-			# Store the steam appid
-			if provider.upper() == "STEAM":
-				data['provider_id'] = result['appid']
 
-			# Does this title already have a gamelist.xml entry?
-			if g in games_xml_list:
-				data['has_xml'] = True
-
-			# Try to extract real game name
-			# and use it to replace the stripped filename
-			n = p.get_gamename_from_fragment(result)
-			if n:
-				data['name'] = n
-
-			# Try to extract URL to game page
-			data['url'] = p.get_href_from_fragment(result, url_type = "game")
+	if len(provider_names) == 0:
+		exit_abnormal(1, "You must set the provider to be one of: %s" % ", ".join(get_provider_names()))
+	for name in provider_names:
+		if get_provider_info(name) is False:
+			exit_abnormal(1, "You must set the provider to be one of: %s" % ", ".join(get_provider_names()))
+	if enable_miximages and (has_pillow() is False):
+		exit_abnormal(1, "Mix images need the Pillow package (pip3 install pillow)")
+
+	config = ScraperConfig(rom_path, xml_path, download_path,
+		providers = provider_names,
+		enable_data = enable_data,
+		enable_art = enable_art,
+		enable_video = enable_video,
+		enable_overwrite = enable_overwrite,
+		prefer = args_dict['prefer'],
+		start_from = start_from,
+		rom = rom_name,
+		match_threshold = match_threshold,
+		refresh_matches = refresh_matches,
+		lookahead = lookahead_roms,
+		bandwidth = bandwidth,
+		remote = remote,
+		steam_library = steam_library,
+		shard = shard,
+		enable_miximages = enable_miximages,
+		miximage_layout = args_dict['miximage_layout'],
+		miximage_workers = args_dict['miximage_workers'])
+	scraper = Scraper(config)
+	if len(provider_names) > 1:
+		print("Field priority: %s" % scraper.priority)
+
+	# Only estimating the work, without touching the network?
+	if plan_only:
+		for plan in scraper.plan():
+			print_plan(plan)
+		sys.exit(0)
+
+	if scraper.open() is False:
+		exit_abnormal(1, "The data providers could not be initialised.")
+
+	# Shortcuts added while the first scrape runs are picked up by the watch
+	if watch:
+		scraper.start_watching()
+
+	# Progress is shown as each rom is processed
+	for result in scraper.scrape():
+		pass
+	
+	if shard and (watch is False):
+		print("")
+		print("Shard %d of %d done, written to %s" % (shard[0], shard[1], partial_path(xml_path, shard)))
+		print("- Once every shard is done, merge them with: python3 shard.py %s" % xml_path)
 
-			# Add this game entry
-			game_matches.append(data)
-			
-			# Increment result ID
-			idx += 1
-		
+	# Carry on, scraping any shortcuts added from now on
+	if watch:
 		print("")
-		print("%2s | %-70s | %s" % ("ID", "Name", "URL"))
-		print("%2s | %-70s | %s" % ("--", "-----", "-----"))
-		for game in game_matches:
-			print("%2d | %-70s | %s" % (game['id'], game['name'], game['url']))
-		
-		# If we have only one match, and it is an exact match, then continue
-		if (len(game_matches) == 1) and (game_matches[0]['name'].upper() == g_s.upper()):
-			continue_id = game_matches[0]['id']
-			game = game_matches[0]
-			print("")
-			print("Got one exact match!")
-		else:
-			game = False
-			continue_id = False
-				
-		if (continue_id is False) and (len(game_matches) > 0):
-			print("")
-			print("Enter an ID to use the metadata and media from that title.")
-			print("(Hint: Control+Click on the URL to open the page in your browser)")
-			print("")
-			i = input()
-			
-			# Make sure this is the ID of a game we found
-			found = False
-			game = False
-			if i:
-				try:
-					i = int(i)
-				except Exception as e:
-					print("Not a valid input")
-					print(e)
-					i = -1
-				for g in game_matches:
-					if i == g['id']:
-						found = True
-						game = g	
-				if game is False:
-					print("")
-					print("Sorry, that is not a valid found game ID")
-				
-		if game:
+		print("Watch mode, Control+C to stop")
+		try:
+			for result in scraper.watch():
+				pass
+		except KeyboardInterrupt:
 			print("")
-			print("Continuing with ID %s, %s" % (game['id'], game['name']))
-			game_html = p.get_game(game, game_url = game['url'])
-			
-			if game_html:
-				
-				# Update
-				has_data = p.get_data(game['url'], game_html)
-				
-				if has_data:
-
-					# Basic metadata
-					if MEDIA['data']:
-						game['realname'] = p.get_title_from_fragment(game_html)
-						game['desc'] = p.get_description_from_fragment(game_html)
-						game['developer'] = p.get_developer_from_fragment(game_html)
-						game['publisher'] = p.get_publisher_from_fragment(game_html)
-						game['genre'] = p.get_genre_from_fragment(game_html)
-						game['rating'] = p.get_rating_from_fragment(game_html)
-						game['releasedate'] = p.get_date_from_fragment(game_html)
-						game['players'] = p.get_players_from_fragment(game_html)
-						for k in ['desc', 'developer', 'publisher', 'name', 'realname']:
-							if game[k]:
-								game[k] = str(game[k]).encode(encoding="ascii", errors="replace").decode(encoding='ascii', errors='replace')
-					# Video
-					if MEDIA['video']:
-						if enable_video:
-							game['video'] = p.get_video()
-						else:
-							print("- Video downloads are disabled (Hint: -v to retrieve video)")
-					else:
-						print("- Provider does not support video")
-				
-					# Title screen
-					if MEDIA['title']:
-						if enable_art:
-							game['title'] = p.get_title()
-						else:
-							print("- Title artwork downloading is disabled (Hint: -a to retrieve artwork)")
-					else:
-						print("- Provider does not support title screens")
-				
-					# Screenshot
-					if MEDIA['screens']:
-						if enable_art:
-							game['screens'] = p.get_screen()
-						else:
-							print("- Screenshot downloading is disabled (Hint: -a to retrieve artwork)")
-					else:
-						print("- Provider does not support screenshots")
-				
-					# Marquee
-					if MEDIA['marquee']:
-						if enable_art:
-							game['marquee'] = p.get_marquee()
-						else:
-							print("- Marquee artwork downloading is disabled (Hint: -a to retrieve artwork)")
-					else:
-						print("- Provider does not support marquee images")
-				
-					# Cover art
-					if MEDIA['cover']:
-						if enable_art:
-							game['cover'] = p.get_cover()
-						else:
-							print("- Cover artwork downloading is disabled (Hint: -a to retrieve artwork)")
-					else:
-						print("- Provider does not support cover or box art")
-			
-					# Download external media
-					if (enable_art):
-						print("")
-						print("Downloading external art assets")		
-						for art_type in ["screens", "title", "marquee", "cover"]:
-							download_or_overwrite_art(game, download_path, art_type, enable_overwrite)
+			print("Stopped watching %s" % rom_path)
 
-					if (enable_video):
-						print("")
-						print("Downloading external video assets")
-						p.download_video(game, download_path, "video", enable_overwrite)
-					
-					# Update xml metadata
-					if (enable_data):
-						print("")
-						print("Updating gamelist.xml metadata")
-						if (game['has_xml']):
-							# Find and edit existing entry
-							if (enable_overwrite):
-								print("- Updating existing gamelist.xml entry")
-							else:
-								print("- Updating existing gamelist.xml entry (missing fields only)")
-							gl.update_game(game, enable_overwrite)
-						else:
-							# Add new entry
-							print("- Creating new gamelist.xml entry")
-							gl.add_game(game, enable_overwrite)
-						
-						# Update the list of games with XML, in case we find a match in any
-						# subsequent loops
-						games_xml_list = gl.names()
-				else:
-					print("- Skipping, no data was retrieved")
\ No newline at end of file
+	scraper.close()
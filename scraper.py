@@ -0,0 +1,813 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Library interface to the scraper.
+#
+# A Scraper keeps its providers, connections,
+# saved matches and gamelist.xml open between
+# calls, and yields a ScrapeResult for each
+# rom as soon as it is finished. scrape.py is
+# the command line front end to it.
+#
+##########################################
+
+# Builtins and site packages
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+# Pooled HTTP sessions shared with the data providers
+import transport
+
+# Scraper types; provider modules are only imported once selected
+from providers import get_provider_info, get_media, load_provider
+
+# Gamelist.xml helper
+from gamelist import Gamelist
+
+# Search results, and the games chosen from them
+from record import Candidate, GameRecord
+
+# Saved match decisions from previous runs
+from matchcache import MatchCache
+
+# Work estimates
+from planner import get_plan, media_path, ART_TYPES
+
+# Background searches and fetches while prompting
+from lookahead import Lookahead
+
+# Shared bandwidth limit and priorities for downloads
+from scheduler import scheduler, parse_rate
+
+# New shortcuts appearing in the roms folder
+from watcher import Watcher
+
+# Splitting the roms between several scrapers
+from shard import in_shard, make_partial
+
+# Validators of downloaded media, for conditional re-downloads
+from mediaindex import download_media, save_indexes
+
+# Mix images drawn from the downloaded art
+from miximage import Mixer, has_pillow
+
+# Worker processes parsing HTML for the providers
+import parsepool
+
+# Store ids given by the shortcuts themselves, or by installed Steam games
+from shortcuts import get_shortcut_ids
+from steamlibrary import SteamLibrary
+
+# Name normalisation and match scoring
+from config import MATCH_THRESHOLD, MEDIA_FOLDERS, LOOKAHEAD_ROMS, LOOKAHEAD_WORKERS, SCRAPE_BATCH_SIZE, MERGE_PRIORITY, BANDWIDTH_LIMIT, STEAM_ROOTS, MIXIMAGE_LAYOUT, MIXIMAGE_WORKERS
+from matcher import normalise, score, choose
+
+# Field by field merging of data from several providers
+from merge import merge_games, parse_priority
+
+# The outcome of each rom
+RESULT_SCRAPED = "scraped"
+RESULT_NO_MATCH = "no match"
+RESULT_NO_DATA = "no data"
+
+def get_roms_list(path = ""):
+	""" Get the list of roms/files in a given directory """
+	
+	games = []
+	
+	print("Getting game names from %s:" % path)
+	
+	files = os.listdir(path)
+	for f in files:
+		if os.path.isfile(os.path.join(path,f)):			
+			games.append(f)
+	
+	print("- Found [%d] " % len(games))
+	return games
+
+def get_rom_stripped_name(game_name = ""):
+	""" Strip any extraneous extensions of the game names """
+	
+	g = game_name.replace('.desktop', '')
+	g = g.replace('.lnk', '')
+	g = g.replace('.LNK', '')
+	g = g.replace('./', '')
+		
+	return g
+
+def new_game_data(game_name = "", stripped_name = "", idx = 0):
+	""" Return a new, empty, game entry for a rom """
+	
+	return GameRecord(game_name, stripped_name, idx)
+
+def download_or_overwrite_art(game, download_path, art_type, overwrite, provider = ""):
+	
+	filename = game['filename'] + ".jpg"
+		
+	if game[art_type]:
+		print("- Downloading %s" % art_type)
+		
+		# With overwrite, only if it has changed since it was downloaded
+		try:
+			download_media(game[art_type], download_path, MEDIA_FOLDERS[art_type], filename, "%s:%s" % (provider.lower(), art_type), overwrite)
+		except Exception as e:
+			print("- Error attempting to download %s" % game[art_type])
+			print(e)
+	
+	return
+	
+
+def resolve_game(p, provider, g, games_xml_list, matches, lookahead, match_threshold = MATCH_THRESHOLD, refresh_matches = False, prompt = True, provider_id = None):
+	""" Search a provider for a rom (unless its provider_id is already known) and return the chosen game, or False """
+
+	found = search_game(p, provider, g, games_xml_list, matches, lookahead, refresh_matches, provider_id)
+	if isinstance(found, list):
+		return choose_game(provider, g, games_xml_list, matches, lookahead, found, match_threshold, prompt)
+	return found
+
+def search_game(p, provider, g, games_xml_list, matches, lookahead, refresh_matches = False, provider_id = None):
+	""" Search a provider for a rom (unless it was matched before, or its provider_id is already known) and return the results to choose from, best first, or the game (or False) if there is no choice to make """
+
+	idx = 0
+
+	game_matches = []
+
+	# Get the search page results
+	g_s = get_rom_stripped_name(g)
+	g_n = normalise(g_s)
+
+	# Have we already matched this rom on a previous run?
+	saved = None
+	if refresh_matches is False:
+		saved = matches.get(provider, g)
+	if saved is not None:
+		print("")
+		if saved.get('none'):
+			print("Skipping %s, no match was found on a previous run (Hint: --refresh-matches to search again)" % g)
+			return False
+		game = new_game_data(g, g_s)
+		game['provider_id'] = saved['provider_id']
+		game['url'] = saved['url']
+		game['name'] = saved['name']
+		game['has_xml'] = (g in games_xml_list)
+		print("Using saved match for %s: %s" % (g, game['name']))
+		return game
+	
+	# The shortcut (or an installed game) says which game it is, so there
+	# is nothing to search for
+	if provider_id:
+		print("")
+		print("Looking up %s id %s for %s" % (provider, provider_id, g))
+		found = p.get_game_by_id(provider_id)
+		if found:
+			game = new_game_data(g, g_s)
+			game['provider_id'] = found['provider_id']
+			game['url'] = found['url']
+			if found['name']:
+				game['name'] = found['name']
+			game['has_xml'] = (g in games_xml_list)
+			game['score'] = 100
+			print("- Found %s" % game['name'])
+			matches.add(provider, g, game)
+			matches.save()
+			return game
+		print("- Not found, searching instead")
+
+	search_results = lookahead.get_search(g_s)
+	if search_results is False:
+		# Not the same as no results: nothing is saved, so it is searched
+		# for again on the next run
+		print("- Search failed, %s will be searched for again on the next run" % g)
+		return False
+
+	# For each game object in the page of results....
+	for result in search_results:
+
+		data = Candidate(g_s, idx)
+
+		# Store the provider's own id for the game, if it has one
+		data.provider_id = p.get_id_from_fragment(result)
+
+		# Try to extract real game name
+		# and use it to replace the stripped filename
+		n = p.get_gamename_from_fragment(result)
+		if n:
+			data.name = n
+
+		# Try to extract URL to game page
+		data.url = p.get_href_from_fragment(result, url_type = "game")
+
+		# How confident are we this is the right game
+		data.score = score(g_n, p.get_matchname_from_fragment(result))
+
+		# Add this game entry
+		game_matches.append(data)
+
+	# Best matches first, numbered in that order
+	game_matches.sort(key = lambda m: m.score, reverse = True)
+	for game in game_matches:
+		game.id = idx
+		idx += 1
+
+	return game_matches
+
+def choose_game(provider, g, games_xml_list, matches, lookahead, game_matches = [], match_threshold = MATCH_THRESHOLD, prompt = True):
+	""" Show the search results for a rom and return the game chosen from them, as a confident match or by the user, or False """
+
+	g_s = get_rom_stripped_name(g)
+
+	print("")
+	print("%2s | %5s | %-70s | %s" % ("ID", "Score", "Name", "URL"))
+	print("%2s | %5s | %-70s | %s" % ("--", "-----", "-----", "-----"))
+	for game in game_matches:
+		print("%2d | %5d | %-70s | %s" % (game['id'], game['score'], game['name'], game['url']))
+
+	# If one match is confidently better than all others, then continue
+	game = choose(game_matches, threshold = match_threshold)
+	if game:
+		continue_id = game['id']
+		print("")
+		print("Got a confident match! [score: %d]" % game['score'])
+		lookahead.prefetch_candidates([game])
+	else:
+		game = False
+		continue_id = False
+
+	i = None
+	if (continue_id is False) and (len(game_matches) > 0) and (prompt is False):
+		# Nobody to ask; leave it for a run that can prompt
+		print("")
+		print("No confident match, skipping %s (Hint: run without --watch to choose one)" % g)
+		return False
+	
+	if (continue_id is False) and (len(game_matches) > 0):
+
+		# Fetch the best candidates while the user decides
+		lookahead.prefetch_candidates(game_matches)
+
+		print("")
+		print("Enter an ID to use the metadata and media from that title.")
+		print("(Hint: Control+Click on the URL to open the page in your browser)")
+		print("")
+		i = input()
+
+		# Make sure this is the ID of a game we found
+		game = False
+		if i:
+			try:
+				i = int(i)
+			except Exception as e:
+				print("Not a valid input")
+				print(e)
+				i = -1
+			for m in game_matches:
+				if i == m['id']:
+					game = m
+			if game is False:
+				print("")
+				print("Sorry, that is not a valid found game ID")
+
+		lookahead.chosen(game, game_matches)
+
+	if game:
+		# Only the chosen result needs the full set of fields
+		game = game.to_record(g, g_s, g in games_xml_list)
+		matches.add(provider, g, game)
+	elif (len(game_matches) == 0) or (i == ""):
+		# Nothing found, or none of the results were right
+		matches.add_negative(provider, g)
+	matches.save()
+
+	return game
+
+def get_game_data(p, media, game, enable_art = False, enable_video = False):
+	""" Fill in the metadata and media URLs of a chosen game from its provider """
+
+	print("")
+	print("Continuing with ID %s, %s" % (game['id'], game['name']))
+	game_html = p.get_game(game, game_url = game['url'])
+
+	if not game_html:
+		print("- Skipping, no data was retrieved")
+		return False
+
+	# Update
+	has_data = p.get_data(game['url'], game_html)
+
+	if not has_data:
+		print("- Skipping, no data was retrieved")
+		return False
+
+	# Basic metadata
+	if media['data']:
+		game['realname'] = p.get_title_from_fragment(game_html)
+		game['desc'] = p.get_description_from_fragment(game_html)
+		game['developer'] = p.get_developer_from_fragment(game_html)
+		game['publisher'] = p.get_publisher_from_fragment(game_html)
+		game['genre'] = p.get_genre_from_fragment(game_html)
+		game['rating'] = p.get_rating_from_fragment(game_html)
+		game['releasedate'] = p.get_date_from_fragment(game_html)
+		game['players'] = p.get_players_from_fragment(game_html)
+		for k in ['desc', 'developer', 'publisher', 'name', 'realname']:
+			if game[k]:
+				game[k] = str(game[k]).encode(encoding="ascii", errors="replace").decode(encoding='ascii', errors='replace')
+	# Video
+	if media['video']:
+		if enable_video:
+			game['video'] = p.get_video()
+		else:
+			print("- Video downloads are disabled (Hint: -v to retrieve video)")
+	else:
+		print("- Provider does not support video")
+
+	# Title screen
+	if media['title']:
+		if enable_art:
+			game['title'] = p.get_title()
+		else:
+			print("- Title artwork downloading is disabled (Hint: -a to retrieve artwork)")
+	else:
+		print("- Provider does not support title screens")
+
+	# Screenshot
+	if media['screens']:
+		if enable_art:
+			game['screens'] = p.get_screen()
+		else:
+			print("- Screenshot downloading is disabled (Hint: -a to retrieve artwork)")
+	else:
+		print("- Provider does not support screenshots")
+
+	# Marquee
+	if media['marquee']:
+		if enable_art:
+			game['marquee'] = p.get_marquee()
+		else:
+			print("- Marquee artwork downloading is disabled (Hint: -a to retrieve artwork)")
+	else:
+		print("- Provider does not support marquee images")
+
+	# Cover art
+	if media['cover']:
+		if enable_art:
+			game['cover'] = p.get_cover()
+		else:
+			print("- Cover artwork downloading is disabled (Hint: -a to retrieve artwork)")
+	else:
+		print("- Provider does not support cover or box art")
+
+	return True
+
+def update_gamelist(gl, game, enable_overwrite = False):
+	""" Add or update the gamelist.xml entry of a game """
+
+	print("")
+	print("Updating gamelist.xml metadata")
+	if (game['has_xml']):
+		# Find and edit existing entry
+		if (enable_overwrite):
+			print("- Updating existing gamelist.xml entry")
+		else:
+			print("- Updating existing gamelist.xml entry (missing fields only)")
+		gl.update_game(game, enable_overwrite)
+	else:
+		# Add new entry
+		print("- Creating new gamelist.xml entry")
+		gl.add_game(game, enable_overwrite)
+
+class ScraperConfig():
+	
+	def __init__(self, rom_path = "", xml_path = "", download_path = "", providers = ["gog"], enable_data = False, enable_art = False, enable_video = False, enable_overwrite = False, prefer = [], start_from = None, rom = None, match_threshold = MATCH_THRESHOLD, refresh_matches = False, lookahead = LOOKAHEAD_ROMS, bandwidth = BANDWIDTH_LIMIT, prompt = True, remote = None, steam_library = None, shard = None, enable_miximages = False, miximage_layout = MIXIMAGE_LAYOUT, miximage_workers = MIXIMAGE_WORKERS):
+		self.rom_path = rom_path
+		self.xml_path = xml_path
+		self.download_path = download_path
+		
+		# In order of preference
+		self.providers = list(providers)
+		
+		self.enable_data = enable_data
+		self.enable_art = enable_art
+		self.enable_video = enable_video
+		self.enable_overwrite = enable_overwrite
+		
+		# Field priorities over MERGE_PRIORITY, as given to --prefer
+		self.prefer = list(prefer)
+		
+		self.start_from = start_from
+		self.rom = rom
+		self.match_threshold = match_threshold
+		self.refresh_matches = refresh_matches
+		self.lookahead = lookahead
+		
+		# Bytes per second, or a rate such as "500K"
+		self.bandwidth = bandwidth
+		
+		# Ask on the console when there is no confident match; if False
+		# those roms are skipped
+		self.prompt = prompt
+		
+		# URL of a scraper server (server.py) to use instead of the
+		# providers themselves
+		self.remote = remote
+		
+		# Steam installations whose installed games are matched to roms
+		# by their manifests; an empty list for the usual locations,
+		# None to not look
+		self.steam_library = steam_library
+		
+		# Only scrape this share of the roms, as (i, n), writing to a
+		# partial gamelist to be merged with shard.py
+		self.shard = shard
+		
+		# Draw mix images from the art, with this layout (MIXIMAGE_LAYOUTS)
+		# and number of processes
+		self.enable_miximages = enable_miximages
+		self.miximage_layout = miximage_layout
+		self.miximage_workers = miximage_workers
+
+class ScrapeResult():
+	
+	def __init__(self, rom = ""):
+		self.rom = rom
+		self.status = RESULT_NO_MATCH
+		
+		# The game chosen from each provider
+		self.matches = {}
+		
+		# The combined game data, and the provider each field came from
+		self.game = None
+		self.sources = {}
+		
+		# Paths of the media files the game has, by media type
+		self.media = {}
+		
+		# Seconds spent on each stage ('resolve', 'fetch', 'media')
+		self.timings = {}
+
+class Scraper():
+	
+	def __init__(self, config = None):
+		self.config = config
+		
+		for name in config.providers:
+			if get_provider_info(name) is False:
+				raise ValueError("Unknown data provider %s" % name)
+		
+		self.priority = dict(MERGE_PRIORITY)
+		self.priority.update(parse_priority(config.prefer))
+		scheduler.set_rate(parse_rate(config.bandwidth))
+		
+		# Opened on first use, then kept
+		self.loaded = {}
+		self.media = {}
+		self.gl = None
+		self.matches = None
+		self.library = None
+		self.mixer = None
+		
+		# Set by start_watching()
+		self.watcher = None
+	
+	def get_games_list(self):
+		""" Return the roms in the roms folder, after the start_from and rom filters """
+		
+		# Get a list of all games/roms in the rom folder
+		games_list = get_roms_list(self.config.rom_path)
+		games_list.sort()
+		
+		# Is this one of several scrapers sharing the folder?
+		if self.config.shard:
+			print("Filtering game names to shard %d of %d" % self.config.shard)
+			games_list = [g for g in games_list if in_shard(g, self.config.shard)]
+			print("- Filtered to [%d]" % len(games_list))
+		
+		# Are we skipping a partially complete set of titles?
+		if self.config.start_from:
+			print("Filtering initial game names, starting at [%s]" % self.config.start_from)
+			new_games_list = []
+			for g in games_list:
+				if g[0].upper() < self.config.start_from.upper():
+					pass
+				else:
+					new_games_list.append(g)
+			games_list = new_games_list
+			print("- Filtered to [%d]" % len(games_list))
+		
+		# Are we looking for a single rom name?
+		if self.config.rom:
+			print("Looking for a single filename only")
+			print("- Rom name [%s]" % self.config.rom)
+			new_games_list = []
+			# Only use rom name if it matches a file we found in the directory
+			for g in games_list:
+				if g == self.config.rom:
+					new_games_list = [self.config.rom]
+			games_list = new_games_list
+		
+		return games_list
+	
+	def get_matches(self):
+		""" Return the games chosen, or not found, on previous runs """
+		
+		if self.matches is None:
+			print("Loading saved matches")
+			self.matches = MatchCache()
+		return self.matches
+	
+	def plan(self):
+		""" Estimate the work of a scrape for each provider, without making any requests or creating gamelist.xml """
+		
+		games_list = self.get_games_list()
+		
+		print("Getting game names from gamelist.xml %s:" % self.config.xml_path)
+		if os.path.isfile(self.config.xml_path) is False:
+			games_xml_list = []
+			print("- Not found, a new gamelist.xml would be created")
+		else:
+			games_xml_list = Gamelist(self.config.xml_path).names()
+			print("- Found [%d] " % len(games_xml_list))
+		
+		plans = []
+		for name in self.config.providers:
+			plans.append(get_plan(name, [(g, get_rom_stripped_name(g)) for g in games_list], games_xml_list, self.get_matches(), self.config.download_path,
+				enable_data = self.config.enable_data,
+				enable_art = self.config.enable_art,
+				enable_video = self.config.enable_video,
+				enable_overwrite = self.config.enable_overwrite,
+				refresh_matches = self.config.refresh_matches))
+		return plans
+	
+	def open(self):
+		""" Open gamelist.xml, the saved matches and each provider; True if they are all ready """
+		
+		if self.gl is None:
+			xml_path = self.config.xml_path
+			if self.config.shard:
+				# Other shards may be writing at the same time, so each
+				# has a gamelist of its own
+				print("Opening partial gamelist for shard %d of %d:" % self.config.shard)
+				xml_path = make_partial(xml_path, self.config.shard)
+			print("Getting game names from gamelist.xml %s:" % xml_path)
+			self.gl = Gamelist(xml_path)
+			print("- Found [%d] " % len(self.gl.names()))
+		
+		self.get_matches()
+		
+		if (self.library is None) and (self.config.steam_library is not None) and ("steam" in self.config.providers):
+			print("Reading installed Steam games")
+			self.library = SteamLibrary(self.config.steam_library or STEAM_ROOTS)
+			print("- Found [%d]" % len(self.library))
+		
+		# Pages are only fetched side by side with lookahead or several
+		# providers; otherwise sending them to a parse worker only adds work
+		if (self.config.lookahead > 0) or (len(self.config.providers) > 1):
+			parsepool.pool.enable()
+		
+		if (self.mixer is None) and self.config.enable_miximages:
+			if has_pillow():
+				self.mixer = Mixer(self.config.download_path, self.config.miximage_layout, self.config.miximage_workers)
+			else:
+				print("- Pillow is not installed, no mix images will be drawn (Hint: pip3 install pillow)")
+		
+		for name in self.config.providers:
+			if name in self.loaded:
+				continue
+			print("")
+			print("Loading data provider")
+			provider_info = get_provider_info(name)
+			p = load_provider(name, debug = False, remote = self.config.remote)
+			if p is False:
+				print("- The %s provider could not be initialised" % provider_info['name'])
+				return False
+			else:
+				print("- %s data provider initialised" % provider_info['name'])
+			self.loaded[name] = p
+			self.media[name] = get_media(name)
+		
+		return True
+	
+	def get_media_paths(self, game = None):
+		""" Return the media files a game has, by media type """
+		
+		media = {}
+		for media_type in MEDIA_FOLDERS.keys():
+			path = media_path(self.config.download_path, media_type, game['filename'])
+			if os.path.isfile(path):
+				media[media_type] = path
+		return media
+	
+	def scrape(self, games_list = None, prompt = None):
+		""" Scrape a list of roms (by default, those in the roms folder), yielding a ScrapeResult for each as it is finished """
+		
+		if self.open() is False:
+			raise RuntimeError("The data providers could not be initialised")
+		
+		cfg = self.config
+		if games_list is None:
+			games_list = self.get_games_list()
+		if prompt is None:
+			prompt = cfg.prompt
+		
+		games_xml_list = self.gl.names()
+		lookaheads = {}
+		fan_out = None
+		try:
+			# Background searches/fetches for each provider
+			for name in cfg.providers:
+				if cfg.lookahead > 0:
+					lookaheads[name] = Lookahead(self.loaded[name], workers = LOOKAHEAD_WORKERS)
+				else:
+					lookaheads[name] = Lookahead(self.loaded[name], workers = 0)
+			
+			# Store ids from the shortcuts, or installed Steam games, by rom
+			known_ids = {}
+			for g in games_list:
+				known_ids[g] = get_shortcut_ids(os.path.join(cfg.rom_path, g))
+				if self.library and ("steam" not in known_ids[g]):
+					appid = self.library.match(get_rom_stripped_name(g), cfg.match_threshold)
+					if appid:
+						known_ids[g]["steam"] = appid
+			
+			# Providers are queried side by side, so combining several costs
+			# the slowest of them rather than the sum
+			fan_out = ThreadPoolExecutor(max_workers = len(cfg.providers))
+			
+			# Providers that return the data of many games in one request are
+			# given a whole batch at a time
+			batched = [name for name in cfg.providers if self.prefetches_in_batches(name)]
+			
+			def fetch(name, game):
+				# Perhaps already on its way from fetch_ahead
+				lookaheads[name].fetched(game)
+				return get_game_data(self.loaded[name], self.media[name], game, cfg.enable_art, cfg.enable_video)
+			
+			# Roms are matched a batch at a time, and each batch is scraped
+			# before the next is matched, so results come out as they go
+			for first in range(0, len(games_list), SCRAPE_BATCH_SIZE):
+				
+				# Roms with a game chosen (by the user, or a confident match)
+				# from at least one provider
+				selected = []
+				
+				# We search using the filename, stripped of any suffix
+				for n in range(first, min(first + SCRAPE_BATCH_SIZE, len(games_list))):
+					g = games_list[n]
+					
+					result = ScrapeResult(g)
+					start = time.monotonic()
+					for name in cfg.providers:
+						
+						# Start searching for the next few games that still need it
+						upcoming = []
+						for u in games_list[n + 1:n + 1 + cfg.lookahead]:
+							if (name not in known_ids[u]) and (cfg.refresh_matches or (self.matches.get(name, u) is None)):
+								upcoming.append(get_rom_stripped_name(u))
+						lookaheads[name].search_ahead(upcoming)
+					
+					# Each provider is searched side by side...
+					found = list(fan_out.map(lambda name: search_game(self.loaded[name], name, g, games_xml_list, self.matches, lookaheads[name], cfg.refresh_matches, known_ids[g].get(name)), cfg.providers))
+					
+					# ...but their results are shown, and any prompt made, one at a time
+					for name, game in zip(cfg.providers, found):
+						if isinstance(game, list):
+							game = choose_game(name, g, games_xml_list, self.matches, lookaheads[name], game, cfg.match_threshold, prompt)
+						if game:
+							result.matches[name] = game
+					result.timings['resolve'] = time.monotonic() - start
+					
+					if len(result.matches) > 0:
+						selected.append(result)
+					else:
+						yield result
+				
+				if len(selected) == 0:
+					continue
+				
+				# Retrieved for every selected game of the batch up front
+				list(fan_out.map(lambda name: self.loaded[name].prefetch([r.matches[name] for r in selected if name in r.matches]), batched))
+				
+				# Retrieve metadata and media for each of the selected games
+				for k, result in enumerate(selected):
+					
+					# The others fetch only the next few games, in the background,
+					# so just as many are held at once
+					for name in cfg.providers:
+						if name not in batched:
+							lookaheads[name].fetch_ahead([r.matches[name] for r in selected[k + 1:k + 1 + cfg.lookahead] if name in r.matches])
+					
+					start = time.monotonic()
+					names = [name for name in cfg.providers if name in result.matches]
+					has_data = fan_out.map(lambda name: fetch(name, result.matches[name]), names)
+					games = {}
+					for name, ok in zip(names, has_data):
+						if ok:
+							games[name] = result.matches[name]
+					result.timings['fetch'] = time.monotonic() - start
+					if len(games) == 0:
+						result.status = RESULT_NO_DATA
+						yield result
+						continue
+					
+					game = merge_games(games, cfg.providers, self.priority)
+					if len(games) > 1:
+						print("")
+						print("Combined data from %s" % ", ".join(games.keys()))
+						for field, source in game['sources'].items():
+							print("- %s from %s" % (field, source))
+					
+					# Download external media
+					start = time.monotonic()
+					if (cfg.enable_art):
+						print("")
+						print("Downloading external art assets")
+						for art_type in ART_TYPES:
+							download_or_overwrite_art(game, cfg.download_path, art_type, cfg.enable_overwrite, game['sources'].get(art_type, ""))
+					
+					if (cfg.enable_video) and ('video' in game['sources']):
+						print("")
+						print("Downloading external video assets")
+						self.loaded[game['sources']['video']].download_video(game, cfg.download_path, "video", cfg.enable_overwrite)
+					
+					# Drawn in the background, from the art as it now is
+					if self.mixer:
+						print("")
+						print("Mix image")
+						self.mixer.add(game['filename'])
+					result.timings['media'] = time.monotonic() - start
+					
+					# Update xml metadata
+					if (cfg.enable_data):
+						game['has_xml'] = (game['path'] in games_xml_list)
+						update_gamelist(self.gl, game, cfg.enable_overwrite)
+						
+						# Update the list of games with XML, in case we find a match in any
+						# subsequent loops
+						games_xml_list = self.gl.names()
+					
+					result.status = RESULT_SCRAPED
+					result.game = game
+					result.sources = game['sources']
+					result.media = self.get_media_paths(game)
+					yield result
+		
+		finally:
+			# Also if the caller stops early
+			for name in lookaheads:
+				lookaheads[name].close()
+			if fan_out is not None:
+				fan_out.shutdown()
+			
+			# Keep the request sizes from this run, for future --plan estimates
+			transport.save_stats()
+			save_indexes()
+			if self.mixer:
+				self.mixer.finish()
+	
+	def prefetches_in_batches(self, name = ""):
+		""" Whether a provider retrieves the data of many games in one request, and so should be given them all at once """
+		
+		# A scraper server is asked for one game at a time, whichever provider it is
+		return (self.config.remote is None) and (get_provider_info(name)['prefetch'] == "batch")
+	
+	def close(self):
+		""" Stop the parse workers, once done with scraping """
+		
+		parsepool.pool.close()
+	
+	def start_watching(self):
+		""" Note the roms folder as it is now, so watch() also picks up roms added from here on, e.g. during a first scrape """
+		
+		if self.watcher is None:
+			self.watcher = Watcher(self.config.rom_path)
+	
+	def watch(self):
+		""" Scrape new or renamed roms as they appear in the roms folder (since start_watching(), if it was called), yielding a ScrapeResult for each; never returns """
+		
+		if self.open() is False:
+			raise RuntimeError("The data providers could not be initialised")
+		
+		print("")
+		self.start_watching()
+		w = self.watcher
+		print("Watching %s for new shortcuts, using %s" % (self.config.rom_path, w.method))
+		try:
+			while True:
+				new_games_list = [g for g in w.wait() if in_shard(g, self.config.shard)]
+				if len(new_games_list) == 0:
+					continue
+				print("")
+				print("New shortcuts found: %s" % ", ".join(new_games_list))
+				for name in self.config.providers:
+					self.loaded[name].refresh()
+				
+				# Nobody is there to answer a prompt
+				for result in self.scrape(new_games_list, prompt = False):
+					yield result
+				
+				print("")
+				print("Watching %s for new shortcuts" % self.config.rom_path)
+		finally:
+			w.close()
+			self.watcher = None
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Serves searches, game data and media
+# over a small HTTP/JSON API, so that one
+# long running instance (with its Steam
+# catalog, game data and media cached) can
+# be shared by every scraper on the network.
+#
+# Scrapers use it with --remote, see
+# remote.py.
+#
+# GET /providers
+#	Names of the available providers
+# GET /search?provider=steam&name=Hades
+#	Search results, best first, as
+#	[{id, name, url, match_name, score}]
+# GET /game?provider=steam&id=1145360
+# GET /game?provider=gog&url=https://www.gog.com/en/game/hades
+# GET /game?provider=gog&name=Hades
+#	Game data and media URLs, by provider
+#	id, page URL (on the provider's own
+#	site), or the confident match for a
+#	name
+# GET /media?url=...
+#	A media file from a game returned by
+#	/game, downloaded once and then served
+#	from the cache, with an ETag (and 304
+#	for If-None-Match)
+#
+##########################################
+
+# Builtins and site packages
+import argparse
+from collections import OrderedDict
+import hashlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import mimetypes
+import os
+import sys
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+import parsepool
+import transport
+from providers import get_provider_names, get_provider_info, get_media, load_provider
+from metadatacache import MetadataCache
+from scraper import new_game_data, get_game_data
+from matcher import normalise, score, choose
+from scheduler import scheduler, parse_rate
+from config import CACHE_DIR, MATCH_THRESHOLD, SERVER_HOST, SERVER_PORT, SERVER_MEDIA_CACHE_SIZE, SERVER_SEARCH_CACHE_ENTRIES, BANDWIDTH_LIMIT
+
+# Default location of the media cache
+MEDIA_CACHE_DIR = os.path.join(CACHE_DIR, "media")
+
+# Game fields that hold media URLs
+MEDIA_FIELDS = ["screens", "cover", "marquee", "title", "video"]
+
+class MediaCache():
+
+	def __init__(self, cache_dir = MEDIA_CACHE_DIR, max_size = SERVER_MEDIA_CACHE_SIZE):
+		self.cache_dir = cache_dir
+		self.max_size = max_size
+		self.lock = threading.Lock()
+
+		# One lock per file, so the same file is never fetched twice at once
+		self.fetching = {}
+
+		# Files being fetched or sent, which are not evicted, as a count of
+		# users by path
+		self.in_use = {}
+
+		# ETags of the files, by path; a file only changes by being fetched
+		# again, so each is worked out from its contents once
+		self.etags = {}
+
+		os.makedirs(self.cache_dir, exist_ok = True)
+		self.size = 0
+		for f in os.listdir(self.cache_dir):
+			p = os.path.join(self.cache_dir, f)
+			if f.endswith("-tmp"):
+				# Left by an interrupted download
+				os.remove(p)
+				continue
+			self.size += os.path.getsize(p)
+
+	def get(self, url = "", kind = "other"):
+		""" Return the path of the cached copy of url, downloading it first if needed, or False. The file is kept until release() is called with the path. """
+
+		name = hashlib.sha1(url.encode('utf-8')).hexdigest() + os.path.splitext(urlsplit(url).path)[1]
+		path = os.path.join(self.cache_dir, name)
+
+		with self.lock:
+			if name not in self.fetching:
+				self.fetching[name] = threading.Lock()
+			file_lock = self.fetching[name]
+			self.in_use[path] = self.in_use.get(path, 0) + 1
+
+		try:
+			with file_lock:
+				if os.path.isfile(path):
+					# Most recently used files are kept longest
+					os.utime(path)
+					return path
+
+				try:
+					with self.lock:
+						self.etags.pop(path, None)
+					r = transport.download(url, path, kind)
+					if (r.status_code != 200):
+						print("- Skipped %s, query returned %s" % (url, r.status_code))
+						self.release(path)
+						return False
+				except Exception as e:
+					print("- Error downloading %s" % url)
+					print(e)
+					self.release(path)
+					return False
+
+				with self.lock:
+					self.size += os.path.getsize(path)
+					if self.size > self.max_size:
+						self.evict()
+		except Exception:
+			self.release(path)
+			raise
+
+		return path
+
+	def etag(self, path = ""):
+		""" Return the ETag of a file returned by get() """
+
+		with self.lock:
+			etag = self.etags.get(path)
+		if etag is None:
+			h = hashlib.sha1()
+			f = open(path, "rb")
+			while True:
+				chunk = f.read(65536)
+				if not chunk:
+					break
+				h.update(chunk)
+			f.close()
+			etag = '"%s"' % h.hexdigest()
+			with self.lock:
+				self.etags[path] = etag
+		return etag
+
+	def release(self, path = ""):
+		""" Allow a file returned by get() to be evicted again """
+
+		with self.lock:
+			self.in_use[path] -= 1
+			if self.in_use[path] == 0:
+				del self.in_use[path]
+
+	def evict(self):
+		""" Remove the least recently used files until the cache is back under its size; called with the lock held """
+
+		files = []
+		for f in os.listdir(self.cache_dir):
+			p = os.path.join(self.cache_dir, f)
+			# Downloads still being written, and files being fetched or
+			# sent, are left alone
+			if f.endswith("-tmp") or (p in self.in_use):
+				continue
+			try:
+				files.append((os.path.getmtime(p), os.path.getsize(p), p))
+			except OSError:
+				continue
+		files.sort()
+
+		for mtime, size, p in files:
+			if self.size <= self.max_size:
+				break
+			try:
+				os.remove(p)
+			except OSError:
+				continue
+			self.etags.pop(p, None)
+			self.size -= size
+
+class ScrapeServer():
+
+	def __init__(self, metadata = None, media = None):
+		self.metadata = metadata
+		self.media = media
+		self.lock = threading.Lock()
+
+		# Providers are loaded on first use, and each has a lock as
+		# game data is extracted through per-instance state
+		self.loaded = {}
+		self.locks = {}
+
+		# Recent searches, oldest first
+		self.searches = OrderedDict()
+
+		# Only media belonging to a game that has been served can be
+		# fetched, as '<provider>:<type>' by URL
+		self.media_urls = {}
+		for provider, game in self.metadata.items():
+			self.allow_media(provider, game)
+
+	def get_provider(self, name = ""):
+		""" Return the loaded provider of the given name, or False """
+
+		if get_provider_info(name) is False:
+			return False
+		with self.lock:
+			if name not in self.loaded:
+				p = load_provider(name, debug = False)
+				if p is False:
+					return False
+				self.loaded[name] = p
+				self.locks[name] = threading.Lock()
+			return self.loaded[name]
+
+	def allow_media(self, provider = "", game = None):
+		""" Allow the media of a game to be fetched through /media """
+
+		for media_type in MEDIA_FIELDS:
+			if game.get(media_type):
+				self.media_urls[game[media_type]] = "%s:%s" % (provider, media_type)
+
+	def search(self, provider = "", name = ""):
+		""" Return the search results for a name, best match first, False for an unknown provider, or None if the search failed """
+
+		p = self.get_provider(provider)
+		if p is False:
+			return False
+
+		k = "%s:%s" % (provider, normalise(name))
+		with self.lock:
+			if k in self.searches:
+				self.searches.move_to_end(k)
+				return self.searches[k]
+
+		search_results = p.get_search(name)
+		if search_results is False:
+			return None
+
+		results = []
+		query = normalise(name)
+		for result in search_results:
+			match_name = p.get_matchname_from_fragment(result)
+			results.append({
+				'id' : p.get_id_from_fragment(result),
+				'name' : p.get_gamename_from_fragment(result),
+				'url' : p.get_href_from_fragment(result, url_type = "game"),
+				'match_name' : match_name,
+				'score' : score(query, match_name),
+			})
+		results.sort(key = lambda m: m['score'], reverse = True)
+
+		# Empty results are not kept either, in case the game is added later
+		if len(results) == 0:
+			return results
+		
+		with self.lock:
+			self.searches[k] = results
+			while len(self.searches) > SERVER_SEARCH_CACHE_ENTRIES:
+				self.searches.popitem(last = False)
+		return results
+
+	def game(self, provider = "", game_id = "", url = "", name = ""):
+		""" Return the data of a game, by provider id, page URL or the confident match for a name, or False """
+
+		p = self.get_provider(provider)
+		if p is False:
+			return False
+
+		# Only the provider's own pages are fetched, whoever asks
+		if url and (p.is_game_url(url) is False):
+			print("- Refused %s, not a %s game page" % (url, provider))
+			return False
+
+		if name and not (game_id or url):
+			best = choose(self.search(provider, name) or [], threshold = MATCH_THRESHOLD)
+			if not best:
+				return False
+			game_id = best['id']
+			url = best['url']
+
+		k = game_id or url
+		game = self.metadata.get(provider, k)
+		if game is not None:
+			return game
+
+		game = new_game_data("", name)
+		game['provider_id'] = game_id
+		game['url'] = url
+
+		# Only an id; the provider knows where its page is
+		if game_id and not url:
+			found = p.get_game_by_id(game_id)
+			if found is False:
+				return False
+			game['name'] = found['name']
+			game['url'] = found['url']
+		with self.locks[provider]:
+			has_data = get_game_data(p, get_media(provider), game, enable_art = True, enable_video = True)
+		if has_data is False:
+			return False
+
+		# Served and cached as JSON
+		game = game.to_dict()
+		with self.lock:
+			self.allow_media(provider, game)
+		self.metadata.add(provider, k, game)
+		self.metadata.save()
+		return game
+
+	def get_media(self, url = ""):
+		""" Return the path of a cached media file, to be given back with self.media.release() once sent, or False if it is not the media of a served game """
+
+		with self.lock:
+			kind = self.media_urls.get(url)
+		if kind is None:
+			return False
+		return self.media.get(url, kind)
+
+class Handler(BaseHTTPRequestHandler):
+
+	# Set to the ScrapeServer before serving
+	scrape_server = None
+
+	def send_json(self, data = None, status = 200):
+		""" Send a JSON response """
+
+		body = json.dumps(data).encode('utf-8')
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def send_file(self, path = "", etag = None):
+		""" Send a file as the response, or 304 if the client already has the copy with this ETag """
+
+		if etag and (self.headers.get("If-None-Match") == etag):
+			self.send_response(304)
+			self.send_header("ETag", etag)
+			self.end_headers()
+			return
+
+		content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+		self.send_response(200)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(os.path.getsize(path)))
+		if etag:
+			self.send_header("ETag", etag)
+		self.end_headers()
+		f = open(path, "rb")
+		while True:
+			chunk = f.read(65536)
+			if not chunk:
+				break
+			self.wfile.write(chunk)
+		f.close()
+
+	def do_GET(self):
+		""" Route a request to the scrape server """
+
+		parts = urlsplit(self.path)
+		params = {}
+		for k, v in parse_qs(parts.query).items():
+			params[k] = v[0]
+		provider = params.get('provider', "").lower()
+		s = self.scrape_server
+
+		try:
+			if parts.path == "/providers":
+				return self.send_json(get_provider_names())
+
+			if parts.path == "/search":
+				results = s.search(provider, params.get('name', ""))
+				if results is False:
+					return self.send_json({'error' : "Unknown data provider %s" % provider}, 400)
+				if results is None:
+					return self.send_json({'error' : "Search failed"}, 502)
+				return self.send_json(results)
+
+			if parts.path == "/game":
+				if get_provider_info(provider) is False:
+					return self.send_json({'error' : "Unknown data provider %s" % provider}, 400)
+				game = s.game(provider, params.get('id', ""), params.get('url', ""), params.get('name', ""))
+				if game is False:
+					return self.send_json({'error' : "No game data found"}, 404)
+				return self.send_json(game)
+
+			if parts.path == "/media":
+				path = s.get_media(params.get('url', ""))
+				if path is False:
+					return self.send_json({'error' : "Unknown or unavailable media"}, 404)
+				try:
+					return self.send_file(path, s.media.etag(path))
+				finally:
+					s.media.release(path)
+
+			return self.send_json({'error' : "Not found"}, 404)
+
+		except Exception as e:
+			print("- Error handling %s" % self.path)
+			print(e)
+			return self.send_json({'error' : str(e)}, 500)
+
+	def log_message(self, format, *args):
+		print("- %s %s" % (self.address_string(), format % args))
+
+if __name__ == "__main__":
+
+	print("Scraper server running...")
+
+	parser = argparse.ArgumentParser(description='Serve game searches, metadata and media to scrapers on the network (see --remote in scrape.py).', add_help = True)
+	parser.add_argument('--host', dest='host', action='store', default=SERVER_HOST, required=False, help='Address to listen on (default %s)' % SERVER_HOST)
+	parser.add_argument('--port', dest='port', action='store', type=int, default=SERVER_PORT, required=False, help='Port to listen on (default %d)' % SERVER_PORT)
+	parser.add_argument('--bandwidth', dest='bandwidth', action='store', default=BANDWIDTH_LIMIT, required=False, help='Limit downloads from the providers to this many bytes per second, e.g. "500K" or "2M", 0 for no limit (default %s)' % BANDWIDTH_LIMIT)
+
+	args = parser.parse_args()
+	args_dict = vars(args)
+
+	try:
+		scheduler.set_rate(parse_rate(args_dict['bandwidth']))
+	except ValueError:
+		print("The bandwidth limit must be a number of bytes per second, e.g. 500K or 2M")
+		sys.exit(1)
+
+	# Requests are handled side by side, each parsing what it fetched
+	parsepool.pool.enable()
+
+	print("Loading caches")
+	Handler.scrape_server = ScrapeServer(MetadataCache(), MediaCache())
+
+	httpd = ThreadingHTTPServer((args_dict['host'], args_dict['port']), Handler)
+	print("Serving on http://%s:%d/ (Control+C to stop)" % (args_dict['host'], args_dict['port']))
+	try:
+		httpd.serve_forever()
+	except KeyboardInterrupt:
+		print("")
+		print("Stopped")
+	finally:
+		httpd.server_close()
+		transport.save_stats()
+		parsepool.pool.close()
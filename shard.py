@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Splits the roms of a folder between
+# several scrapers (--shard i/n), on the
+# same machine or on different ones, and
+# merges their partial gamelists back into
+# gamelist.xml afterwards.
+#
+# Each rom belongs to one shard, by the
+# crc32 of its filename, so every worker
+# works out its own share with no
+# coordination. Each worker only writes to
+# its partial, <gamelist.xml>.shard-i-of-n,
+# which starts as a copy of the worker's
+# entries from gamelist.xml.
+#
+# Merge the partials (all of those found
+# next to gamelist.xml, or just the ones
+# given) with:
+#	python3 shard.py gamelist.xml [partial ...]
+#
+##########################################
+
+import copy
+import glob
+import os
+import re
+import sys
+import xml.etree.ElementTree as etree
+import zlib
+
+from config import GAMELIST_MERGE_RULES
+from gamelist import Gamelist
+
+# Partial gamelists are named after the gamelist they are merged into
+PARTIAL_SUFFIX = ".shard-%d-of-%d"
+PARTIAL_NAME = re.compile("\\.shard-[0-9]+-of-[0-9]+$")
+
+def parse_shard(text = ""):
+	""" Turn 'i/n' (with shards numbered from 1) into (i, n); ValueError if it is not valid """
+
+	i, sep, n = text.partition("/")
+	if not sep:
+		raise ValueError("expected i/n")
+	i = int(i)
+	n = int(n)
+	if (n < 1) or (i < 1) or (i > n):
+		raise ValueError("expected 1 <= i <= n")
+	return (i, n)
+
+def in_shard(filename = "", shard = None):
+	""" Whether a rom filename belongs to a shard; every rom belongs when there is no shard """
+
+	if shard is None:
+		return True
+	i, n = shard
+	return (zlib.crc32(filename.encode('utf-8')) % n) == (i - 1)
+
+def partial_path(xml_path = "", shard = None):
+	""" Return the path of the partial gamelist a shard writes to """
+
+	return xml_path + (PARTIAL_SUFFIX % shard)
+
+def find_partials(xml_path = ""):
+	""" Return the partial gamelists found next to a gamelist, oldest first """
+
+	partials = []
+	for path in glob.glob(glob.escape(xml_path) + ".shard-*-of-*"):
+		# Not the temporary copies written while saving
+		if PARTIAL_NAME.search(path):
+			partials.append(path)
+	partials.sort(key = os.path.getmtime)
+	return partials
+
+def game_path(game_element = None):
+	""" Return the rom filename of a gamelist entry, as given by Gamelist.names() """
+
+	return game_element.find('path').text.replace('./', '')
+
+def make_partial(xml_path = "", shard = None):
+	""" Create the partial gamelist of a shard, from its entries in gamelist.xml, unless it already exists; return its path """
+
+	path = partial_path(xml_path, shard)
+	if os.path.isfile(path):
+		print("- Continuing with partial gamelist %s" % path)
+		return path
+
+	root = etree.Element('gameList')
+	count = 0
+	if os.path.isfile(xml_path):
+		try:
+			for game_element in etree.parse(xml_path).getroot().findall('game'):
+				if in_shard(game_path(game_element), shard):
+					root.append(copy.deepcopy(game_element))
+					count += 1
+		except Exception as e:
+			print("- Error, unable to read %s, the partial gamelist starts empty" % xml_path)
+			print(e)
+
+	etree.ElementTree(root).write(path)
+	print("- Created partial gamelist %s with [%d] existing entries" % (path, count))
+	return path
+
+def merge_element(game_element = None, partial_element = None, rules = GAMELIST_MERGE_RULES):
+	""" Merge the fields of a partial gamelist entry into an entry of the final gamelist; True if anything changed """
+
+	updated = False
+	for field, rule in rules.items():
+		el = partial_element.find(field)
+		if (el is None) or (not el.text):
+			continue
+		existing = game_element.find(field)
+		if existing is None:
+			existing = etree.Element(field)
+			game_element.append(existing)
+		elif (rule == "existing") and existing.text:
+			continue
+		if existing.text != el.text:
+			existing.text = el.text
+			updated = True
+	return updated
+
+def merge_partials(xml_path = "", partials = [], rules = GAMELIST_MERGE_RULES):
+	""" Merge partial gamelists into a gamelist, in the order given; return the number of entries added and updated, or False """
+
+	gl = Gamelist(xml_path)
+	if gl.is_parsed is False:
+		return False
+
+	added = 0
+	updated = 0
+	try:
+		tree = gl.get_tree()
+		root = tree.getroot()
+		games = {}
+		for game_element in root.findall('game'):
+			games[game_path(game_element)] = game_element
+
+		for partial in partials:
+			print("Merging %s" % partial)
+			n_added = 0
+			n_updated = 0
+			for partial_element in etree.parse(partial).getroot().findall('game'):
+				path = game_path(partial_element)
+				if path not in games:
+					game_element = etree.Element('game')
+					path_el = etree.Element('path')
+					path_el.text = "./" + path
+					game_element.append(path_el)
+					merge_element(game_element, partial_element, rules)
+					root.append(game_element)
+					games[path] = game_element
+					n_added += 1
+				elif merge_element(games[path], partial_element, rules):
+					n_updated += 1
+			print("- Added [%d], updated [%d]" % (n_added, n_updated))
+			added += n_added
+			updated += n_updated
+
+		gl.save_tree(tree)
+	except Exception as e:
+		print("- Error merging partial gamelists, %s has not been changed" % xml_path)
+		print(e)
+		return False
+
+	return (added, updated)
+
+if __name__ == "__main__":
+
+	if len(sys.argv) < 2:
+		print("Usage: %s gamelist.xml [partial ...]" % sys.argv[0])
+		sys.exit(1)
+
+	xml_path = sys.argv[1]
+	partials = sys.argv[2:]
+	if len(partials) == 0:
+		partials = find_partials(xml_path)
+	if len(partials) == 0:
+		print("No partial gamelists found for %s" % xml_path)
+		sys.exit(1)
+
+	merged = merge_partials(xml_path, partials)
+	if merged is False:
+		sys.exit(1)
+	print("")
+	print("Merged [%d] partial gamelists into %s: added [%d], updated [%d]" % (len(partials), xml_path, merged[0], merged[1]))
+
+	# Everything in them is now in the gamelist
+	for partial in partials:
+		os.remove(partial)
+	print("- Removed the partial gamelists")
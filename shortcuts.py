@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Reads the store ids of a game from its
+# shortcut file, where the shortcut was
+# made by a store client:
+#
+# .desktop	- Exec= / URL= lines
+# .url		- URL= line (Windows internet shortcut)
+# .lnk		- target and arguments of a Windows
+#			  shell link (MS-SHLLINK)
+#
+# e.g. "steam steam://rungameid/1145360" or
+# "GalaxyClient.exe /command=runGame /gameId=1207664643"
+#
+##########################################
+
+import os
+import re
+import struct
+
+# Patterns that identify a game, as (provider, regex with the id as group 1)
+SHORTCUT_IDS = [
+	("steam", re.compile(r"steam://(?:rungameid|run|launch)/(\d+)", re.IGNORECASE)),
+	("gog", re.compile(r"/gameId=(\d+)", re.IGNORECASE)),
+	("gog", re.compile(r"goggalaxy://openGameView/(\d+)", re.IGNORECASE)),
+]
+
+# Shortcuts are small; anything bigger is not one
+MAX_SHORTCUT_SIZE = 65536
+
+# Shell link header and flags, from [MS-SHLLINK] 2.1
+LNK_HEADER_SIZE = 0x4C
+LNK_HAS_TARGET_ID_LIST = 0x01
+LNK_HAS_LINK_INFO = 0x02
+LNK_HAS_NAME = 0x04
+LNK_HAS_RELATIVE_PATH = 0x08
+LNK_HAS_WORKING_DIR = 0x10
+LNK_HAS_ARGUMENTS = 0x20
+LNK_HAS_ICON_LOCATION = 0x40
+LNK_IS_UNICODE = 0x80
+
+# StringData entries, in the order they are stored
+LNK_STRINGS = [LNK_HAS_NAME, LNK_HAS_RELATIVE_PATH, LNK_HAS_WORKING_DIR, LNK_HAS_ARGUMENTS, LNK_HAS_ICON_LOCATION]
+
+def read_ini_values(data = b"", keys = []):
+	""" Return the values of the given keys from a .desktop or .url file """
+
+	values = []
+	for line in data.decode('utf-8', errors = 'replace').splitlines():
+		k, sep, v = line.partition("=")
+		if sep and (k.strip() in keys):
+			values.append(v.strip())
+	return values
+
+def read_c_string(data = b"", pos = 0, unicode = False):
+	""" Return the NUL terminated string at pos """
+
+	if unicode:
+		end = pos
+		while (end + 1 < len(data)) and (data[end:end + 2] != b"\x00\x00"):
+			end += 2
+		return data[pos:end].decode('utf-16-le', errors = 'replace')
+
+	end = data.find(b"\x00", pos)
+	if end == -1:
+		end = len(data)
+	return data[pos:end].decode('latin-1')
+
+def read_lnk_strings(data = b""):
+	""" Return the target path and StringData (name, paths, arguments, icon) of a shell link """
+
+	strings = []
+	if (len(data) < LNK_HEADER_SIZE) or (struct.unpack_from("<I", data, 0)[0] != LNK_HEADER_SIZE):
+		return strings
+
+	flags = struct.unpack_from("<I", data, 20)[0]
+	unicode = (flags & LNK_IS_UNICODE) != 0
+	pos = LNK_HEADER_SIZE
+
+	if flags & LNK_HAS_TARGET_ID_LIST:
+		pos += 2 + struct.unpack_from("<H", data, pos)[0]
+
+	if flags & LNK_HAS_LINK_INFO:
+		info_size, header_size, info_flags = struct.unpack_from("<III", data, pos)
+		# VolumeIDAndLocalBasePath
+		if info_flags & 0x01:
+			if header_size >= 0x24:
+				strings.append(read_c_string(data, pos + struct.unpack_from("<I", data, pos + 28)[0], True))
+			else:
+				strings.append(read_c_string(data, pos + struct.unpack_from("<I", data, pos + 16)[0]))
+		pos += info_size
+
+	for flag in LNK_STRINGS:
+		if flags & flag:
+			count = struct.unpack_from("<H", data, pos)[0]
+			pos += 2
+			if unicode:
+				strings.append(data[pos:pos + (count * 2)].decode('utf-16-le', errors = 'replace'))
+				pos += count * 2
+			else:
+				strings.append(data[pos:pos + count].decode('latin-1'))
+				pos += count
+
+	return strings
+
+def read_shortcut(path = ""):
+	""" Return the commands and URLs a shortcut file launches """
+
+	ext = os.path.splitext(path)[1].lower()
+	if ext not in [".desktop", ".url", ".lnk"]:
+		return []
+
+	try:
+		if os.path.getsize(path) > MAX_SHORTCUT_SIZE:
+			return []
+		f = open(path, "rb")
+		data = f.read()
+		f.close()
+
+		if ext == ".desktop":
+			return read_ini_values(data, ["Exec", "URL"])
+		if ext == ".url":
+			return read_ini_values(data, ["URL"])
+		return read_lnk_strings(data)
+
+	except Exception as e:
+		print("- Unable to read shortcut %s" % path)
+		print(e)
+		return []
+
+def get_shortcut_ids(path = ""):
+	""" Return the store ids a shortcut file gives, as {provider : id} """
+
+	ids = {}
+	for s in read_shortcut(path):
+		for provider, pattern in SHORTCUT_IDS:
+			m = pattern.search(s)
+			if m and (provider not in ids):
+				ids[provider] = m.group(1)
+	return ids
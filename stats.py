@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Counts of HTTP requests and bytes made
+# by each provider, kept across runs so
+# the size of a scrape can be estimated
+# before it is started.
+#
+##########################################
+
+import json
+import os
+import threading
+
+from config import CACHE_DIR
+
+# Default location of the request history
+STATS_PATH = os.path.join(CACHE_DIR, "stats.json")
+
+class RequestStats():
+	
+	def __init__(self, stats_path = STATS_PATH):
+		self.stats_path = stats_path
+		self.counts = {}
+		self.lock = threading.Lock()
+	
+	def record(self, kind = "other", nbytes = 0, requests = 1):
+		""" Count a request (and/or its bytes) against a '<provider>:<type>' kind """
+		
+		with self.lock:
+			if kind not in self.counts:
+				self.counts[kind] = { 'requests' : 0, 'bytes' : 0 }
+			self.counts[kind]['requests'] += requests
+			self.counts[kind]['bytes'] += nbytes
+	
+	def load(self):
+		""" Return the saved totals from all previous runs """
+		
+		if os.path.isfile(self.stats_path):
+			try:
+				f = open(self.stats_path, "r", encoding = "utf-8")
+				history = json.load(f)
+				f.close()
+				return history
+			except Exception as e:
+				print("- Error, unable to read request history %s" % self.stats_path)
+				print(e)
+		return {}
+	
+	def save(self):
+		""" Add the counts from this run to the saved totals """
+		
+		if len(self.counts) == 0:
+			return
+		
+		history = self.load()
+		with self.lock:
+			for kind, c in self.counts.items():
+				if kind not in history:
+					history[kind] = { 'requests' : 0, 'bytes' : 0 }
+				history[kind]['requests'] += c['requests']
+				history[kind]['bytes'] += c['bytes']
+			self.counts = {}
+		
+		try:
+			os.makedirs(os.path.dirname(self.stats_path), exist_ok = True)
+			f = open(self.stats_path + "-tmp.%d" % os.getpid(), "w", encoding = "utf-8")
+			json.dump(history, f, indent = 1, sort_keys = True)
+			f.close()
+			os.replace(self.stats_path + "-tmp.%d" % os.getpid(), self.stats_path)
+		except Exception as e:
+			print("- Error, unable to save request history %s" % self.stats_path)
+			print(e)
+	
+	def averages(self):
+		""" Return the average bytes per request for each kind, from the saved totals """
+		
+		avg = {}
+		for kind, c in self.load().items():
+			if c['requests'] > 0 and c['bytes'] > 0:
+				avg[kind] = c['bytes'] / c['requests']
+		return avg
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 
-from bs4 import BeautifulSoup
 import datetime
 import json
-import os
 import re
-import requests
-from fuzzywuzzy import fuzz
+import threading
+
+from config import STEAM_CATALOG_MAX_AGE, ART_SIZES
+from matcher import normalise
+from providers import get_media
+from steamcatalog import SteamCatalog
+from mediaindex import download_media
+import transport
 
 # Base GOG URL
 STEAM_URL = "https://store.steampowered.com/app/"
@@ -21,21 +25,24 @@ SEARCH_SUFFIX = ""
 # Search results are tagged with this string under the 'seleniumId' tag
 GAME_HTML_ELEMENT = "productTile"
 
-cookies = { 'birthtime': '470682001', 'lastagecheck' : '1-0-1985', 'mature_content': '1' }
+# Only the appdetails sections read by the get_*_from_fragment methods and
+# the art/video getters. "basic" (name, descriptions, header image) also
+# brings pc_requirements and legal notices with it, but sections such as
+# package_groups, price_overview and achievements are left out
+DETAILS_FILTERS = "basic,developers,publishers,genres,metacritic,release_date,screenshots,movies"
+
+# The image variants offered for each type of art, as (width, key). Keys
+# are looked up in the appdetails data (or a screenshot entry of it).
+IMAGE_VARIANTS = {
+	'screens' : [(600, 'path_thumbnail'), (1920, 'path_full')],
+	'cover' : [(460, 'header_image')],
+	'marquee' : [(184, 'capsule_imagev5'), (231, 'capsule_image')],
+}
+
+# Maximum number of appids requested in a single appdetails call
+DETAILS_BATCH_SIZE = 25
 
-# Media folder names as used by EmulationStation
-# and their availability from within GOG.com
-# ==============================================
-# 3dboxes			- No
-# backcovers		- No
-# covers			- No
-# fanart			- No
-# marquees			- Yes
-# miximages			- No
-# physicalmedia		- No
-# screenshots		- Yes
-# titlescreens
-# videos			- Yes; linked Youtube clips
+cookies = { 'birthtime': '470682001', 'lastagecheck' : '1-0-1985', 'mature_content': '1' }
 
 # Metadata entries
 # Name				- Yes
@@ -48,64 +55,194 @@ cookies = { 'birthtime': '470682001', 'lastagecheck' : '1-0-1985', 'mature_conte
 # Players
 # Controller
 
-MEDIA = {
-	'3dboxes' : False,
-	'cover' : True,
-	'data' : True,
-	'marquee' : True,
-	'miximages' : False,
-	'screens' : True,
-	'physical' : False,
-	'video' : True,
-	'title' : True
-}
+# Media capabilities are declared in the provider registry
+MEDIA = get_media("steam")
 
 class Steam():
 	
 	def __init__(self, debug = False):
 		self.data_block = None
 		self.debug = debug
-		self.apps_ids = False
 		
-		# Get steam app id's list
+		# The Steam app catalog is only opened (or downloaded) on first use
+		self.catalog = None
+		self.catalog_lock = threading.Lock()
+		
+		# Prefetched appdetails data, keyed by appid string
+		self.details = {}
+		
+		# Set to False once steampowered.com has rejected a multi-appid request
+		self.batch_details = True
+		
+		# Age gate cookies, sent with every store request
+		transport.set_cookies("store.steampowered.com", cookies)
+		
+	@property
+	def app_ids(self):
+		""" The local copy of the Steam app id's list, downloading a fresh one if it is missing or out of date """
+		
+		# Searches may run in the background, so only the first
+		# caller opens it
+		with self.catalog_lock:
+			if self.catalog is None:
+				self.catalog = self.get_catalog()
+		return self.catalog
+	
+	def refresh(self):
+		""" Reopen the Steam app catalog if it has gone out of date while running """
+		
+		with self.catalog_lock:
+			if isinstance(self.catalog, SteamCatalog) and self.catalog.is_stale(STEAM_CATALOG_MAX_AGE):
+				print("- Local Steam catalog is out of date, refreshing")
+				catalog = self.get_catalog()
+				if catalog is not False:
+					self.catalog.close()
+					self.catalog = catalog
+	
+	def get_app_list(self):
+		""" Download the full Steam app id's list """
+		
 		try:
 			print("- Retriving Steam App entries from steampowered.com")
-			r = requests.get(SEARCH_URL, cookies = cookies)
+			r = transport.get(SEARCH_URL, kind = "steam:catalog")
 			if (r.status_code != 200):
 				print("- Skipped, no data returned %s" % (r.status_code))
 			else:
 				app_ids = json.loads(r.text)
 				print("- Found [%d]" % len(app_ids['applist']['apps']))
-				self.app_ids = app_ids['applist']['apps']
+				return app_ids['applist']['apps']
 					
 		except Exception as e:
 			print("- Error making HTTP search request to %s" % SEARCH_URL)
 			print(e)
-			return False
+			
+		return False
 	
-	def get_search(self, name = ""):
-		""" Get the app_ids list for a given game name """
+	def get_catalog(self):
+		""" Open the memory mapped Steam app catalog, rebuilding it if needed """
+		
+		catalog = SteamCatalog()
+		if catalog.is_stale(STEAM_CATALOG_MAX_AGE) or (catalog.open() is False):
+			apps = self.get_app_list()
+			if apps:
+				print("- Writing local Steam catalog %s" % catalog.catalog_path)
+				catalog.build(apps)
+			if catalog.open() is False:
+				return False
+		
+		print("- Opened local Steam catalog with [%d] entries" % len(catalog))
+		return catalog
+	
+	def get_search(self, name = "", quiet = False):
+		""" Get the app_ids list for a given game name, or False if the search failed """
+		
+		from fuzzywuzzy import fuzz
+		
+		if not self.app_ids:
+			print("- Error, no Steam Apps catalog to search")
+			return False
 		
 		search_results = []
 		try:
-			if self.app_ids:
+			if quiet is False:
 				print("")
 				print("Searching %s local Steam Apps for %s:" % (len(self.app_ids), name))
-				for app in self.app_ids:
-					if name.upper() in app['name'].upper():
-						search_results.append(app)
-					else:
-						r = fuzz.token_sort_ratio(name, app['name'])
-						if r > 75:
-							search_results.append(app)
-					
+			
+			# Substring matches come straight from the mapped (and already
+			# normalised) name buffer, only the remaining names need a
+			# fuzzy comparison
+			match_name = normalise(name)
+			hits = set(self.app_ids.find(name))
+			for idx, app_name in self.app_ids.search_names():
+				if idx in hits:
+					search_results.append(self.app_ids.app(idx))
+				else:
+					r = fuzz.token_sort_ratio(match_name, app_name)
+					if r > 75:
+						search_results.append(self.app_ids.app(idx))
+				
+			if quiet is False:
 				print("- Found [%d]" % len(search_results))
 		except Exception as e:
 			print("- Error searching AppID's")
 			print(e)
+			return False
 			
 		return search_results
 	
+	def get_details(self, app_ids = [], quiet = False):
+		""" Retrieve the filtered appdetails data for one or more appids """
+		
+		details = {}
+		game_url = STEAM_DETAILS_URL + "?appids=" + ",".join(app_ids) + "&filters=" + DETAILS_FILTERS
+		try:
+			r = transport.get(game_url, kind = "steam:metadata")
+			if (r.status_code != 200):
+				print("- Skipped %s, query returned %s" % (game_url, r.status_code))
+				return False
+			if quiet is False:
+				print("- Returned %s bytes" % len(r.text))
+			game_data = json.loads(r.text)
+			if game_data is None:
+				return False
+			for app_id in app_ids:
+				if app_id in game_data.keys():
+					if game_data[app_id] and (game_data[app_id].get('success') is True):
+						details[app_id] = game_data[app_id]['data']
+		except Exception as e:
+			print("- Error make HTTP game request to %s" % game_url)
+			print(e)
+			return False
+			
+		return details
+	
+	def prefetch(self, games = [], quiet = False):
+		""" Retrieve appdetails for all selected games ahead of get_game """
+		
+		app_ids = []
+		for game in games:
+			if game['provider_id']:
+				app_id = str(game['provider_id'])
+				if (app_id not in self.details) and (app_id not in app_ids):
+					app_ids.append(app_id)
+					
+		if len(app_ids) == 0:
+			return
+			
+		if quiet is False:
+			print("")
+			print("Prefetching Steam app details for [%d] games:" % len(app_ids))
+		for i in range(0, len(app_ids), DETAILS_BATCH_SIZE):
+			batch = app_ids[i:i + DETAILS_BATCH_SIZE]
+			
+			# Multiple appids in one call are only accepted by some filter
+			# combinations; if the batch is refused, fall back to one
+			# (still filtered) call per appid for the rest of the run
+			if self.batch_details and (len(batch) > 1):
+				details = self.get_details(batch, quiet = quiet)
+				if details is False:
+					if quiet is False:
+						print("- Batched request refused, falling back to single appid requests")
+					self.batch_details = False
+				else:
+					self.details.update(details)
+					continue
+					
+			for app_id in batch:
+				details = self.get_details([app_id], quiet = quiet)
+				if details:
+					self.details.update(details)
+					
+		if quiet is False:
+			print("- Prefetched [%d]" % len(self.details))
+	
+	def discard(self, games = []):
+		""" Drop any prefetched data for games that will not be used """
+		
+		for game in games:
+			if game['provider_id']:
+				self.details.pop(str(game['provider_id']), None)
+	
 	def get_game(self, game = None, game_url = None):
 		""" Get a single Steam data object for a game """
 		
@@ -115,21 +252,17 @@ class Steam():
 			app_id = str(game['provider_id'])
 			print("")
 			print("Retrieving game data from Steam for %s:" % game['provider_id'])
-			game_url = STEAM_DETAILS_URL + "?appids=" + app_id
-			r = requests.get(game_url, cookies=cookies)
-			if (r.status_code != 200):
-				print("- Skipped %s, query returned %s" % (game_url, r.status_code))
-			else:
-				html = r.text
-				print("- Returned %s bytes" % len(html))
-				game_data = json.loads(html)
-				if str(app_id) in game_data.keys():
-					if 'success' in game_data[str(app_id)].keys():
-						if game_data[str(app_id)]['success'] is True:
-							self.data_block = game_data[str(app_id)]['data']
-							return self.data_block			
+			if app_id in self.details:
+				# Used once, so it is not held for the rest of the run
+				print("- Using prefetched data")
+				self.data_block = self.details.pop(app_id)
+				return self.data_block
+			details = self.get_details([app_id])
+			if details and (app_id in details):
+				self.data_block = details[app_id]
+				return self.data_block
 		except Exception as e:
-			print("- Error make HTTP game request to %s" % game_url)
+			print("- Error retrieving game data for %s" % game['provider_id'])
 			print(e)
 			return False
 			
@@ -139,6 +272,33 @@ class Steam():
 		""" This is a no-op for steam data """
 		return self.data_block
 	
+	def get_game_by_id(self, game_id = ""):
+		""" Return the name and URL of the game with a given appid, as {provider_id, name, url}, or False """
+		
+		try:
+			name = ""
+			# Only named from the catalog if that needs no download
+			if (self.catalog is not None) or (SteamCatalog().is_stale(STEAM_CATALOG_MAX_AGE) is False):
+				idx = None
+				if self.app_ids:
+					idx = self.app_ids.find_appid(game_id)
+				if idx is not None:
+					name = self.app_ids.name(idx)
+			return {
+				'provider_id' : int(game_id),
+				'name' : name,
+				'url' : STEAM_URL + str(int(game_id)),
+			}
+		except Exception as e:
+			print("- Error looking up Steam appid %s" % game_id)
+			print(e)
+			return False
+	
+	def is_game_url(self, url = ""):
+		""" Whether a URL is a Steam store page; games are only ever fetched by appid """
+		
+		return url.startswith(STEAM_URL)
+	
 	def get_href_from_fragment(self, app = None, url_type = None):
 		""" Return an href value from a given HTML fragment """
 			
@@ -150,20 +310,33 @@ class Steam():
 			return STEAM_DETAILS_URL + "?appids=" + str(app['appid'])
 		
 		
+	def get_id_from_fragment(self, app = None):
+		""" Return the Steam appid """
+		
+		return app['appid']
+	
 	def get_gamename_from_fragment(self, app = None):
 		""" Return game title from given HTML fragment """
 	
 		return app['name']
+	
+	def get_matchname_from_fragment(self, app = None):
+		""" Return the normalised game title, as precomputed in the catalog """
+		
+		return app['match_name']
 		
 	def get_description_from_fragment(self, text = None):
 		""" Return game description from given api data """
+		
+		from parsepool import parse, html_to_text
+		
 		desc = None
 	
 		try:
 			if 'detailed_description' in text.keys():
-				soup = BeautifulSoup(text['detailed_description'])
-				return soup.get_text()
+				desc = parse(html_to_text, text['detailed_description'])
 				print("- Found description")
+				return desc
 		except Exception as e:
 			print("- Unable to extract game description from fragment")
 			print(e)
@@ -256,39 +429,52 @@ class Steam():
 			print("- Title extraction is only possible if we have extracted the API data!")
 			return False
 	
-	def get_cover(self):
+	def get_sized_image(self, data = {}, art_type = "", width = 0):
+		""" Return the smallest image variant at least width pixels wide, or the largest there is """
+		
+		image = False
+		for size, key in IMAGE_VARIANTS[art_type]:
+			if data.get(key):
+				image = data[key]
+				if width and (size >= width):
+					break
+		return image
+	
+	def get_cover(self, width = ART_SIZES['cover']):
 		""" Extract game cover art """
 		
 		# Uses the 'header' image
 		
 		if self.data_block:
-			if 'header_image' in self.data_block.keys():
-				print("- Found cover: %s" % self.data_block['header_image'])
-				return self.data_block['header_image']
+			cover = self.get_sized_image(self.data_block, 'cover', width)
+			if cover:
+				print("- Found cover: %s" % cover)
+				return cover
 				
 		else:
 			print("- Art extraction is only possible if we have extracted the API data!")
 			return False
 			
-	def get_marquee(self):
+	def get_marquee(self, width = ART_SIZES['marquee']):
 		""" Extract game marquee/transparent game logo/title """
 		
 		# Uses the 'capsule' image
 		
 		if self.data_block:
-			if 'capsule_image' in self.data_block.keys():
-				print("- Found marquee: %s" % self.data_block['capsule_image'])
-				return self.data_block['capsule_image']
+			marquee = self.get_sized_image(self.data_block, 'marquee', width)
+			if marquee:
+				print("- Found marquee: %s" % marquee)
+				return marquee
 		else:
 			print("- Art extraction is only possible if we have extracted the API data!")
 			return False
 		
-	def get_title(self):
+	def get_title(self, width = ART_SIZES['title']):
 		""" Extract game titlescreen """
 		
 		return False
 		
-	def get_screen(self):
+	def get_screen(self, width = ART_SIZES['screens']):
 		""" Extract screenshots """
 		
 		screenshots = []
@@ -296,7 +482,7 @@ class Steam():
 		if self.data_block:
 			if 'screenshots' in self.data_block.keys():
 				for s in self.data_block['screenshots']:
-					shot = s['path_full']
+					shot = self.get_sized_image(s, 'screens', width)
 					print("- Found screenshot: %s" % shot)
 					screenshots.append(shot)
 			if len(screenshots) > 0:
@@ -329,21 +515,7 @@ class Steam():
 		
 		try:
 			print("- Downloading stream")
-			path = os.path.join(download_path, "videos")
-			filename = game['filename'] + ".mp4"
-			if (os.path.isfile(os.path.join(path, filename))) and (enable_overwrite is False):
-				print("- ... already exists, skipping (Hint: -f to overwrite)")
-				return False
-			else:
-				r = requests.get(game[art_type], stream=True)
-				if (r.status_code == 200):
-					path = os.path.join(download_path, "videos")
-					f = open(path + "/" + filename, "wb")
-					for chunk in r.iter_content(chunk_size=128):
-						f.write(chunk)
-					f.close()
-					print("- ... downloaded %s" % (path + "/" + filename))
-					return True
+			return download_media(game[art_type], download_path, "videos", game['filename'] + ".mp4", "steam:video", enable_overwrite)
 				
 		except Exception as e:
 			print("- Error attempting to download %s" % (game['video']))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Compact on-disk copy of the Steam app
+# catalog, opened with mmap so that it is
+# read lazily rather than decoded into
+# hundreds of thousands of dicts.
+#
+##########################################
+
+from array import array
+import bisect
+import mmap
+import os
+import struct
+import time
+
+from config import CACHE_DIR
+from matcher import normalise
+
+# Default location of the binary catalog
+CATALOG_PATH = os.path.join(CACHE_DIR, "steam_apps.bin")
+
+# File layout
+# ===========
+# header			- magic, version, number of apps
+# appids			- uint32 per app
+# name offsets		- uint32 per app, plus one end offset
+# search offsets	- uint32 per app, plus one end offset
+# names				- utf-8 names, back to back
+# search names		- normalised utf-8 names (see matcher.py), each followed by a NUL
+#
+# All arrays are in native byte order; the file is a local cache and
+# is rebuilt if it cannot be opened.
+CATALOG_MAGIC = b"GSAC"
+CATALOG_VERSION = 2
+HEADER = struct.Struct("=4sII")
+
+class SteamCatalog():
+
+	def __init__(self, catalog_path = CATALOG_PATH):
+		self.catalog_path = catalog_path
+		self.count = 0
+		self.f = None
+		self.mm = None
+		self.appids = None
+		self.name_offsets = None
+		self.search_offsets = None
+		self.names_start = 0
+		self.search_start = 0
+
+	def __len__(self):
+		return self.count
+
+	def is_stale(self, max_age = 0):
+		""" Is the catalog file missing or older than max_age seconds """
+
+		if os.path.isfile(self.catalog_path) is False:
+			return True
+		if max_age and ((time.time() - os.path.getmtime(self.catalog_path)) > max_age):
+			return True
+		return False
+
+	def build(self, apps = []):
+		""" Write a new catalog file from a list of {'appid', 'name'} dicts """
+
+		appids = array('I')
+		name_offsets = array('I', [0])
+		search_offsets = array('I', [0])
+		names = bytearray()
+		search = bytearray()
+
+		for app in apps:
+			name = str(app['name'])
+			appids.append(int(app['appid']))
+			names += name.encode('utf-8')
+			name_offsets.append(len(names))
+			# NUL terminated, so a substring search can never span two names
+			search += normalise(name).encode('utf-8') + b"\x00"
+			search_offsets.append(len(search))
+
+		os.makedirs(os.path.dirname(self.catalog_path), exist_ok = True)
+		tmp_path = self.catalog_path + "-tmp.%d" % os.getpid()
+		f = open(tmp_path, "wb")
+		f.write(HEADER.pack(CATALOG_MAGIC, CATALOG_VERSION, len(appids)))
+		appids.tofile(f)
+		name_offsets.tofile(f)
+		search_offsets.tofile(f)
+		f.write(names)
+		f.write(search)
+		f.close()
+
+		self.close()
+		os.replace(tmp_path, self.catalog_path)
+
+	def open(self):
+		""" Map the catalog file into memory """
+
+		self.close()
+		try:
+			self.f = open(self.catalog_path, "rb")
+			self.mm = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+			magic, version, count = HEADER.unpack_from(self.mm, 0)
+			if (magic != CATALOG_MAGIC) or (version != CATALOG_VERSION):
+				print("- Steam catalog %s is an old or unknown format" % self.catalog_path)
+				self.close()
+				return False
+
+			itemsize = array('I').itemsize
+			view = memoryview(self.mm)
+			pos = HEADER.size
+			self.appids = view[pos:pos + (count * itemsize)].cast('I')
+			pos += count * itemsize
+			self.name_offsets = view[pos:pos + ((count + 1) * itemsize)].cast('I')
+			pos += (count + 1) * itemsize
+			self.search_offsets = view[pos:pos + ((count + 1) * itemsize)].cast('I')
+			pos += (count + 1) * itemsize
+			self.names_start = pos
+			self.search_start = pos + self.name_offsets[count]
+			self.count = count
+			return True
+		except Exception as e:
+			print("- Unable to open Steam catalog %s" % self.catalog_path)
+			print(e)
+			self.close()
+			return False
+
+	def close(self):
+		""" Release the memory map and file handle """
+
+		for v in [self.appids, self.name_offsets, self.search_offsets]:
+			if v is not None:
+				v.release()
+		self.appids = None
+		self.name_offsets = None
+		self.search_offsets = None
+		if self.mm is not None:
+			self.mm.close()
+			self.mm = None
+		if self.f is not None:
+			self.f.close()
+			self.f = None
+		self.count = 0
+
+	def appid(self, idx):
+		""" Return the appid of a catalog entry """
+		return self.appids[idx]
+
+	def name(self, idx):
+		""" Return the name of a catalog entry """
+		start = self.names_start + self.name_offsets[idx]
+		end = self.names_start + self.name_offsets[idx + 1]
+		return self.mm[start:end].decode('utf-8', errors = 'replace')
+
+	def app(self, idx):
+		""" Return a catalog entry in the same form as the Steam app list, plus its normalised name """
+		return { 'appid' : self.appid(idx), 'name' : self.name(idx), 'match_name' : self.search_name(idx) }
+
+	def search_name(self, idx):
+		""" Return the normalised search name of a catalog entry """
+		start = self.search_start + self.search_offsets[idx]
+		end = self.search_start + self.search_offsets[idx + 1] - 1
+		return self.mm[start:end].decode('utf-8', errors = 'replace')
+
+	def find(self, text = ""):
+		""" Return the index of every entry whose normalised name contains the normalised text """
+
+		found = []
+		needle = normalise(text).encode('utf-8')
+		if len(needle) == 0:
+			return found
+
+		end = self.search_start + self.search_offsets[self.count]
+		pos = self.mm.find(needle, self.search_start, end)
+		while pos != -1:
+			idx = bisect.bisect_right(self.search_offsets, pos - self.search_start) - 1
+			found.append(idx)
+			# Carry on from the start of the next entry
+			pos = self.mm.find(needle, self.search_start + self.search_offsets[idx + 1], end)
+
+		return found
+
+	def find_appid(self, appid = 0):
+		""" Return the index of the entry with the given appid, or None """
+
+		# appids are not sorted, so look for the packed value in the
+		# appids array, at a whole entry boundary
+		needle = struct.pack("=I", int(appid))
+		start = HEADER.size
+		end = start + (self.count * len(needle))
+		pos = self.mm.find(needle, start, end)
+		while pos != -1:
+			if ((pos - start) % len(needle)) == 0:
+				return (pos - start) // len(needle)
+			pos = self.mm.find(needle, pos + 1, end)
+		return None
+
+	def search_names(self):
+		""" Iterate over (index, normalised name) for every entry """
+
+		for idx in range(self.count):
+			yield idx, self.search_name(idx)
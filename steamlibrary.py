@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Reads the games installed by Steam from
+# its library folders (libraryfolders.vdf)
+# and app manifests (appmanifest_*.acf),
+# so installed games can be matched to
+# their appid without searching.
+#
+# Run directly to list what would be found:
+#	python3 steamlibrary.py [steam folder ...]
+#
+##########################################
+
+import glob
+import os
+import sys
+
+from config import STEAM_ROOTS, MATCH_THRESHOLD
+from matcher import normalise, score, choose
+
+def parse_vdf(text = ""):
+	""" Parse Valve's text KeyValues format (as used by .vdf and .acf files) into nested dicts """
+
+	root = {}
+	stack = [root]
+	key = None
+	pos = 0
+	while pos < len(text):
+		c = text[pos]
+		if c.isspace():
+			pos += 1
+		elif text.startswith("//", pos):
+			# Comment, to the end of the line
+			end = text.find("\n", pos)
+			pos = len(text) if end == -1 else end
+		elif c == "{":
+			d = {}
+			stack[-1][key] = d
+			stack.append(d)
+			key = None
+			pos += 1
+		elif c == "}":
+			if len(stack) > 1:
+				stack.pop()
+			pos += 1
+		else:
+			# A quoted or bare token
+			if c == '"':
+				value = []
+				pos += 1
+				while (pos < len(text)) and (text[pos] != '"'):
+					if (text[pos] == "\\") and (pos + 1 < len(text)):
+						pos += 1
+						value.append({'n' : "\n", 't' : "\t"}.get(text[pos], text[pos]))
+					else:
+						value.append(text[pos])
+					pos += 1
+				value = "".join(value)
+				pos += 1
+			else:
+				start = pos
+				while (pos < len(text)) and not (text[pos].isspace() or (text[pos] in '{}"')):
+					pos += 1
+				value = text[start:pos]
+
+			if key is None:
+				key = value
+			else:
+				stack[-1][key] = value
+				key = None
+	return root
+
+def read_vdf(path = ""):
+	""" Parse a .vdf or .acf file, or return False """
+
+	try:
+		f = open(path, "r", encoding = "utf-8", errors = "replace")
+		text = f.read()
+		f.close()
+		return parse_vdf(text)
+	except Exception as e:
+		print("- Unable to read %s" % path)
+		print(e)
+		return False
+
+def get_library_folders(steam_root = ""):
+	""" Return every Steam library folder of a Steam installation, including its own """
+
+	folders = [steam_root]
+	vdf_path = os.path.join(steam_root, "steamapps", "libraryfolders.vdf")
+	if os.path.isfile(vdf_path) is False:
+		return folders
+	data = read_vdf(vdf_path)
+	if data is False:
+		return folders
+
+	for section_name, section in data.items():
+		if (section_name.lower() != "libraryfolders") or (isinstance(section, dict) is False):
+			continue
+		for k, v in section.items():
+			# Current format: "0" { "path" "..." ... }, older: "1" "..."
+			if isinstance(v, dict) and ('path' in v):
+				path = v['path']
+			elif k.isdigit() and isinstance(v, str):
+				path = v
+			else:
+				continue
+			if os.path.realpath(path) not in [os.path.realpath(p) for p in folders]:
+				folders.append(path)
+	return folders
+
+def get_installed_apps(steam_roots = STEAM_ROOTS):
+	""" Return the games installed in every library of the given Steam installations, as [{appid, name, installdir}] """
+
+	apps = []
+	seen = set()
+	for steam_root in steam_roots:
+		if os.path.isdir(os.path.join(steam_root, "steamapps")) is False:
+			continue
+		for folder in get_library_folders(steam_root):
+			for manifest in sorted(glob.glob(os.path.join(folder, "steamapps", "appmanifest_*.acf"))):
+				data = read_vdf(manifest)
+				if not data:
+					continue
+				state = data.get('AppState', {})
+				if ('appid' not in state) or (state['appid'] in seen):
+					continue
+				seen.add(state['appid'])
+				apps.append({
+					'appid' : state['appid'],
+					'name' : state.get('name', ""),
+					'installdir' : state.get('installdir', ""),
+				})
+	return apps
+
+class SteamLibrary():
+
+	def __init__(self, steam_roots = STEAM_ROOTS):
+		self.steam_roots = steam_roots
+		self.apps = get_installed_apps(steam_roots)
+
+	def __len__(self):
+		return len(self.apps)
+
+	def match(self, name = "", threshold = MATCH_THRESHOLD):
+		""" Return the appid of the installed game that confidently matches a (rom) name, or None """
+
+		query = normalise(name)
+		candidates = []
+		for app in self.apps:
+			candidates.append({
+				'appid' : app['appid'],
+				'score' : max(score(query, normalise(app['name'])), score(query, normalise(app['installdir']))),
+			})
+		best = choose(candidates, threshold = threshold)
+		if best:
+			return best['appid']
+		return None
+
+if __name__ == "__main__":
+
+	if len(sys.argv) > 1:
+		roots = sys.argv[1:]
+	else:
+		roots = STEAM_ROOTS
+	for root in roots:
+		print("Steam installation %s:" % root)
+		for folder in get_library_folders(root):
+			print("- Library %s" % folder)
+	for app in get_installed_apps(roots):
+		print("%10s | %-60s | %s" % (app['appid'], app['name'], app['installdir']))
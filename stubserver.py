@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# A stand-in for GOG.com and Steam that
+# serves a few canned games, for trying out
+# changes without touching the real sites:
+#
+# GOG.com search page, game page and
+# products API (api.gog.com/products/<id>),
+# the Steam app list and appdetails, and
+# placeholder images.
+#
+# $ python3 stubserver.py
+#	serves on http://127.0.0.1:8766/
+# $ python3 stubserver.py -- --roms ... --provider gog,steam -d -a
+#	runs scrape.py with those options against
+#	the stub, with a temporary cache folder
+#
+##########################################
+
+# Builtins and site packages
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import os
+import runpy
+import sys
+import tempfile
+import threading
+from urllib.parse import urlsplit, parse_qs
+import zlib
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8766
+
+# Canned GOG.com products, as returned by the products API with
+# expand=description,screenshots,videos
+GOG_PRODUCTS = {
+	1207664643 : {
+		'id' : 1207664643,
+		'title' : "Hades",
+		'slug' : "hades",
+		'release_date' : "2020-09-17T00:00:00+0300",
+		'links' : {'product_card' : "%(base)s/en/game/hades"},
+		'images' : {
+			'logo' : "%(base)s/img/2a5c0d3c9ee4e2a0c4f1e1b9a1a62b0fbd0c8d6a48ee0a5ef2b3e8f5c1d0e9a7_glx_logo.jpg",
+			'logo2x' : "%(base)s/img/2a5c0d3c9ee4e2a0c4f1e1b9a1a62b0fbd0c8d6a48ee0a5ef2b3e8f5c1d0e9a7_glx_logo_2x.jpg",
+		},
+		'description' : {
+			'lead' : "<b>Defy the god of the dead</b>",
+			'full' : "<b>Defy the god of the dead</b><br>Hades is a god-like rogue-like dungeon crawler.",
+		},
+		'screenshots' : [
+			{
+				'image_id' : "9f0a3b3c4d5e6f708192a3b4c5d6e7f8091a2b3c4d5e6f708192a3b4c5d6e7f8",
+				'formatter_template_url' : "%(base)s/img/9f0a3b3c4d5e6f708192a3b4c5d6e7f8091a2b3c4d5e6f708192a3b4c5d6e7f8_{formatter}.jpg",
+			},
+		],
+		'videos' : [
+			{'video_url' : "https://www.youtube.com/embed/91t0ha9x0AE?wmode=opaque&rel=0", 'provider' : "youtube"},
+		],
+	},
+}
+
+# Canned GOG.com game pages, with the same data embedded as on the real pages
+GOG_PAGE = """<html><head></head><body>
+<div class="description">Hades is a god-like rogue-like dungeon crawler.</div>
+<script>
+    cardProduct: {"id":1207664643,"title":"Hades","globalReleaseDate":"2020-09-17T00:00:00+03:00","boxArtImage":"%(base)s/img/box.png","logo":"%(base)s/img/logo.png","screenshots":[{"imageUrl":"%(base)s/img/shot1"}],"videos":[{"provider":"youtube","url":"https://www.youtube.com/watch?v=91t0ha9x0AE"}]},
+</script>
+"ratingValue": "4.8",
+<a href="/games?developers=supergiant" class="details__link">Supergiant Games</a>
+<a href="/games?publishers=supergiant" class="details__link">Supergiant Games</a>
+<a href="/games/action" class="details__link" gog-track-event="{eventAction: 'click', eventCategory: 'productPageGameDetails', eventLabel: 'CAT: Action'}">Action</a>
+</body></html>
+"""
+
+GOG_TILE = '<a class="product-tile" href="%(base)s/en/game/%(slug)s" gog-product="%(id)s"><div class="product-tile__title" title="%(title)s"></div></a>\n'
+
+# Canned Steam apps and their appdetails
+STEAM_APPS = [
+	{'appid' : 1145360, 'name' : "Hades"},
+	{'appid' : 10, 'name' : "Counter-Strike"},
+]
+STEAM_DETAILS = {
+	'name' : "Hades",
+	'detailed_description' : "<p>Defy the god of the dead</p>",
+	'developers' : ["Supergiant Games"],
+	'publishers' : ["Supergiant Games"],
+	'genres' : [{'description' : "Action"}],
+	'metacritic' : {'score' : 93},
+	'release_date' : {'date' : "17 Sep, 2020"},
+	'header_image' : "%(base)s/img/header.jpg",
+	'capsule_image' : "%(base)s/img/capsule.jpg",
+	'screenshots' : [{'path_thumbnail' : "%(base)s/img/thumb.jpg", 'path_full' : "%(base)s/img/full.jpg"}],
+	'movies' : [{'mp4' : {'480' : "%(base)s/img/movie.mp4"}}],
+}
+
+def fill(data = None, base = ""):
+	""" Return canned data with %(base)s replaced by the stub's own URL """
+
+	return json.loads(json.dumps(data).replace("%(base)s", base))
+
+class StubHandler(BaseHTTPRequestHandler):
+
+	# Set to the stub's own URL before serving
+	base = ""
+
+	def send(self, body = "", content_type = "text/html", status = 200, headers = {}):
+		""" Send a response """
+
+		if isinstance(body, str):
+			body = body.encode('utf-8')
+		self.send_response(status)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(body)))
+		for k, v in headers.items():
+			self.send_header(k, v)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def send_json(self, data = None):
+		""" Send a JSON response """
+
+		self.send(json.dumps(data), "application/json")
+
+	def do_GET(self):
+		""" Answer as GOG.com or Steam would """
+
+		parts = urlsplit(self.path)
+		params = parse_qs(parts.query)
+		base = self.base
+
+		if parts.path == "/en/games":
+			query = params.get('query', [""])[0].lower()
+			tiles = ""
+			for product in GOG_PRODUCTS.values():
+				if query in product['title'].lower():
+					tiles += GOG_TILE % {'base' : base, 'slug' : product['slug'], 'id' : product['id'], 'title' : product['title']}
+			return self.send("<html><body>\n%s</body></html>" % tiles)
+
+		if parts.path.startswith("/en/game/"):
+			return self.send(GOG_PAGE % {'base' : base})
+
+		if parts.path.startswith("/products/"):
+			product_id = parts.path.split("/")[-1]
+			if (not product_id.isdigit()) or (int(product_id) not in GOG_PRODUCTS):
+				return self.send("Not found", "text/plain", 404)
+			product = fill(GOG_PRODUCTS[int(product_id)], base)
+			# Optional sections are only sent when asked for
+			expand = params.get('expand', [""])[0].split(",")
+			for section in ['description', 'screenshots', 'videos']:
+				if section not in expand:
+					del product[section]
+			return self.send_json(product)
+
+		if parts.path == "/applist":
+			return self.send_json({'applist' : {'apps' : STEAM_APPS}})
+
+		if parts.path == "/appdetails":
+			details = {}
+			for app_id in params.get('appids', [""])[0].split(","):
+				details[app_id] = {'success' : True, 'data' : fill(STEAM_DETAILS, base)}
+			return self.send_json(details)
+
+		if parts.path.startswith("/img/"):
+			# Not a real image, but enough to be saved as one; served with
+			# an ETag, as the real image CDNs are
+			body = b"\xff\xd8\xff\xe0" + parts.path.encode('utf-8')
+			etag = '"%08x"' % zlib.crc32(body)
+			if self.headers.get('If-None-Match') == etag:
+				self.send_response(304)
+				self.send_header("ETag", etag)
+				self.end_headers()
+				return
+			return self.send(body, "image/jpeg", headers = {'ETag' : etag})
+
+		return self.send("Not found", "text/plain", 404)
+
+	def log_message(self, format, *args):
+		print("- [stub] %s" % (format % args))
+
+def start(host = STUB_HOST, port = STUB_PORT):
+	""" Serve the stub from a background thread and return the server """
+
+	StubHandler.base = "http://%s:%d" % (host, port)
+	httpd = ThreadingHTTPServer((host, port), StubHandler)
+	t = threading.Thread(target = httpd.serve_forever, daemon = True)
+	t.start()
+	return httpd
+
+def patch_providers(base = ""):
+	""" Point the providers at the stub instead of GOG.com and Steam """
+
+	import gog
+	import gogapi
+	import steam
+
+	gog.SEARCH_URL = base + "/en/games?query="
+	gogapi.PRODUCTS_URL = base + "/products/"
+	steam.SEARCH_URL = base + "/applist"
+	steam.STEAM_DETAILS_URL = base + "/appdetails"
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description='Serve canned GOG.com and Steam responses, or run scrape.py against them.', add_help = True)
+	parser.add_argument('--port', dest='port', action='store', type=int, default=STUB_PORT, required=False, help='Port to listen on (default %d)' % STUB_PORT)
+	parser.add_argument('scrape_args', nargs=argparse.REMAINDER, help='Options to run scrape.py with, after "--"')
+
+	args = parser.parse_args()
+	args_dict = vars(args)
+	scrape_args = args_dict['scrape_args']
+	if scrape_args and (scrape_args[0] == "--"):
+		scrape_args = scrape_args[1:]
+
+	if len(scrape_args) == 0:
+		httpd = start(STUB_HOST, args_dict['port'])
+		print("Serving canned responses on %s/ (Control+C to stop)" % StubHandler.base)
+		try:
+			threading.Event().wait()
+		except KeyboardInterrupt:
+			print("")
+			print("Stopped")
+		httpd.shutdown()
+		sys.exit(0)
+
+	# Keep the catalog, matches and stats from the stub out of the real
+	# cache; set before anything else reads it
+	import config
+	config.CACHE_DIR = tempfile.mkdtemp(prefix = "gogscraper-stub-")
+	print("Using temporary cache %s" % config.CACHE_DIR)
+
+	httpd = start(STUB_HOST, args_dict['port'])
+	patch_providers(StubHandler.base)
+
+	sys.argv = ["scrape.py"] + scrape_args
+	runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape.py"), run_name = "__main__")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Shared HTTP transport used by all data
+# providers and downloaders.
+#
+# One pooled, kept-alive session is held
+# per host, so repeated requests reuse the
+# same TCP/TLS connection.
+#
+##########################################
+
+import importlib.util
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import USER_AGENT, HTTP_POOL_SIZE, HTTP_TIMEOUT
+from scheduler import scheduler, priority_for
+from stats import RequestStats
+
+# Brotli responses can only be requested if there is a decoder installed
+if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+	ACCEPT_ENCODING = "gzip, deflate, br"
+else:
+	ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HEADERS = {
+	'User-Agent' : USER_AGENT,
+	'Accept-Encoding' : ACCEPT_ENCODING,
+}
+
+def is_unchanged(validators = None, headers = {}):
+	""" Whether response headers describe the same file as the saved validators (ETag, else Last-Modified); a different Content-Length means it has changed, but the same one proves nothing """
+	
+	if validators.get('etag') and headers.get('ETag'):
+		return validators['etag'] == headers['ETag']
+	length = headers.get('Content-Length')
+	if (validators.get('length') is not None) and (length is not None) and (int(length) != validators['length']):
+		return False
+	if validators.get('last_modified') and headers.get('Last-Modified'):
+		return validators['last_modified'] == headers['Last-Modified']
+	return False
+
+class Transport():
+	
+	def __init__(self, pool_size = HTTP_POOL_SIZE, timeout = HTTP_TIMEOUT):
+		self.pool_size = pool_size
+		self.timeout = timeout
+		self.sessions = {}
+		self.cookies = {}
+		self.lock = threading.Lock()
+		self.stats = RequestStats()
+	
+	def set_cookies(self, host = "", cookies = {}):
+		""" Set cookies sent with every request to a host """
+		
+		with self.lock:
+			self.cookies[host] = dict(cookies)
+			for k, s in self.sessions.items():
+				if urlsplit(k).hostname == host:
+					s.cookies.update(cookies)
+	
+	def session(self, url = ""):
+		""" Return the pooled session for the host of a URL """
+		
+		parts = urlsplit(url)
+		k = "%s://%s" % (parts.scheme, parts.netloc)
+		with self.lock:
+			if k not in self.sessions:
+				s = requests.Session()
+				adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self.pool_size)
+				s.mount(parts.scheme + "://", adapter)
+				s.headers.update(DEFAULT_HEADERS)
+				if parts.hostname in self.cookies:
+					s.cookies.update(self.cookies[parts.hostname])
+				self.sessions[k] = s
+			return self.sessions[k]
+	
+	def get(self, url = "", kind = "other", **kwargs):
+		""" Make a GET request through the pooled session for the host """
+		
+		kwargs.setdefault('timeout', self.timeout)
+		priority = priority_for(kind)
+		
+		with scheduler.transfer(priority):
+			scheduler.throttle(0, priority)
+			r = self.session(url).get(url, **kwargs)
+			
+			# Wire size if the server gave it, otherwise the body we already hold
+			nbytes = r.headers.get('Content-Length')
+			if nbytes is not None:
+				nbytes = int(nbytes)
+			elif kwargs.get('stream'):
+				nbytes = 0
+			else:
+				nbytes = len(r.content)
+			self.stats.record(kind, nbytes)
+			
+			# A streamed body is accounted for as it is read
+			if not kwargs.get('stream'):
+				scheduler.throttle(nbytes, priority)
+		
+		return r
+	
+	def iter_content(self, r = None, kind = "other", chunk_size = 65536):
+		""" Read the body of a streamed response in chunks, within the bandwidth limit for its kind """
+		
+		priority = priority_for(kind)
+		
+		# Without a Content-Length, get() could not count the body up front
+		counted = ('Content-Length' in r.headers)
+		try:
+			for chunk in r.iter_content(chunk_size = chunk_size):
+				scheduler.throttle(len(chunk), priority)
+				if counted is False:
+					self.stats.record(kind, len(chunk), requests = 0)
+				yield chunk
+		finally:
+			# Also when the caller stops reading early; the connection is
+			# then dropped rather than returned to the pool
+			r.close()
+	
+	def download(self, url = "", filename = "", kind = "other", chunk_size = 65536, validators = None):
+		""" Stream a URL to a file, within the bandwidth limit for its priority; returns the response
+		
+		With the validators (etag, last_modified, length) of the copy already
+		held, the file is only replaced if it has changed; otherwise the
+		response has status 304, whether the server sent one or its headers
+		matched. """
+		
+		headers = {}
+		if validators:
+			if validators.get('etag'):
+				headers['If-None-Match'] = validators['etag']
+			if validators.get('last_modified'):
+				headers['If-Modified-Since'] = validators['last_modified']
+		
+		priority = priority_for(kind)
+		with scheduler.transfer(priority):
+			r = self.get(url, kind, stream = True, headers = headers)
+			if (r.status_code == 200) and validators and is_unchanged(validators, r.headers):
+				# The server ignored the conditions, but the body is not needed
+				r.status_code = 304
+			if (r.status_code != 200):
+				r.close()
+				return r
+			
+			# Written alongside, so a failed download never replaces a good file
+			f = open(filename + "-tmp", "wb")
+			try:
+				for chunk in self.iter_content(r, kind, chunk_size):
+					f.write(chunk)
+				f.close()
+				os.replace(filename + "-tmp", filename)
+			except Exception:
+				f.close()
+				os.remove(filename + "-tmp")
+				raise
+		
+		return r
+	
+	def head(self, url = "", **kwargs):
+		""" Make a HEAD request through the pooled session for the host """
+		
+		kwargs.setdefault('timeout', self.timeout)
+		kwargs.setdefault('allow_redirects', True)
+		return self.session(url).head(url, **kwargs)
+	
+	def close(self):
+		""" Close all pooled connections """
+		
+		with self.lock:
+			for s in self.sessions.values():
+				s.close()
+			self.sessions = {}
+
+# The transport shared by everything in this process
+transport = Transport()
+
+def get(url = "", kind = "other", **kwargs):
+	return transport.get(url, kind, **kwargs)
+
+def download(url = "", filename = "", kind = "other", validators = None):
+	return transport.download(url, filename, kind, validators = validators)
+
+def iter_content(r = None, kind = "other", chunk_size = 65536):
+	return transport.iter_content(r, kind, chunk_size)
+
+def head(url = "", **kwargs):
+	return transport.head(url, **kwargs)
+
+def set_cookies(host = "", cookies = {}):
+	transport.set_cookies(host, cookies)
+
+def save_stats():
+	transport.stats.save()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+##########################################
+#
+# Watches a folder for new files.
+#
+# Uses inotify on Linux (through ctypes,
+# so nothing extra needs installing) and
+# falls back to listing the folder every
+# few seconds anywhere else.
+#
+##########################################
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+from config import WATCH_POLL_INTERVAL, WATCH_SETTLE
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+def inotify_init(path = ""):
+	""" Start an inotify watch on path and return its file descriptor, or False if inotify is not available """
+
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+		fd = libc.inotify_init1(IN_CLOEXEC)
+		if fd < 0:
+			return False
+		if libc.inotify_add_watch(fd, os.fsencode(path), WATCH_MASK) < 0:
+			os.close(fd)
+			return False
+		return fd
+	except (OSError, AttributeError):
+		return False
+
+class Watcher():
+
+	def __init__(self, path = "", poll_interval = WATCH_POLL_INTERVAL, settle = WATCH_SETTLE):
+		self.path = path
+		self.poll_interval = poll_interval
+		self.settle = settle
+		self.known = self.list_files()
+		self.fd = inotify_init(path)
+		if self.fd is False:
+			self.method = "polling every %ss" % poll_interval
+		else:
+			self.method = "inotify"
+
+	def list_files(self):
+		""" Return the names of the files currently in the folder """
+
+		files = set()
+		for f in os.listdir(self.path):
+			if os.path.isfile(os.path.join(self.path, f)):
+				files.add(f)
+		return files
+
+	def read_events(self, timeout = None):
+		""" Wait up to timeout seconds for inotify events; True if the folder changed """
+
+		ready, w, x = select.select([self.fd], [], [], timeout)
+		if len(ready) == 0:
+			return False
+
+		# Which files changed is taken from a fresh listing, so the
+		# events themselves are only drained
+		os.read(self.fd, 65536)
+		return True
+
+	def wait(self):
+		""" Block until new files appear (or existing ones are renamed), then return their names """
+
+		while True:
+			if self.fd is False:
+				time.sleep(self.poll_interval)
+				files = self.list_files()
+				if len(files - self.known) == 0:
+					# Forget removed files, in case they come back
+					self.known = files
+					continue
+				# Give anything still being written time to finish
+				time.sleep(self.settle)
+			else:
+				self.read_events()
+				# Shortcuts are often written in several steps; wait for
+				# the folder to go quiet first
+				while self.read_events(self.settle):
+					pass
+
+			# Comparing listings (rather than trusting each event) also
+			# copes with an overflowed event queue
+			files = self.list_files()
+			new_files = sorted(files - self.known)
+			self.known = files
+			if len(new_files) > 0:
+				return new_files
+
+	def close(self):
+		""" Stop watching """
+
+		if self.fd is not False:
+			os.close(self.fd)
+			self.fd = False